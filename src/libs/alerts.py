@@ -0,0 +1,316 @@
+import time
+from collections.abc import Callable, Sequence
+from typing import Literal, TypedDict
+
+import numpy as np
+import polars as pl
+
+from libs.latency import StreamStats
+
+RuleKind = Literal["cross", "band", "cloud"]
+
+
+class AlertRule(TypedDict):
+    name: str
+    kind: RuleKind
+    params: dict[str, float]
+
+
+class Window(TypedDict):
+    # 銘柄 × 直近の足（古い順）の2次元配列。最後の列が最新の足
+    close: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+
+
+# 状態の名前 → 銘柄ごとの (状態, 判定できたか)
+RuleStates = dict[str, tuple[np.ndarray, np.ndarray]]
+
+
+class LatencySummary(TypedDict):
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    over_budget: int
+
+
+def sma_cross_rule(short: int = 5, long: int = 25) -> AlertRule:
+    return {
+        "name": f"sma{short}_{long}",
+        "kind": "cross",
+        "params": {"short": short, "long": long},
+    }
+
+
+def band_rule(period: int = 20, dev: float = 2.0) -> AlertRule:
+    return {
+        "name": f"bb{period}_{dev:g}",
+        "kind": "band",
+        "params": {"period": period, "dev": dev},
+    }
+
+
+def cloud_rule(
+    conversion: int = 9, base: int = 26, span2: int = 52, displacement: int = 26
+) -> AlertRule:
+    return {
+        "name": "cloud",
+        "kind": "cloud",
+        "params": {
+            "conversion": conversion,
+            "base": base,
+            "span2": span2,
+            "displacement": displacement,
+        },
+    }
+
+
+DEFAULT_RULES = [
+    sma_cross_rule(),
+    band_rule(20, 1.0),
+    band_rule(20, 2.0),
+    cloud_rule(),
+]
+
+
+def compile_rule(rule: AlertRule) -> tuple[int, Callable[[Window], RuleStates]]:
+    """
+    ルールを「必要な足の本数」と「全銘柄の最新の足の状態を求める関数」に変換する
+
+    状態は全銘柄をまとめた配列の演算で求めます。アラートは状態がFalseからTrueに
+    変わった足で出すため、例えば「短期線 > 長期線」という状態からゴールデンクロスが、
+    「短期線 < 長期線」からデッドクロスが得られます。
+
+    Args:
+        rule: `sma_cross_rule()`・`band_rule()`・`cloud_rule()`の戻り値
+
+    Returns:
+        (必要な足の本数, 状態を求める関数)
+    """
+    params = rule["params"]
+
+    if rule["kind"] == "cross":
+        short, long = int(params["short"]), int(params["long"])
+
+        def cross(window: Window) -> RuleStates:
+            # 過去N本に欠損（NaN）があれば平均もNaNになり、判定できない扱いになる
+            diff = window["close"][:, -short:].mean(axis=1) - window["close"][
+                :, -long:
+            ].mean(axis=1)
+            valid = ~np.isnan(diff)
+            return {
+                "ゴールデンクロス": (diff > 0, valid),
+                "デッドクロス": (diff < 0, valid),
+            }
+
+        return max(short, long), cross
+
+    if rule["kind"] == "band":
+        period, dev = int(params["period"]), params["dev"]
+
+        def band(window: Window) -> RuleStates:
+            recent = window["close"][:, -period:]
+            middle = recent.mean(axis=1)
+            std = recent.std(axis=1)  # kandと同じく母標準偏差（ddof=0）
+            close = window["close"][:, -1]
+            valid = ~np.isnan(middle) & ~np.isnan(close)
+            return {
+                f"上限バンド接触(σ{dev:g})": (close >= middle + std * dev, valid),
+                f"下限バンド接触(σ{dev:g})": (close <= middle - std * dev, valid),
+            }
+
+        return period, band
+
+    if rule["kind"] == "cloud":
+        conversion, base = int(params["conversion"]), int(params["base"])
+        span2, displacement = int(params["span2"]), int(params["displacement"])
+
+        def midpoint(window: Window, width: int) -> np.ndarray:
+            # 先行スパンは26本前の値を使うため、displacement本前までの区間を見る
+            end = window["high"].shape[1] - displacement
+            high = window["high"][:, end - width : end].max(axis=1)
+            low = window["low"][:, end - width : end].min(axis=1)
+            return (high + low) / 2
+
+        def cloud(window: Window) -> RuleStates:
+            leading_span1 = (midpoint(window, conversion) + midpoint(window, base)) / 2
+            leading_span2 = midpoint(window, span2)
+            top = np.maximum(leading_span1, leading_span2)
+            bottom = np.minimum(leading_span1, leading_span2)
+            close = window["close"][:, -1]
+            valid = ~np.isnan(top) & ~np.isnan(close)
+            return {
+                "雲上抜け": (close > top, valid),
+                "雲下抜け": (close < bottom, valid),
+                "雲入り": ((close >= bottom) & (close <= top), valid),
+            }
+
+        return max(conversion, base, span2) + displacement, cloud
+
+    raise ValueError(f"不明なルールの種類: {rule['kind']}")
+
+
+class AlertEngine:
+    """
+    多数の銘柄に対して、足が確定するたびにルールをまとめて評価するアラートエンジン
+
+    銘柄 × 直近の足のリングバッファを持ち、ルールは銘柄方向にベクトル化した
+    配列の演算で評価します（銘柄ごとのループはありません）。
+    アラートは状態が変わった足でだけ出し、さらに同じ銘柄・同じシグナルは
+    `cooldown`本の間は出しません（状態がすぐに戻ったり戻らなかったりする場合の重複を防ぐ）。
+
+    評価ごとの所要時間を`StreamStats`のヒストグラムに記録し（長時間動かしても
+    メモリは一定）、`budget`秒（デフォルトは1分足の間隔）を超えた回数を数えます。
+
+    Args:
+        tickers: 証券コードのリスト（配列の行の並び）
+        rules: 評価するルールのリスト
+        cooldown: 同じアラートを再び出すまでに空ける足の本数
+        budget: 1回の評価にかけてよい時間（秒）
+    """
+
+    def __init__(
+        self,
+        tickers: Sequence[str],
+        rules: Sequence[AlertRule] = DEFAULT_RULES,
+        cooldown: int = 5,
+        budget: float = 60.0,
+    ) -> None:
+        self.tickers = list(tickers)
+        self.codes = np.array(self.tickers)
+        self.rules = list(rules)
+        compiled = [compile_rule(rule) for rule in self.rules]
+        self.lookback = max(length for length, _ in compiled)
+        self.checks = [check for _, check in compiled]
+        self.cooldown = cooldown
+        self.budget = budget
+
+        n = len(self.tickers)
+        self.buffers = {
+            name: np.full((n, self.lookback), np.nan)
+            for name in ("close", "high", "low")
+        }
+        self.pos = 0  # 次に書き込む列（= 最も古い足の列）
+        self.bars = 0
+
+        # 直前の足の状態と、最後にアラートを出した足の番号（ルール名, 状態の名前ごと）
+        self.previous: dict[tuple[str, str], tuple[np.ndarray, np.ndarray]] = {}
+        self.last_fired: dict[tuple[str, str], np.ndarray] = {}
+        self.stats = StreamStats()
+        self.over_budget = 0
+
+    def window(self) -> Window:
+        # リングバッファを古い順に並べ直す
+        order = (self.pos + np.arange(self.lookback)) % self.lookback
+        return {name: buffer[:, order] for name, buffer in self.buffers.items()}
+
+    def update(
+        self,
+        ts: object,
+        close: np.ndarray,
+        high: np.ndarray | None = None,
+        low: np.ndarray | None = None,
+    ) -> pl.DataFrame:
+        """
+        全銘柄の新しい足を受け取り、ルールを評価してアラートを返す
+
+        Args:
+            ts: 足の時刻（アラートの列にそのまま入る）
+            close: 銘柄ごとの終値（足がない銘柄はNaN）
+            high: 銘柄ごとの高値（省略時は終値）
+            low: 銘柄ごとの安値（省略時は終値）
+
+        Returns:
+            ts, code, rule, signal, price の列のDataFrame
+        """
+        start = time.perf_counter_ns()
+        close = np.asarray(close, dtype=np.float64)
+        self.buffers["close"][:, self.pos] = close
+        self.buffers["high"][:, self.pos] = close if high is None else high
+        self.buffers["low"][:, self.pos] = close if low is None else low
+        self.pos = (self.pos + 1) % self.lookback
+        self.bars += 1
+
+        window = self.window()
+        codes, rules, signals = [], [], []
+        for rule, check in zip(self.rules, self.checks):
+            for signal, (state, valid) in check(window).items():
+                key = (rule["name"], signal)
+                prev_state, prev_valid = self.previous.get(
+                    key, (np.zeros_like(state), np.zeros_like(valid))
+                )
+                last = self.last_fired.setdefault(
+                    key, np.full(len(self.tickers), -self.cooldown - 1)
+                )
+                # 前の足では判定できて状態がFalse、今の足でTrueになった銘柄だけ
+                fired = state & valid & prev_valid & ~prev_state
+                fired &= self.bars - last > self.cooldown
+                last[fired] = self.bars
+                self.previous[key] = (state, valid)
+
+                rows = np.flatnonzero(fired)
+                if len(rows):
+                    codes.append(rows)
+                    rules += [rule["name"]] * len(rows)
+                    signals += [signal] * len(rows)
+
+        rows = np.concatenate(codes) if codes else np.array([], dtype=np.int64)
+        alerts = pl.DataFrame(
+            {
+                "code": self.codes[rows],
+                "rule": rules,
+                "signal": signals,
+                "price": close[rows],
+            },
+            schema={
+                "code": pl.String,
+                "rule": pl.String,
+                "signal": pl.String,
+                "price": pl.Float64,
+            },
+        ).select(pl.lit(ts).alias("ts"), pl.all())
+        elapsed = time.perf_counter_ns() - start
+        self.stats.record(elapsed)
+        if elapsed > self.budget * 1e9:
+            self.over_budget += 1
+        return alerts
+
+    def replay(
+        self,
+        dates: Sequence[object],
+        close: np.ndarray,
+        high: np.ndarray | None = None,
+        low: np.ndarray | None = None,
+    ) -> pl.DataFrame:
+        """
+        銘柄 × 日付の配列（`PricePanel`の配列など）を1本ずつ流し込む
+
+        Returns:
+            すべての足のアラートを縦に積んだDataFrame
+        """
+        if isinstance(dates, np.ndarray):
+            # datetime64はdatetime.dateに変換してからts列に入れる
+            dates = dates.tolist()
+        frames = [
+            self.update(
+                ts,
+                close[:, i],
+                None if high is None else high[:, i],
+                None if low is None else low[:, i],
+            )
+            for i, ts in enumerate(dates)
+        ]
+        return pl.concat(frames)
+
+    def latency_summary(self) -> LatencySummary:
+        latency = self.stats.latency
+        return {
+            "count": latency.total,
+            "mean_ms": latency.mean() / 1e6,
+            "p50_ms": latency.percentile(50) / 1e6,
+            "p99_ms": latency.percentile(99) / 1e6,
+            "max_ms": latency.max / 1e6,
+            "over_budget": self.over_budget,
+        }
@@ -0,0 +1,58 @@
+from collections.abc import Sequence
+
+import numpy as np
+import polars as pl
+
+
+def get_bbands_family(
+    close: pl.Series | np.ndarray,
+    periods: Sequence[int] = (20,),
+    devs: Sequence[float] = (1.0, 2.0),
+    compact: bool = False,
+) -> pl.DataFrame:
+    """
+    複数の期間・偏差のボリンジャーバンドをまとめて計算する
+
+    `ka.bbands()`を偏差ごとに呼ぶと、同じ期間の移動平均と標準偏差を毎回計算し直します。
+    ここでは期間ごとに移動平均と標準偏差を1回だけ計算し、偏差の倍数だけを変えて
+    各バンドを作ります。
+
+    Args:
+        close: 終値
+        periods: 期間のリスト
+        devs: 偏差の倍数のリスト（1.0ならσ1、2.0ならσ2）
+        compact: Trueの場合は出力の列をFloat32にする（計算はFloat64で行う）
+
+    Returns:
+        期間・偏差ごとの列をまとめたDataFrame。列名は期間20・偏差2.0の場合
+        - bb20_middle: ミドルバンド（移動平均）
+        - bb20_std: 標準偏差
+        - bb20_upper_2 / bb20_lower_2: 上限・下限バンド
+        - bb20_percent_b_2: %b（下限バンドが0、上限バンドが1）
+        - bb20_bandwidth_2: バンド幅（(上限 - 下限) / ミドル）
+    """
+    # Decimal型はrolling操作がサポートされていないため、先にFloat64に変換
+    # Float32の入力でも、移動平均・標準偏差の累積はFloat64で行う（桁落ちを防ぐ）
+    close = pl.Series("close", close).cast(pl.Float64)
+
+    columns = []
+    for period in periods:
+        # kandと同じく母標準偏差（ddof=0）を使う
+        middle = close.rolling_mean(period)
+        std = close.rolling_std(period, ddof=0)
+        columns += [middle.alias(f"bb{period}_middle"), std.alias(f"bb{period}_std")]
+        for dev in devs:
+            upper = middle + std * dev
+            lower = middle - std * dev
+            columns += [
+                upper.alias(f"bb{period}_upper_{dev:g}"),
+                lower.alias(f"bb{period}_lower_{dev:g}"),
+                ((close - lower) / (upper - lower)).alias(
+                    f"bb{period}_percent_b_{dev:g}"
+                ),
+                ((upper - lower) / middle).alias(f"bb{period}_bandwidth_{dev:g}"),
+            ]
+    frame = pl.DataFrame(columns)
+    if compact:
+        frame = frame.cast(pl.Float32)
+    return frame
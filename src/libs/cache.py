@@ -0,0 +1,434 @@
+import hashlib
+import inspect
+import json
+import marshal
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+
+OHLCV_COLUMNS = [
+    "date",
+    "open.amount",
+    "high.amount",
+    "low.amount",
+    "close.amount",
+    "volume",
+]
+
+
+def fingerprint(df: pl.DataFrame, columns: list[str] | None = None) -> str:
+    """
+    株価データの内容から決まるハッシュ値を返す
+
+    同じ値の列であれば、取得し直したDataFrameでも同じハッシュ値になります。
+
+    Args:
+        df: 株価データ
+        columns: ハッシュ対象の列（省略時はOHLCVのうちdfに存在する列）
+
+    Returns:
+        16進数のハッシュ文字列
+    """
+    if columns is None:
+        columns = [c for c in OHLCV_COLUMNS if c in df.columns]
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(df.height).encode())
+    for name in columns:
+        s = df[name]
+        # Decimal型はnumpyに変換するとPythonオブジェクトになるため、Float64で比較する
+        if isinstance(s.dtype, pl.Decimal):
+            s = s.cast(pl.Float64)
+        s = s.to_physical()
+        h.update(name.encode())
+        h.update(str(s.dtype).encode())
+        h.update(s.is_null().to_numpy().tobytes())
+        h.update(s.fill_null(0).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def code_version(*parts: Any) -> str:
+    """
+    関数のソースコードやライブラリのバージョンから決まるハッシュ値を返す
+
+    `FigureCache`のキーに含めると、図を作る関数を書き換えたときや、
+    plotly・marimoを更新して出力のHTMLが変わったときに、古い図を使わなくなります。
+
+    Args:
+        parts: 関数（ソースコード）・モジュール（`__version__`）・文字列など
+
+    Returns:
+        16進数のハッシュ文字列
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        if inspect.ismodule(part):
+            h.update(f"{part.__name__}=={getattr(part, '__version__', '')}".encode())
+        elif callable(part):
+            try:
+                h.update(inspect.getsource(part).encode())
+            except (OSError, TypeError):
+                # ソースを取れない関数（対話環境で定義したものなど）はバイトコードを使う
+                h.update(marshal.dumps(part.__code__))
+        else:
+            h.update(str(part).encode())
+    return h.hexdigest()
+
+
+def prune_directory(directory: Path, pattern: str, max_bytes: int) -> None:
+    """
+    ディレクトリ内のファイルの合計サイズが上限を超えたら、最後に使ったのが古い
+    （更新時刻が古い）ファイルから削除する
+
+    Args:
+        directory: 対象のディレクトリ
+        pattern: 対象のファイル名のパターン（"*.arrow"など）
+        max_bytes: 合計サイズの上限
+    """
+    files = []
+    for path in directory.glob(pattern):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:  # 別のスレッドが消した
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    # 直近に書いたものは残す
+    for _, size, path in sorted(files)[:-1]:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+
+
+class IndicatorCache:
+    """
+    指標の計算結果のキャッシュ
+
+    キーは「入力データのハッシュ値 + 指標名 + パラメータ + 計算する関数のハッシュ値」です。
+    メモリ上ではLRUで保持し、合計サイズが`max_bytes`を超えたら古いものから
+    `spill_dir`にArrow IPCファイルとして書き出します。`spill_dir`の合計サイズが
+    `max_disk_bytes`を超えたら、最後に使ってから時間が経ったファイルから削除します。
+
+    複数のスレッド（`libs.parallel.map_tickers()`）から同時に使えます。
+    計算とファイルの読み書きはロックの外で行うため、別の銘柄の処理は並列に進みます。
+
+    Args:
+        max_bytes: メモリ上に保持する計算結果の合計サイズの上限
+        spill_dir: 追い出した結果の保存先（Noneの場合は破棄する）
+        max_disk_bytes: `spill_dir`に保持するファイルの合計サイズの上限
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024**2,
+        spill_dir: str | Path | None = ".cache/indicators",
+        max_disk_bytes: int = 1024**3,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir is not None else None
+        self.entries: OrderedDict[str, pl.DataFrame] = OrderedDict()
+        # メモリから追い出し、ディスクに書き出している途中の結果
+        self.pending: dict[str, pl.DataFrame] = {}
+        self.lock = threading.RLock()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.spills = 0
+
+    @staticmethod
+    def make_key(name: str, df: pl.DataFrame, params: dict[str, Any]) -> str:
+        payload = json.dumps(params, sort_keys=True, default=str)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(fingerprint(df).encode())
+        h.update(name.encode())
+        h.update(payload.encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> pl.DataFrame | None:
+        with self.lock:
+            frame = self.entries.get(key)
+            if frame is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return frame
+            # 別のスレッドがディスクに書き出している途中の結果
+            frame = self.pending.get(key)
+            if frame is not None:
+                self.hits += 1
+
+        if frame is None:
+            # ファイルの読み込みはロックの外で行う（他のスレッドを待たせない）
+            path = self.spill_path(key)
+            try:
+                if path is not None:
+                    frame = pl.read_ipc(path)
+                    # 最後に使った時刻を更新する（ディスクの上限を超えたときに残す順）
+                    os.utime(path)
+            except FileNotFoundError:
+                frame = None
+            with self.lock:
+                if frame is None:
+                    self.misses += 1
+                    return None
+                self.disk_hits += 1
+
+        self.put(key, frame)
+        return frame
+
+    def put(self, key: str, frame: pl.DataFrame) -> None:
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key).estimated_size()
+            self.entries[key] = frame
+            self.nbytes += frame.estimated_size()
+            evicted = self.evict()
+        self.spill(evicted)
+
+    def get_or_compute(
+        self,
+        name: str,
+        df: pl.DataFrame,
+        params: dict[str, Any],
+        compute: Callable[[], pl.DataFrame],
+        version: str = "",
+    ) -> pl.DataFrame:
+        """
+        キャッシュにあればその結果を、なければ計算して保存した結果を返す
+
+        `compute`のソースコードは常にキーに含めます。`compute`から呼ぶ指標の関数を
+        書き換えたときにディスク上の古い結果を使わないよう、その関数は`version`に
+        `code_version(get_bbands_family)`のように渡します。
+
+        Args:
+            name: 指標名
+            df: 入力の株価データ（ハッシュ値をキーに使う）
+            params: 指標のパラメータ
+            compute: 計算する関数
+            version: 計算に使う関数・ライブラリのハッシュ値（`code_version()`の値）
+        """
+        key = self.make_key(
+            name, df, {**params, "_version": code_version(compute, version)}
+        )
+        frame = self.get(key)
+        if frame is None:
+            frame = compute()
+            self.put(key, frame)
+        return frame
+
+    def evict(self) -> list[tuple[str, pl.DataFrame]]:
+        # ロックを持った状態で呼ぶ。上限を超えた分をメモリから外し、書き出す結果を返す
+        # 直近に追加したものは残す（1件で上限を超える場合もメモリに置く）
+        evicted = []
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            key, frame = self.entries.popitem(last=False)
+            self.nbytes -= frame.estimated_size()
+            if self.spill_dir is not None:
+                self.pending[key] = frame
+                evicted.append((key, frame))
+        return evicted
+
+    def spill(self, evicted: list[tuple[str, pl.DataFrame]]) -> None:
+        # 追い出した結果をロックの外でファイルに書き出す
+        for key, frame in evicted:
+            path = self.spill_path(key)
+            if path is not None and not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # 書き込み途中のファイルを読まないよう、一時ファイルからリネームする
+                tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+                frame.write_ipc(tmp)
+                tmp.replace(path)
+                with self.lock:
+                    self.spills += 1
+            with self.lock:
+                if self.pending.get(key) is frame:
+                    del self.pending[key]
+        if evicted and self.spill_dir is not None:
+            prune_directory(self.spill_dir, "*.arrow", self.max_disk_bytes)
+
+    def spill_path(self, key: str) -> Path | None:
+        if self.spill_dir is None:
+            return None
+        return self.spill_dir / f"{key}.arrow"
+
+    def clear(self, disk: bool = False) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.pending.clear()
+            self.nbytes = 0
+        if disk and self.spill_dir is not None and self.spill_dir.exists():
+            for path in self.spill_dir.glob("*.arrow"):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "spills": self.spills,
+        }
+
+
+class FigureCache:
+    """
+    チャートをシリアライズした結果（JSON・HTML）のキャッシュ
+
+    Plotlyの図は、トレースのオブジェクトを作る処理と、それをJSONに変換する処理の
+    両方に時間がかかります（一目均衡表の雲は区間ごとにトレースがあるため特に重い）。
+    ここでは「株価データのハッシュ値 + 図の名前 + パラメータ」をキーに、
+    シリアライズ済みの文字列を保持し、同じ銘柄・同じパラメータの再描画では
+    図を作らずにその文字列をそのまま返します。
+
+    `cache_dir`を指定すると、ディスクにも書き込みます（カーネルの再起動後や
+    HTMLへのエクスポート時にも使える）。ディスク上の合計サイズが`max_disk_bytes`を
+    超えたら、最後に使ってから時間が経ったファイルから削除します。
+
+    図を作る関数やplotly・marimoのバージョンが変わると、同じデータ・パラメータでも
+    出力が変わるため、`get_or_render()`の`version`（`code_version()`の値）もキーに含めます。
+
+    Args:
+        max_bytes: メモリ上に保持する文字列の合計の長さ（文字数）の上限
+        cache_dir: 保存先（Noneの場合はメモリ上だけに保持する）
+        max_disk_bytes: ディスク上に保持するファイルの合計サイズの上限
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024**2,
+        cache_dir: str | Path | None = ".cache/figures",
+        max_disk_bytes: int = 512 * 1024**2,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.lock = threading.RLock()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return payload
+
+        # ファイルの読み込みはロックの外で行う
+        path = self.path(key)
+        try:
+            if path is not None:
+                payload = path.read_text(encoding="utf-8")
+                # 最後に使った時刻を更新する（ディスクの上限を超えたときに残す順）
+                os.utime(path)
+        except FileNotFoundError:
+            payload = None
+        with self.lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.remember(key, payload)
+        return payload
+
+    def put(self, key: str, payload: str) -> None:
+        self.remember(key, payload)
+        path = self.path(key)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 同じキーを複数のスレッドが書いても壊れないよう、一時ファイルはスレッドごとに分ける
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            tmp.replace(path)
+            self.prune()
+
+    def prune(self) -> None:
+        if self.cache_dir is not None:
+            prune_directory(self.cache_dir, "*.txt", self.max_disk_bytes)
+
+    def remember(self, key: str, payload: str) -> None:
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= len(self.entries.pop(key))
+            self.entries[key] = payload
+            self.nbytes += len(payload)
+            # 直近に追加したものは残す（ディスクに書いたものは後で読み直せる）
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, old = self.entries.popitem(last=False)
+                self.nbytes -= len(old)
+
+    def get_or_render(
+        self,
+        name: str,
+        df: pl.DataFrame,
+        params: dict[str, Any],
+        build: Callable[[], Any],
+        render: Callable[[Any], str] | None = None,
+        version: str = "",
+    ) -> str:
+        """
+        キャッシュにあればその文字列を、なければ図を作ってシリアライズした文字列を返す
+
+        Args:
+            name: 図の名前
+            df: 図の元になった株価データ（ハッシュ値をキーに使う）
+            params: 図に影響するパラメータ（期間・タイトル・テーマなど）
+            build: 図を作る関数
+            render: 図を文字列にする関数（省略時は`plotly.io.to_json`）
+                marimoでは`lambda fig: mo.as_html(fig).text`を渡すと、
+                そのまま`mo.Html()`で表示できるHTMLを保持できる
+            version: 図を作る関数・描画に使うライブラリのハッシュ値
+                （`code_version(get_fig, mo)`など）。plotlyのバージョンは常にキーに含める
+
+        Returns:
+            シリアライズした図
+        """
+        import plotly
+        import plotly.io as pio
+
+        key = IndicatorCache.make_key(
+            name, df, {**params, "_version": [plotly.__version__, version]}
+        )
+        payload = self.get(key)
+        if payload is None:
+            if render is None:
+                render = pio.to_json
+            payload = render(build())
+            self.put(key, payload)
+        return payload
+
+    def path(self, key: str) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{key}.txt"
+
+    def clear(self, disk: bool = False) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+        if disk and self.cache_dir is not None and self.cache_dir.exists():
+            for path in self.cache_dir.glob("*.txt"):
+                path.unlink()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
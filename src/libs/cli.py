@@ -0,0 +1,425 @@
+import argparse
+import sys
+
+# marimo・plotlyはここではimportしない。
+# polars・kand・yfinance_plもサブコマンドの実行時に初めて読み込む。
+DETECTORS = ("sma", "bbands", "ichimoku")
+
+
+def positive_int(value: str) -> int:
+    # 「直近N営業日」・スレッド数などの個数の引数（0以下はエラーにする）
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"1以上の整数を指定してください: {value}")
+    return number
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="py-stock-learning",
+        description="ノートブックを使わずにテクニカル指標の売買シグナルを出力する",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # 表を出力するサブコマンドに共通の引数
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument(
+        "--format", choices=("table", "csv", "json"), default="table", help="出力形式"
+    )
+
+    signals = subparsers.add_parser(
+        "signals", help="銘柄ごとのシグナル一覧を出力する", parents=[output]
+    )
+    signals.add_argument("codes", nargs="+", help="証券コード（例: 7203.T 8381.T）")
+    signals.add_argument("--period", default="1y", help="取得期間（デフォルト: 1y）")
+    signals.add_argument("--interval", default="1d", help="足の種類（デフォルト: 1d）")
+    signals.add_argument(
+        "--detectors",
+        default=",".join(DETECTORS),
+        help=f"使用する検出器をカンマ区切りで指定（{', '.join(DETECTORS)}）",
+    )
+    signals.add_argument(
+        "--last",
+        type=positive_int,
+        default=None,
+        help="直近N営業日のシグナルだけを出力する",
+    )
+    signals.add_argument(
+        "--store",
+        default=None,
+        help="シグナルの履歴の保存先（指定すると追記する。将来の日付の予定は保存しない）",
+    )
+    signals.add_argument(
+        "--workers",
+        type=positive_int,
+        default=None,
+        help="銘柄ごとの処理に使うスレッド数（省略時はGILの有無とCPUコア数から決める）",
+    )
+
+    update = subparsers.add_parser(
+        "update", help="保存済みの指標に新しい足の分だけ追記する"
+    )
+    update.add_argument("codes", nargs="+", help="証券コード（例: 7203.T 8381.T）")
+    update.add_argument(
+        "--period", default="5d", help="新しい足の取得期間（デフォルト: 5d）"
+    )
+    update.add_argument(
+        "--root", default=".cache/incremental", help="指標の保存先ディレクトリ"
+    )
+    update.add_argument(
+        "--compact", action="store_true", help="株価と指標をFloat32で保存する"
+    )
+    update.add_argument(
+        "--full", action="store_true", help="全履歴（max）から計算し直す"
+    )
+
+    panel = subparsers.add_parser(
+        "panel", help="複数銘柄の株価を銘柄×取引日のパネルとして保存する"
+    )
+    panel.add_argument("codes", nargs="+", help="証券コード（例: 7203.T 8381.T）")
+    panel.add_argument("--period", default="5y", help="取得期間（デフォルト: 5y）")
+    panel.add_argument("--root", default=".cache/panel", help="パネルの保存先")
+    panel.add_argument("--compact", action="store_true", help="株価をFloat32で保存する")
+    panel.add_argument(
+        "--workers", type=positive_int, default=None, help="株価の取得に使うスレッド数"
+    )
+
+    alerts = subparsers.add_parser(
+        "alerts",
+        help="保存済みのパネルの全銘柄にアラートのルールを適用する",
+        parents=[output],
+    )
+    alerts.add_argument("--root", default=".cache/panel", help="パネルの保存先")
+    alerts.add_argument(
+        "--last",
+        type=positive_int,
+        default=5,
+        help="直近N営業日のアラートだけを出力する",
+    )
+    alerts.add_argument(
+        "--cooldown",
+        type=positive_int,
+        default=5,
+        help="同じアラートを再び出すまでに空ける足の本数",
+    )
+
+    screen = subparsers.add_parser(
+        "screen",
+        help="保存済みのパネルの全銘柄からスクイーズ・バンド接触を検出する",
+        parents=[output],
+    )
+    screen.add_argument("--root", default=".cache/panel", help="パネルの保存先")
+    screen.add_argument(
+        "--last",
+        type=positive_int,
+        default=1,
+        help="直近N営業日のイベントだけを出力する",
+    )
+    screen.add_argument(
+        "--rank-window",
+        type=int,
+        default=126,
+        help="バンド幅の順位を求める期間（デフォルト: 126）",
+    )
+    screen.add_argument(
+        "--squeeze",
+        type=float,
+        default=0.1,
+        help="スクイーズとみなすバンド幅の順位（デフォルト: 0.1）",
+    )
+
+    optimize = subparsers.add_parser(
+        "optimize",
+        help="保存済みのパネルで指標のパラメーターをウォークフォワード最適化する",
+        parents=[output],
+    )
+    optimize.add_argument(
+        "strategy", choices=("sma", "bbands", "ichimoku"), help="最適化する指標"
+    )
+    optimize.add_argument("--root", default=".cache/panel", help="パネルの保存先")
+    optimize.add_argument(
+        "--train", type=int, default=490, help="学習期間の本数（デフォルト: 490）"
+    )
+    optimize.add_argument(
+        "--test", type=int, default=120, help="検証期間の本数（デフォルト: 120）"
+    )
+    optimize.add_argument(
+        "--workers",
+        type=positive_int,
+        default=None,
+        help="ワーカープロセス数（デフォルト: CPUコア数）",
+    )
+
+    history = subparsers.add_parser(
+        "history",
+        help="保存済みのシグナルの履歴を、指標を計算し直さずに検索する",
+        parents=[output],
+    )
+    history.add_argument("--store", default=".cache/signals", help="履歴の保存先")
+    history.add_argument("--code", action="append", help="証券コード（複数指定可）")
+    history.add_argument(
+        "--signal",
+        action="append",
+        help="シグナル名（例: ゴールデンクロス、複数指定可）",
+    )
+    history.add_argument(
+        "--sessions",
+        type=positive_int,
+        default=None,
+        help="直近N営業日のシグナルだけを出力する",
+    )
+
+    return parser
+
+
+def write_frame(df, fmt: str) -> None:
+    import polars as pl
+
+    if fmt == "csv":
+        sys.stdout.write(df.write_csv())
+    elif fmt == "json":
+        sys.stdout.write(df.write_json() + "\n")
+    else:
+        with pl.Config(tbl_rows=-1, tbl_hide_dataframe_shape=True):
+            print(df)
+
+
+def collect_signals(df, detectors: list[str]):
+    import polars as pl
+
+    frames = []
+    if "sma" in detectors:
+        from libs.signals import detect_sma_cross, get_sma_values
+
+        frames.append(
+            detect_sma_cross(get_sma_values(df)).with_columns(detector=pl.lit("sma"))
+        )
+    if "bbands" in detectors:
+        from libs.signals import detect_band_touch, get_bbands_values
+
+        frames.append(
+            detect_band_touch(get_bbands_values(df)).with_columns(
+                detector=pl.lit("bbands")
+            )
+        )
+    if "ichimoku" in detectors:
+        from libs.ichimoku import (
+            detect_cloud_twist,
+            detect_ichimoku_signals,
+            get_future_cloud,
+            get_ichimoku_values,
+        )
+
+        frames.append(
+            detect_ichimoku_signals(df, get_ichimoku_values(df)).with_columns(
+                detector=pl.lit("ichimoku")
+            )
+        )
+        # 先行スパンは将来の営業日まであるため、これから来る雲のねじれも出力する
+        frames.append(
+            detect_cloud_twist(get_future_cloud(df)).with_columns(
+                detector=pl.lit("ichimoku")
+            )
+        )
+    return pl.concat(frames).sort("date")
+
+
+def run_signals(args: argparse.Namespace) -> int:
+    import polars as pl
+
+    from libs.data import fetch_history
+    from libs.parallel import map_tickers
+
+    detectors = [d.strip() for d in args.detectors.split(",") if d.strip()]
+    unknown = sorted(set(detectors) - set(DETECTORS))
+    if unknown or not detectors:
+        print(f"不明な検出器: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    def ticker_signals(code: str):
+        # 取得・指標の計算・シグナルの検出を1銘柄ずつスレッドで行う
+        hist = fetch_history(code, period=args.period, interval=args.interval)
+        if hist.is_empty():
+            return None
+        signals = collect_signals(hist, detectors)
+        if args.last is not None:
+            cutoff = hist["date"].tail(args.last)[0]
+            signals = signals.filter(pl.col("date") >= cutoff)
+        # 最後の足より後の日付は予定（将来の雲のねじれ）で、次回の実行で変わりうる
+        return signals.with_columns(
+            ticker=pl.lit(code), projected=pl.col("date") > hist["date"].max()
+        )
+
+    frames, run = map_tickers(ticker_signals, args.codes, args.workers)
+    for code, error in run["errors"].items():
+        print(f"{code}: {error}", file=sys.stderr)
+    results = []
+    for code, signals in frames.items():
+        if signals is None:
+            print(f"{code}: 株価データを取得できませんでした", file=sys.stderr)
+            continue
+        results.append(signals)
+
+    if not results:
+        return 1
+    signals = pl.concat(results)
+    table = signals.select("ticker", "date", "detector", "signal", "price")
+    if args.store is not None:
+        from libs.signal_store import SignalStore
+
+        # 履歴には実際の足で確定したシグナルだけを残す
+        confirmed = table.filter(~signals["projected"])
+        added = SignalStore(args.store).append(confirmed.rename({"ticker": "code"}))
+        print(f"{added}件のシグナルを履歴に追記しました", file=sys.stderr)
+
+    write_frame(table, args.format)
+    return 0
+
+
+def run_update(args: argparse.Namespace) -> int:
+    from libs.data import fetch_history
+    from libs.incremental import IncrementalIndicators
+
+    store = IncrementalIndicators(args.root, compact=args.compact)
+    for code in args.codes:
+        # 初回は全履歴から計算する
+        if args.full or not store.exists(code):
+            rows = store.materialize(code, fetch_history(code, period="max"))
+        else:
+            try:
+                rows = store.append(code, fetch_history(code, period=args.period))
+            except ValueError as error:
+                # 間が空いた・過去の株価が調整された場合は全履歴から計算し直す
+                print(f"{error}。全履歴から計算し直します", file=sys.stderr)
+                rows = store.materialize(code, fetch_history(code, period="max"))
+        print(f"{code}: {rows.height}行を追記しました")
+    return 0
+
+
+def run_panel(args: argparse.Namespace) -> int:
+    from libs.data import fetch_history
+    from libs.panel import PricePanel
+    from libs.parallel import map_tickers
+
+    histories, run = map_tickers(
+        lambda code: fetch_history(code, period=args.period), args.codes, args.workers
+    )
+    frames = {}
+    for code in args.codes:
+        hist = histories.get(code)
+        if hist is None or hist.is_empty():
+            reason = run["errors"].get(code, "株価データを取得できませんでした")
+            print(f"{code}: {reason}", file=sys.stderr)
+            continue
+        frames[code] = hist
+    if not frames:
+        return 1
+    panel = PricePanel.from_frames(args.root, frames, compact=args.compact)
+    print(f"{len(panel.tickers)}銘柄 × {len(panel.calendar)}日を保存しました")
+    return 0
+
+
+def run_alerts(args: argparse.Namespace) -> int:
+    import polars as pl
+
+    from libs.alerts import AlertEngine
+    from libs.panel import PricePanel
+
+    panel = PricePanel(args.root)
+    engine = AlertEngine(panel.tickers, cooldown=args.cooldown)
+    table = engine.replay(
+        panel.calendar,
+        panel.field("close"),
+        panel.field("high"),
+        panel.field("low"),
+    )
+    cutoff = panel.calendar[-args.last :][0].item()
+    table = table.filter(pl.col("ts") >= cutoff).sort("ts", "code")
+
+    write_frame(table, args.format)
+
+    latency = engine.latency_summary()
+    print(
+        f"{len(panel.tickers)}銘柄 × {latency['count']}本を評価しました"
+        f"（1本あたり p50 {latency['p50_ms']:.2f}ms / p99 {latency['p99_ms']:.2f}ms）",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def run_screen(args: argparse.Namespace) -> int:
+    from libs.panel import PricePanel
+    from libs.screener import screen_panel
+
+    panel = PricePanel(args.root)
+    table = screen_panel(
+        panel, rank_window=args.rank_window, squeeze=args.squeeze, last=args.last
+    )
+
+    write_frame(table, args.format)
+    return 0
+
+
+def run_optimize(args: argparse.Namespace) -> int:
+    import polars as pl
+
+    from libs.optimizer import walk_forward
+    from libs.panel import PricePanel
+
+    panel = PricePanel(args.root)
+    table = walk_forward(
+        panel, args.strategy, train=args.train, test=args.test, workers=args.workers
+    )
+    # パラメーターごとに、選ばれた回数と検証期間の平均シャープレシオを集計する
+    summary = (
+        table.group_by("params")
+        .agg(
+            pl.len().alias("chosen"),
+            pl.col("test_sharpe").mean().alias("mean_test_sharpe"),
+        )
+        .sort("chosen", descending=True)
+    )
+
+    # 表形式では集計を、CSV・JSONでは分割ごとの結果をそのまま出力する
+    write_frame(summary if args.format == "table" else table, args.format)
+    return 0
+
+
+def run_history(args: argparse.Namespace) -> int:
+    import datetime as dt
+
+    from libs.jpx_calendar import session_offset
+    from libs.signal_store import SignalStore
+
+    start = None
+    if args.sessions is not None:
+        start = session_offset(dt.date.today(), -(args.sessions - 1)).item()
+    table = SignalStore(args.store).query(
+        signals=args.signal, codes=args.code, start=start
+    )
+
+    write_frame(table, args.format)
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "signals":
+        return run_signals(args)
+    if args.command == "update":
+        return run_update(args)
+    if args.command == "panel":
+        return run_panel(args)
+    if args.command == "alerts":
+        return run_alerts(args)
+    if args.command == "screen":
+        return run_screen(args)
+    if args.command == "optimize":
+        return run_optimize(args)
+    if args.command == "history":
+        return run_history(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
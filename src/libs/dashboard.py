@@ -0,0 +1,250 @@
+import warnings
+from collections.abc import Mapping
+from typing import Literal, TypedDict
+
+import numpy as np
+import plotly.graph_objs as go
+import polars as pl
+
+from libs.panel import PricePanel, rolling_midpoint
+from libs.screener import get_band_metrics
+
+OverviewMode = Literal["ichimoku", "bbands"]
+
+# 状態ごとの線の色（ローソク足と同じく上昇は赤、下降は緑）
+STATE_COLORS = {
+    "ichimoku": {"雲の上": "red", "雲の中": "gray", "雲の下": "green"},
+    "bbands": {
+        "上限バンド接触": "red",
+        "スクイーズ": "darkorange",
+        "バンド内": "gray",
+        "下限バンド接触": "green",
+    },
+}
+
+
+class OverviewLines(TypedDict):
+    # いずれも銘柄 × 表示する日数の配列
+    close: np.ndarray
+    upper: np.ndarray  # 雲の上端・上限バンド
+    lower: np.ndarray  # 雲の下端・下限バンド
+
+
+def get_overview_lines(
+    panel: PricePanel, mode: OverviewMode = "ichimoku", days: int = 120
+) -> tuple[OverviewLines, np.ndarray]:
+    """
+    パネルの全銘柄について、直近`days`本の終値と雲・バンドの上端と下端を求める
+
+    Returns:
+        (各線の配列, 銘柄ごとの最新の足の状態名の配列)
+    """
+    if mode == "ichimoku":
+        # 先行スパン2（52本）を26本ずらすため、表示する日数より77本多く読む
+        start = max(len(panel.calendar) - days - 52 - 26 + 1, 0)
+        high = np.asarray(panel.field("high")[:, start:], dtype=np.float64)
+        low = np.asarray(panel.field("low")[:, start:], dtype=np.float64)
+        close = np.asarray(panel.field("close")[:, start:], dtype=np.float64)
+        leading_span1 = (
+            rolling_midpoint(high, low, 9) + rolling_midpoint(high, low, 26)
+        ) / 2
+        leading_span2 = rolling_midpoint(high, low, 52)
+        # 先行スパンを26本未来にずらす
+        span1 = np.full(close.shape, np.nan)
+        span2 = np.full(close.shape, np.nan)
+        span1[:, 26:] = leading_span1[:, :-26]
+        span2[:, 26:] = leading_span2[:, :-26]
+        upper = np.fmax(span1, span2)
+        lower = np.fmin(span1, span2)
+        latest = close[:, -1]
+        state = np.where(
+            latest > upper[:, -1],
+            "雲の上",
+            np.where(latest < lower[:, -1], "雲の下", "雲の中"),
+        )
+    else:
+        # バンド幅の順位（126本）を求めるため、表示する日数より多めに読む
+        start = max(len(panel.calendar) - days - 126 - 20 + 1, 0)
+        close = np.asarray(panel.field("close")[:, start:], dtype=np.float64)
+        metrics = get_band_metrics(close)
+        upper, lower = metrics["upper"], metrics["lower"]
+        percent_b = metrics["percent_b"][:, -1]
+        state = np.where(
+            percent_b >= 1,
+            "上限バンド接触",
+            np.where(
+                percent_b <= 0,
+                "下限バンド接触",
+                np.where(
+                    metrics["bandwidth_rank"][:, -1] <= 0.1, "スクイーズ", "バンド内"
+                ),
+            ),
+        )
+
+    # 最新の足がない銘柄は描画しない
+    state = np.where(np.isnan(close[:, -1]), "データなし", state)
+
+    lines: OverviewLines = {
+        "close": close[:, -days:],
+        "upper": upper[:, -days:],
+        "lower": lower[:, -days:],
+    }
+    return lines, state
+
+
+def build_overview_figure(
+    panel: PricePanel,
+    mode: OverviewMode = "ichimoku",
+    days: int = 120,
+    columns: int = 10,
+    names: Mapping[str, str] | None = None,
+) -> go.Figure:
+    """
+    多数の銘柄の小さなチャートを格子状に並べた1枚の図を作る
+
+    銘柄ごとに図やサブプロットを作ると、数百銘柄では描画に時間がかかります。
+    ここでは全銘柄の線を1つの座標系の中で銘柄ごとのマス目に配置し、
+    NaNで区切って状態ごとに1つの`Scattergl`（WebGL）トレースにまとめます。
+    トレースの数は銘柄数によらず一定です。
+
+    Args:
+        panel: 株価のパネル
+        mode: "ichimoku"なら雲、"bbands"ならσ2のボリンジャーバンドを重ねる
+        days: 表示する足の本数
+        columns: 1行に並べる銘柄の数
+        names: 証券コード → 表示名（省略時は証券コード）
+
+    Returns:
+        plotlyのFigure
+    """
+    lines, state = get_overview_lines(panel, mode, days)
+    n, width = lines["close"].shape
+    rows = -(-n // columns)
+    index = np.arange(n)
+    col_offset = (index % columns).astype(np.float64)
+    row_offset = (rows - 1 - index // columns).astype(np.float64)
+
+    # 銘柄ごとに、終値と雲・バンドを合わせた範囲がマス目の縦10〜90%に収まるようにする
+    stacked = np.stack([lines["close"], lines["upper"], lines["lower"]])
+    with warnings.catch_warnings():
+        # すべて欠損の銘柄はNaNのままでよい
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lo = np.nanmin(stacked, axis=(0, 2))
+        hi = np.nanmax(stacked, axis=(0, 2))
+    scale = np.where(hi > lo, hi - lo, 1.0)
+
+    x_local = np.linspace(0.05, 0.95, width)
+
+    def flatten(values: np.ndarray, rows_: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # 銘柄ごとの線を、末尾にNaNを挟んで1本の配列につなげる
+        y = (
+            row_offset[rows_, None]
+            + 0.1
+            + 0.8 * (values[rows_] - lo[rows_, None]) / (scale[rows_, None])
+        )
+        x = col_offset[rows_, None] + x_local[None, :]
+        gap = np.full((len(rows_), 1), np.nan)
+        return np.hstack([x, gap]).ravel(), np.hstack([y, gap]).ravel()
+
+    traces = []
+    # 雲・バンドの上端と下端（全銘柄で1トレース）
+    x_upper, y_upper = flatten(lines["upper"], index)
+    x_lower, y_lower = flatten(lines["lower"], index)
+    traces.append(
+        go.Scattergl(
+            x=np.concatenate([x_upper, x_lower]),
+            y=np.concatenate([y_upper, y_lower]),
+            mode="lines",
+            line={"color": "gainsboro", "width": 1},
+            hoverinfo="skip",
+            name="雲" if mode == "ichimoku" else "σ2バンド",
+        )
+    )
+
+    # 終値（状態ごとに1トレース）
+    codes = np.array(panel.tickers)
+    for name, color in STATE_COLORS[mode].items():
+        selected = index[state == name]
+        if len(selected) == 0:
+            continue
+        x, y = flatten(lines["close"], selected)
+        prices = np.hstack(
+            [lines["close"][selected], np.full((len(selected), 1), np.nan)]
+        ).ravel()
+        traces.append(
+            go.Scattergl(
+                x=x,
+                y=y,
+                mode="lines",
+                line={"color": color, "width": 1.2},
+                text=np.repeat(codes[selected], width + 1),
+                customdata=prices,
+                hovertemplate="%{text}<br>%{customdata:,.1f}<extra></extra>",
+                name=f"{name}（{len(selected)}銘柄）",
+            )
+        )
+
+    # 銘柄名（全銘柄で1トレース）
+    labels = [names.get(code, code) if names else code for code in panel.tickers]
+    traces.append(
+        go.Scattergl(
+            x=col_offset + 0.05,
+            y=row_offset + 0.97,
+            mode="text",
+            text=labels,
+            textposition="bottom right",
+            textfont={"size": 9},
+            hoverinfo="skip",
+            showlegend=False,
+        )
+    )
+
+    layout = {
+        "height": max(rows * 90, 300),
+        "width": 1028,
+        "title": {
+            "text": f"{n}銘柄の概要（直近{width}本）",
+            "x": 0.5,
+            "xanchor": "center",
+            "font": {"size": 24, "weight": "bold"},
+        },
+        "xaxis": {
+            "range": [0, columns],
+            "showticklabels": False,
+            "showgrid": False,
+            "zeroline": False,
+        },
+        "yaxis": {
+            "range": [0, rows],
+            "showticklabels": False,
+            "showgrid": False,
+            "zeroline": False,
+        },
+        "legend": {
+            "orientation": "h",
+            "yanchor": "top",
+            "y": -0.02,
+            "xanchor": "center",
+            "x": 0.5,
+        },
+        "margin": {"l": 10, "r": 10, "t": 60, "b": 40},
+    }
+    return go.Figure(data=traces, layout=go.Layout(layout))
+
+
+def get_overview_table(
+    panel: PricePanel, mode: OverviewMode = "ichimoku", days: int = 120
+) -> pl.DataFrame:
+    # 図と同じ状態を、銘柄ごとの表として返す
+    lines, state = get_overview_lines(panel, mode, days)
+    first = lines["close"][:, 0]
+    latest = lines["close"][:, -1]
+    return pl.DataFrame(
+        {
+            "code": panel.tickers,
+            "state": state,
+            "close": latest,
+            "change": (latest - first) / first,
+        },
+        nan_to_null=True,
+    )
@@ -0,0 +1,28 @@
+import polars as pl
+
+OHLC_COLUMNS = ["open.amount", "high.amount", "low.amount", "close.amount"]
+
+
+def fetch_history(code: str, period: str = "1y", interval: str = "1d") -> pl.DataFrame:
+    # yfinance_plは読み込みが重いため、実際に取得するときだけimportする
+    import yfinance_pl as yf
+
+    return yf.Ticker(code).history(period=period, interval=interval)
+
+
+def price_dtype(compact: bool = False) -> type[pl.DataType]:
+    # コンパクトモードでは価格と指標の出力をFloat32で持つ（メモリ・キャッシュの使用量が半分）
+    # 株価の有効桁数（7桁程度）はFloat32でも表せる
+    return pl.Float32 if compact else pl.Float64
+
+
+def to_float64(df: pl.DataFrame) -> pl.DataFrame:
+    # Decimal型はrolling操作や描画に使えないため、OHLCをFloat64に変換
+    return df.with_columns([pl.col(c).cast(pl.Float64) for c in OHLC_COLUMNS])
+
+
+def to_float(df: pl.DataFrame, compact: bool = False) -> pl.DataFrame:
+    # OHLCと出来高をFloat64（compact=TrueならFloat32）に変換
+    dtype = price_dtype(compact)
+    columns = [c for c in [*OHLC_COLUMNS, "volume"] if c in df.columns]
+    return df.with_columns([pl.col(c).cast(dtype) for c in columns])
@@ -1,7 +1,12 @@
 from typing import TypedDict
 
+import numpy as np
 import polars as pl
 
+from libs.data import price_dtype
+from libs.jpx_calendar import extend_sessions
+from libs.range_index import RangeExtremaIndex
+
 
 class IchimokuValues(TypedDict):
     conversion_line: pl.Series
@@ -11,27 +16,47 @@ class IchimokuValues(TypedDict):
     lagging_span: pl.Series
 
 
-def get_ichimoku_values(df: pl.DataFrame) -> IchimokuValues:
+def get_ichimoku_values(
+    df: pl.DataFrame,
+    conversion: int = 9,
+    base: int = 26,
+    span2: int = 52,
+    displacement: int = 26,
+    index: RangeExtremaIndex | None = None,
+    compact: bool = False,
+) -> IchimokuValues:
     # Decimal型はrolling操作がサポートされていないため、先にFloat64に変換
-    high = df["high.amount"].cast(pl.Float64)
-    low = df["low.amount"].cast(pl.Float64)
-    close = df["close.amount"].cast(pl.Float64)
+    # 最大値・最小値は丸め誤差が出ないため、compact=TrueならFloat32のまま計算する
+    dtype = price_dtype(compact)
+    high = df["high.amount"].cast(dtype)
+    low = df["low.amount"].cast(dtype)
+    close = df["close.amount"].cast(dtype)
+
+    def midpoint(window: int) -> pl.Series:
+        # 過去N日間の (Max + Min) / 2
+        if index is not None:
+            # 構築済みのスパーステーブルから1本あたりO(1)で求める
+            # 将来の営業日の行（株価がnull）はrolling計算と同じくnullにする
+            values = index.midpoint(window)
+            values[(high.is_null() | low.is_null()).to_numpy()] = np.nan
+            return pl.Series(values, nan_to_null=True).cast(dtype)
+        return (high.rolling_max(window) + low.rolling_min(window)) / 2
 
     # 転換線: 過去9日間の (Max + Min) / 2
-    conversion_line = (high.rolling_max(9) + low.rolling_min(9)) / 2
+    conversion_line = midpoint(conversion)
 
     # 基準線: 過去26日間の (Max + Min) / 2
-    base_line = (high.rolling_max(26) + low.rolling_min(26)) / 2
+    base_line = midpoint(base)
 
     # 先行スパン1: (転換線 + 基準線) / 2 を26日未来にずらす
     # Polarsのshiftはデフォルトで空いた部分をnullで埋めます
-    leading_span1 = ((conversion_line + base_line) / 2).shift(26)
+    leading_span1 = ((conversion_line + base_line) / 2).shift(displacement)
 
     # 先行スパン2: 過去52日間の (Max + Min) / 2 を26日未来にずらす
-    leading_span2 = ((high.rolling_max(52) + low.rolling_min(52)) / 2).shift(26)
+    leading_span2 = midpoint(span2).shift(displacement)
 
     # 遅行スパン: 今日の終値を26日過去にずらす
-    lagging_span = close.shift(-26)
+    lagging_span = close.shift(-displacement)
 
     return {
         "conversion_line": conversion_line,
@@ -40,3 +65,162 @@ def get_ichimoku_values(df: pl.DataFrame) -> IchimokuValues:
         "leading_span2": leading_span2,
         "lagging_span": lagging_span,
     }
+
+
+def detect_ichimoku_signals(df: pl.DataFrame, values: IchimokuValues) -> pl.DataFrame:
+    """
+    転換線と基準線のクロス（好転・逆転）と、終値による雲の上抜け・下抜けを検出する
+
+    Args:
+        df: 株価データ（date, close.amount列を含む）
+        values: `get_ichimoku_values()`の戻り値
+
+    Returns:
+        date, price, signal の3列のDataFrame（日付順）
+    """
+    flags = pl.DataFrame(
+        {
+            "date": df["date"],
+            "price": df["close.amount"].cast(pl.Float64),
+            "diff": values["conversion_line"] - values["base_line"],
+            "span1": values["leading_span1"],
+            "span2": values["leading_span2"],
+        }
+    ).with_columns(
+        above_cloud=pl.col("price") > pl.max_horizontal("span1", "span2"),
+        below_cloud=pl.col("price") < pl.min_horizontal("span1", "span2"),
+    )
+    prev_diff = pl.col("diff").shift(1)
+    conditions = {
+        # 好転: 転換線が基準線を上抜ける / 逆転: 転換線が基準線を下抜ける
+        "好転": (prev_diff < 0) & (pl.col("diff") > 0),
+        "逆転": (prev_diff > 0) & (pl.col("diff") < 0),
+        # 雲上抜け: 前日は雲の上になかった終値が雲の上に出る（雲下抜けも同様）
+        "雲上抜け": pl.col("above_cloud") & ~pl.col("above_cloud").shift(1),
+        "雲下抜け": pl.col("below_cloud") & ~pl.col("below_cloud").shift(1),
+    }
+    signals = [
+        flags.filter(condition).select(
+            pl.col("date"), pl.col("price"), pl.lit(name).alias("signal")
+        )
+        for name, condition in conditions.items()
+    ]
+    return pl.concat(signals).sort("date")
+
+
+def get_future_cloud(
+    df: pl.DataFrame,
+    conversion: int = 9,
+    base: int = 26,
+    span2: int = 52,
+    displacement: int = 26,
+) -> pl.DataFrame:
+    """
+    先行スパンの将来の営業日の値（まだ来ていない日付の雲）を求める
+
+    株価データの末尾に取引所の営業日を`displacement`行追加してから計算するため、
+    土日・祝日・年末年始を除いた実際の日付になります。
+
+    Returns:
+        date, leading_span1, leading_span2 の列のDataFrame（`displacement + 1`行）
+        先頭の行は最後の足の日の値で、最初の将来の営業日のねじれの判定に使う
+    """
+    extended = extend_sessions(df, displacement)
+    values = get_ichimoku_values(extended, conversion, base, span2, displacement)
+    return pl.DataFrame(
+        {
+            "date": extended["date"],
+            "leading_span1": values["leading_span1"],
+            "leading_span2": values["leading_span2"],
+        }
+    ).tail(displacement + 1)
+
+
+def detect_cloud_twist(future_cloud: pl.DataFrame) -> pl.DataFrame:
+    """
+    将来の雲のねじれ（先行スパン1と2の上下が入れ替わる日）を検出する
+
+    雲のねじれはトレンド転換が起きやすい日の目安とされます。
+
+    最後の足の日（`future_cloud`の先頭の行）の値と比べるため、最初の将来の
+    営業日に起きるねじれも検出します。先頭の行そのものは結果に含みません。
+
+    Args:
+        future_cloud: `get_future_cloud()`の戻り値
+
+    Returns:
+        date, price, signal の3列のDataFrame（priceは先行スパン1の値）
+    """
+    diff = pl.col("leading_span1") - pl.col("leading_span2")
+    return future_cloud.filter(
+        (diff.sign() * diff.shift(1).sign()) < 0,
+    ).select(
+        pl.col("date"),
+        pl.col("leading_span1").cast(pl.Float64).alias("price"),
+        pl.lit("雲のねじれ（予定）").alias("signal"),
+    )
+
+
+def get_ichimoku_sweep(
+    df: pl.DataFrame,
+    params: list[tuple[int, int, int, int]],
+    index: RangeExtremaIndex | None = None,
+    compact: bool = False,
+) -> pl.DataFrame:
+    """
+    複数の期間の組み合わせで一目均衡表をまとめて計算する
+
+    同じ期間の (Max + Min) / 2 は組み合わせをまたいで1回だけ計算します。
+    例えば9/26/52と9/26/104では、9日と26日の計算を共有します。
+
+    Args:
+        df: 株価データ（date, high.amount, low.amount, close.amount列を含む）
+        params: (転換線, 基準線, 先行スパン2, ずらす日数) のリスト
+        index: 構築済みのRangeExtremaIndex（指定するとrolling計算の代わりに使う）
+        compact: Trueの場合はFloat32で計算・出力する
+
+    Returns:
+        組み合わせごとの結果を縦に積んだDataFrame
+        （conversion, base, span2, displacement, date と5本の線の列）
+    """
+    dtype = price_dtype(compact)
+    high = df["high.amount"].cast(dtype)
+    low = df["low.amount"].cast(dtype)
+    close = df["close.amount"].cast(dtype)
+
+    # 期間ごとの (Max + Min) / 2 を1回だけ計算する
+    windows = sorted({w for c, b, s, _ in params for w in (c, b, s)})
+    midpoints: dict[int, pl.Series] = {}
+    for window in windows:
+        if index is not None:
+            midpoints[window] = pl.Series(
+                index.midpoint(window), nan_to_null=True
+            ).cast(dtype)
+        else:
+            midpoints[window] = (high.rolling_max(window) + low.rolling_min(window)) / 2
+
+    frames = []
+    for conversion, base, span2, displacement in params:
+        conversion_line = midpoints[conversion]
+        base_line = midpoints[base]
+        frames.append(
+            pl.DataFrame(
+                {
+                    "date": df["date"],
+                    "conversion_line": conversion_line,
+                    "base_line": base_line,
+                    "leading_span1": ((conversion_line + base_line) / 2).shift(
+                        displacement
+                    ),
+                    "leading_span2": midpoints[span2].shift(displacement),
+                    "lagging_span": close.shift(-displacement),
+                }
+            ).select(
+                pl.lit(conversion, dtype=pl.Int32).alias("conversion"),
+                pl.lit(base, dtype=pl.Int32).alias("base"),
+                pl.lit(span2, dtype=pl.Int32).alias("span2"),
+                pl.lit(displacement, dtype=pl.Int32).alias("displacement"),
+                pl.all(),
+            )
+        )
+    return pl.concat(frames)
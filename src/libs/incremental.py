@@ -0,0 +1,174 @@
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from libs.bbands import get_bbands_family
+from libs.data import price_dtype
+from libs.ichimoku import get_ichimoku_values
+
+PRICE_COLUMNS = ["high.amount", "low.amount", "close.amount"]
+
+# 新しい行の指標を計算するのに必要な過去データの行数
+# 先行スパン2: 52日間の高値・安値 + 26日のずらし
+LOOKBACK = 52 + 26 - 1
+
+
+def compute_indicator_columns(df: pl.DataFrame, compact: bool = False) -> pl.DataFrame:
+    """
+    SMA・ボリンジャーバンド・一目均衡表（遅行スパン以外）の列を計算する
+
+    遅行スパンは終値を26日過去にずらすだけで、新しい行が届くたびに過去の行の値が
+    変わるため、保存せずに読み込み時に`close.amount`から作ります。
+
+    Args:
+        df: date, high.amount, low.amount, close.amount列を含む株価データ
+        compact: Trueの場合は指標の列をFloat32にする（移動平均の累積はFloat64で行う）
+
+    Returns:
+        dfに指標の列を追加したDataFrame
+    """
+    dtype = price_dtype(compact)
+    close = pl.col("close.amount").cast(pl.Float64)
+    bbands = get_bbands_family(df["close.amount"], [20], [1.0, 2.0], compact=compact)
+    values = get_ichimoku_values(df, compact=compact)
+    return df.with_columns(
+        close.rolling_mean(5).cast(dtype).alias("ma5"),
+        close.rolling_mean(25).cast(dtype).alias("ma25"),
+        *bbands.select("^bb20_(middle|upper|lower).*$"),
+        *[
+            values[name].alias(name)
+            for name in (
+                "conversion_line",
+                "base_line",
+                "leading_span1",
+                "leading_span2",
+            )
+        ],
+    )
+
+
+class IncrementalIndicators:
+    """
+    指標の列を保存し、新しく届いた足の分だけ計算して追記する
+
+    銘柄ごとに`root/<code>/`へ次のファイルを置きます。
+
+    - `part-XXXXX.parquet`: 株価と指標の列（追記のたびにファイルが1つ増える）
+    - `state.parquet`: 次回の計算に必要な直近`LOOKBACK`行の高値・安値・終値
+
+    追記時は`state.parquet`と新しい行だけを読むため、計算量は履歴全体ではなく
+    新しい行数に比例します。
+
+    Args:
+        root: 保存先のディレクトリ
+        compact: Trueの場合は株価と指標の列をFloat32で保存する
+    """
+
+    def __init__(
+        self, root: str | Path = ".cache/incremental", compact: bool = False
+    ) -> None:
+        self.root = Path(root)
+        self.compact = compact
+
+    def code_dir(self, code: str) -> Path:
+        return self.root / code
+
+    def exists(self, code: str) -> bool:
+        return (self.code_dir(code) / "state.parquet").exists()
+
+    def parts(self, code: str) -> list[Path]:
+        return sorted(self.code_dir(code).glob("part-*.parquet"))
+
+    def materialize(self, code: str, hist: pl.DataFrame) -> pl.DataFrame:
+        # 全履歴から計算し直す（初回や分割・併合で過去の株価が変わったとき）
+        code_dir = self.code_dir(code)
+        code_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.parts(code):
+            path.unlink()
+
+        prices = self.select_prices(hist)
+        rows = compute_indicator_columns(prices, self.compact)
+        self.write_part(code, rows, 0)
+        self.write_state(code, prices)
+        return rows
+
+    def append(self, code: str, hist: pl.DataFrame) -> pl.DataFrame:
+        """
+        保存済みの最終日より新しい行だけ指標を計算して追記する
+
+        保存済みの列の型（Float32/Float64）が`compact`と違う場合は、保存済みの株価と
+        新しい行を合わせて、全履歴を`compact`の型で計算し直します
+        （1つの銘柄のpartファイルに型の違う列が混ざらないようにする）。
+
+        取得し直した株価は保存済みの最終日を含んでいる必要があります。間が空いている
+        （取得期間より長く更新しなかった）場合や、重なる日の終値が保存済みの値と
+        違う（分割・併合で過去の株価が調整された）場合は、途中に穴や食い違いのある
+        指標を書かないよう`ValueError`を送出します。全履歴を取得して`materialize()`で
+        計算し直してください。
+
+        Args:
+            code: 証券コード
+            hist: 新しい足を含む株価データ（保存済みの最終日以降の行）
+
+        Returns:
+            追記した行（新しい行がなければ空のDataFrame）
+        """
+        if not self.exists(code):
+            return self.materialize(code, hist)
+
+        state = pl.read_parquet(self.code_dir(code) / "state.parquet")
+        last_date = state["date"].max()
+        self.check_overlap(code, state, hist)
+        new = self.select_prices(hist.filter(pl.col("date") > last_date))
+        if state.schema["close.amount"] != price_dtype(self.compact):
+            stored = self.select_prices(self.load(code))
+            rows = self.materialize(code, pl.concat([stored, new]))
+            return rows.tail(new.height)
+        if new.is_empty():
+            return compute_indicator_columns(new, self.compact)
+
+        window = pl.concat([state, new])
+        rows = compute_indicator_columns(window, self.compact).tail(new.height)
+        self.write_part(code, rows, len(self.parts(code)))
+        self.write_state(code, window)
+        return rows
+
+    def check_overlap(self, code: str, state: pl.DataFrame, hist: pl.DataFrame) -> None:
+        # 取得した株価が保存済みの株価に続いているか（穴・調整後の株価を追記しない）
+        last_date = state["date"].max()
+        overlap = state.join(
+            self.select_prices(hist), on="date", how="inner", suffix="_new"
+        )
+        if last_date not in overlap["date"]:
+            raise ValueError(
+                f"{code}: 取得した株価が保存済みの最終日（{last_date}）を含んでいません"
+            )
+        stored = overlap["close.amount"].cast(pl.Float64).to_numpy()
+        fetched = overlap["close.amount_new"].cast(pl.Float64).to_numpy()
+        if not np.allclose(stored, fetched, rtol=1e-6, equal_nan=True):
+            raise ValueError(f"{code}: 保存済みの終値と取得した終値が一致しません")
+
+    def load(self, code: str) -> pl.DataFrame:
+        return (
+            pl.scan_parquet(self.parts(code))
+            .sort("date")
+            # 遅行スパン: 今日の終値を26日過去にずらす
+            .with_columns(lagging_span=pl.col("close.amount").shift(-26))
+            .collect()
+        )
+
+    def select_prices(self, hist: pl.DataFrame) -> pl.DataFrame:
+        dtype = price_dtype(self.compact)
+        return hist.select(
+            pl.col("date"), *[pl.col(c).cast(dtype) for c in PRICE_COLUMNS]
+        )
+
+    def write_part(self, code: str, rows: pl.DataFrame, index: int) -> None:
+        rows.write_parquet(self.code_dir(code) / f"part-{index:05d}.parquet")
+
+    def write_state(self, code: str, prices: pl.DataFrame) -> None:
+        path = self.code_dir(code) / "state.parquet"
+        tmp = path.with_suffix(".tmp")
+        prices.tail(LOOKBACK).write_parquet(tmp)
+        tmp.replace(path)
@@ -0,0 +1,227 @@
+import datetime as dt
+from functools import lru_cache
+
+import numpy as np
+import polars as pl
+
+# 取引所の休業日（土日・祝日以外）: 年末年始
+EXCHANGE_HOLIDAYS = [(1, 1), (1, 2), (1, 3), (12, 31)]
+
+# 法律で日付が決まっている祝日: (月, 日, 開始年, 終了年)
+FIXED_HOLIDAYS = [
+    (1, 1, 1949, 9999),  # 元日
+    (1, 15, 1949, 1999),  # 成人の日（ハッピーマンデー以前）
+    (2, 11, 1967, 9999),  # 建国記念の日
+    (2, 23, 2020, 9999),  # 天皇誕生日
+    (4, 29, 1949, 9999),  # 昭和の日（みどりの日）
+    (5, 3, 1949, 9999),  # 憲法記念日
+    (5, 4, 2007, 9999),  # みどりの日
+    (5, 5, 1949, 9999),  # こどもの日
+    (7, 20, 1996, 2002),  # 海の日（ハッピーマンデー以前）
+    (8, 11, 2016, 9999),  # 山の日
+    (9, 15, 1966, 2002),  # 敬老の日（ハッピーマンデー以前）
+    (10, 10, 1966, 1999),  # 体育の日（ハッピーマンデー以前）
+    (11, 3, 1948, 9999),  # 文化の日
+    (11, 23, 1948, 9999),  # 勤労感謝の日
+    (12, 23, 1989, 2018),  # 天皇誕生日（平成）
+]
+
+# 第N月曜日の祝日（ハッピーマンデー）: (月, N, 開始年)
+MONDAY_HOLIDAYS = [
+    (1, 2, 2000),  # 成人の日
+    (7, 3, 2003),  # 海の日
+    (9, 3, 2003),  # 敬老の日
+    (10, 2, 2000),  # スポーツの日（体育の日）
+]
+
+# 大喪の礼・即位・結婚の儀・東京オリンピックに伴う一度限りの変更
+MOVED_HOLIDAYS = {
+    1989: {"add": ["1989-02-24"], "remove": []},
+    1990: {"add": ["1990-11-12"], "remove": []},
+    1993: {"add": ["1993-06-09"], "remove": []},
+    2019: {
+        "add": ["2019-04-30", "2019-05-01", "2019-05-02", "2019-10-22"],
+        "remove": [],
+    },
+    2020: {
+        "add": ["2020-07-23", "2020-07-24", "2020-08-10"],
+        "remove": ["2020-07-20", "2020-08-11", "2020-10-12"],
+    },
+    2021: {
+        "add": ["2021-07-22", "2021-07-23", "2021-08-08"],
+        "remove": ["2021-07-19", "2021-08-11", "2021-10-11"],
+    },
+}
+
+# 国民の休日（祝日に挟まれた平日）が始まった日
+CITIZENS_HOLIDAY_SINCE = np.datetime64("1985-12-27")
+
+# 振替休日が「翌日」から「祝日でない最初の日」に変わった日
+SUBSTITUTE_RULE_2007 = np.datetime64("2007-01-01")
+
+
+def equinox_days(years: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # 春分日・秋分日の近似式（1980〜2099年）
+    offset = years - 1980
+    vernal = (20.8431 + 0.242194 * offset - offset // 4).astype(np.int64)
+    autumnal = (23.2488 + 0.242194 * offset - offset // 4).astype(np.int64)
+    return vernal, autumnal
+
+
+def dates_in_year(years: np.ndarray, month: int, day: int) -> np.ndarray:
+    # 各年のmonth月day日
+    month_starts = (years - 1970).astype("datetime64[Y]") + np.timedelta64(
+        month - 1, "M"
+    )
+    return month_starts.astype("datetime64[D]") + np.timedelta64(day - 1, "D")
+
+
+def nth_mondays(years: np.ndarray, month: int, n: int) -> np.ndarray:
+    # 各年のmonth月の第n月曜日
+    first = dates_in_year(years, month, 1)
+    return np.busday_offset(first, n - 1, roll="forward", weekmask="Mon")
+
+
+@lru_cache(maxsize=8)
+def national_holidays(start_year: int, end_year: int) -> np.ndarray:
+    """
+    国民の祝日（振替休日・国民の休日を含む）の日付の配列
+
+    年ごとのループではなく、祝日の規則ごとに全年分の日付をまとめて作ります。
+
+    Args:
+        start_year: 最初の年（1980年以降）
+        end_year: 最後の年（2099年まで）
+
+    Returns:
+        datetime64[D]の昇順の配列
+    """
+    years = np.arange(start_year, end_year + 1)
+    parts = []
+    for month, day, first, last in FIXED_HOLIDAYS:
+        mask = (years >= first) & (years <= last)
+        parts.append(dates_in_year(years, month, day)[mask])
+    for month, n, first in MONDAY_HOLIDAYS:
+        parts.append(nth_mondays(years, month, n)[years >= first])
+    vernal, autumnal = equinox_days(years)
+    parts.append(dates_in_year(years, 3, 1) + (vernal - 1).astype("timedelta64[D]"))
+    parts.append(dates_in_year(years, 9, 1) + (autumnal - 1).astype("timedelta64[D]"))
+    holidays = np.unique(np.concatenate(parts))
+
+    for year, change in MOVED_HOLIDAYS.items():
+        if start_year <= year <= end_year:
+            removed = np.array(change["remove"], dtype="datetime64[D]")
+            added = np.array(change["add"], dtype="datetime64[D]")
+            holidays = np.union1d(np.setdiff1d(holidays, removed), added)
+
+    # 国民の休日: 前日と翌日が祝日の平日
+    between = holidays[:-1][np.diff(holidays) == np.timedelta64(2, "D")] + 1
+    between = between[np.is_busday(between) & (between >= CITIZENS_HOLIDAY_SINCE)]
+    holidays = np.union1d(holidays, between)
+
+    # 振替休日: 日曜日の祝日の後の、最初の祝日でない日（2006年までは翌日）
+    sundays = holidays[np.is_busday(holidays, weekmask="Sun")]
+    substitutes = np.where(
+        sundays < SUBSTITUTE_RULE_2007,
+        sundays + np.timedelta64(1, "D"),
+        np.busday_offset(
+            sundays, 0, roll="forward", weekmask="1111111", holidays=holidays
+        ),
+    )
+    return np.union1d(holidays, substitutes)
+
+
+@lru_cache(maxsize=8)
+def jpx_busdaycalendar(start_year: int, end_year: int) -> np.busdaycalendar:
+    # 土日・祝日・年末年始（12/31〜1/3）を休業日とするnumpyの営業日カレンダー
+    # （1989年2月まであった土曜日の立会は扱わない）
+    years = np.arange(start_year, end_year + 1)
+    closures = [dates_in_year(years, month, day) for month, day in EXCHANGE_HOLIDAYS]
+    holidays = np.union1d(
+        national_holidays(start_year, end_year), np.concatenate(closures)
+    )
+    return np.busdaycalendar(weekmask="1111100", holidays=holidays)
+
+
+def calendar_for(start: np.datetime64, sessions: int = 0) -> np.busdaycalendar:
+    # 必要な期間を含む年の範囲のカレンダー（年の範囲ごとにキャッシュされる）
+    year = start.astype("datetime64[Y]").astype(int) + 1970
+    return jpx_busdaycalendar(int(year) - 1, int(year) + sessions // 240 + 1)
+
+
+def next_sessions(after: dt.date | np.datetime64, count: int) -> np.ndarray:
+    """
+    指定した日の翌営業日から`count`営業日分の日付
+
+    Args:
+        after: 基準日（この日は含まない）
+        count: 営業日数
+
+    Returns:
+        datetime64[D]の配列
+    """
+    after = np.datetime64(after, "D")
+    calendar = calendar_for(after, count)
+    return np.busday_offset(
+        after, np.arange(1, count + 1), roll="backward", busdaycal=calendar
+    )
+
+
+def session_offset(date: dt.date | np.datetime64, offset: int) -> np.datetime64:
+    # dateからoffset営業日ずらした日（dateが休業日なら直前の営業日から数える）
+    date = np.datetime64(date, "D")
+    calendar = calendar_for(
+        date - np.timedelta64(max(-offset, 0) * 2, "D"), abs(offset)
+    )
+    return np.busday_offset(date, offset, roll="backward", busdaycal=calendar)
+
+
+def sessions_between(start: dt.date, end: dt.date) -> np.ndarray:
+    # start以上end以下の営業日
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    calendar = calendar_for(start, int((end - start).astype(int)))
+    days = np.arange(start, end + 1)
+    return days[np.is_busday(days, busdaycal=calendar)]
+
+
+def extend_sessions(df: pl.DataFrame, count: int) -> pl.DataFrame:
+    """
+    株価データの末尾に、将来の営業日の行を`count`行追加する（株価の列はnull）
+
+    一目均衡表の先行スパンは26営業日先までの値があるため、この行を追加してから
+    計算すると、まだ来ていない日付の雲まで描画・判定できます。
+
+    Args:
+        df: date列を含む株価データ
+        count: 追加する営業日数
+
+    Returns:
+        dfの末尾に行を追加したDataFrame
+    """
+    dtype = df.schema["date"]
+    # タイムゾーン付きの日時は、そのタイムゾーンでの日付にする
+    last = df["date"].dt.date().max()
+    future = pl.Series("date", next_sessions(last, count)).cast(pl.Date)
+    if isinstance(dtype, pl.Datetime):
+        # タイムゾーン付きの場合は、同じタイムゾーンの0時にする
+        future = future.cast(pl.Datetime(dtype.time_unit))
+        if dtype.time_zone is not None:
+            future = future.dt.replace_time_zone(dtype.time_zone)
+    else:
+        future = future.cast(dtype)
+    return pl.concat([df, pl.DataFrame([future])], how="diagonal")
+
+
+def month_start_ticks(dates: pl.Series) -> tuple[list, list[str]]:
+    """
+    チャートのX軸に表示する、各月の最初の日付とそのラベル（"YYYY-MM"）
+
+    Returns:
+        (tickvals, ticktext)
+    """
+    ticks = (
+        dates.to_frame("date")
+        .filter(pl.col("date").dt.truncate("1mo").is_first_distinct())
+        .select(pl.col("date"), pl.col("date").dt.strftime("%Y-%m").alias("label"))
+    )
+    return ticks["date"].to_list(), ticks["label"].to_list()
@@ -0,0 +1,182 @@
+import time
+from typing import TypedDict
+
+import numpy as np
+
+from libs.profiling import format_labels
+
+
+class LatencySnapshot(TypedDict):
+    count: int
+    ticks_per_second: float  # 計測開始（またはreset()）からの経過時間あたりの件数
+    mean_us: float
+    p50_us: float
+    p99_us: float
+    p999_us: float
+    max_us: float
+    queue_depth: int
+    max_queue_depth: int
+
+
+class LatencyHistogram:
+    """
+    HDR Histogram形式の、記録のコストが小さい遅延時間のヒストグラム
+
+    値（ナノ秒の整数）を「2のべき乗の範囲 × その中を等分した区間」のバケットで数えます。
+    `sub_bits=7`なら各範囲を64等分するため、どの大きさの値でも相対誤差は約1.6%以内で、
+    バケット数は値の上限によらず数千個で済みます。記録はリストの要素を1つ増やすだけです。
+
+    Args:
+        sub_bits: 区間の細かさ（大きいほど精度が上がり、バケット数が増える）
+        max_value: 記録できる最大値（ナノ秒）。超えた値は最大のバケットに入れる
+    """
+
+    def __init__(self, sub_bits: int = 7, max_value: int = 2**40) -> None:
+        self.sub_bits = sub_bits
+        self.sub_count = 1 << sub_bits
+        self.half = self.sub_count >> 1
+        self.max_value = max_value
+        self.counts = [0] * (self.index(max_value) + 1)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def index(self, value: int) -> int:
+        if value < self.sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half + ((value >> shift) - self.half)
+
+    def value_at(self, index: int) -> int:
+        # バケットに入る値の上限
+        if index < self.sub_count:
+            return index
+        shift = (index - self.sub_count) // self.half + 1
+        sub = (index - self.sub_count) % self.half + self.half
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        value = min(max(value, 0), self.max_value)
+        self.counts[self.index(value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def record_many(self, values: np.ndarray) -> None:
+        # まとめて記録する（バケットの番号をnumpyで求めてbincountで数える）
+        values = np.clip(np.asarray(values, dtype=np.int64), 0, self.max_value)
+        if len(values) == 0:
+            return
+        # frexpの指数 = 整数のビット長
+        shift = np.maximum(np.frexp(values)[1] - self.sub_bits, 0)
+        index = np.where(
+            values < self.sub_count,
+            values,
+            self.sub_count + (shift - 1) * self.half + ((values >> shift) - self.half),
+        )
+        counts = np.bincount(index, minlength=len(self.counts))
+        self.counts = (np.asarray(self.counts) + counts).tolist()
+        self.total += len(values)
+        self.sum += int(values.sum())
+        self.max = max(self.max, int(values.max()))
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> int:
+        if self.total == 0:
+            return 0
+        rank = max(int(np.ceil(q / 100 * self.total)), 1)
+        position = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self.value_at(position), self.max)
+
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def reset(self) -> None:
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+
+class StreamStats:
+    """
+    ストリーミング処理の計測（1回の更新の遅延時間・処理速度・キューの滞留）
+
+    エンジンの`update()`の前後で`time.perf_counter_ns()`を取り、差を`record()`に渡します。
+
+    ```python
+    stats = StreamStats()
+    stream = BollingerStream(20, stats=stats)
+    for price in prices:
+        stream.update(price)
+    stats.snapshot()  # {"p50_us": ..., "p99_us": ..., "ticks_per_second": ...}
+    ```
+    """
+
+    def __init__(self) -> None:
+        self.latency = LatencyHistogram()
+        self.started = time.perf_counter_ns()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def record(self, elapsed_ns: int) -> None:
+        self.latency.record(elapsed_ns)
+
+    def record_queue(self, depth: int) -> None:
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def reset(self) -> None:
+        self.latency.reset()
+        self.started = time.perf_counter_ns()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def snapshot(self) -> LatencySnapshot:
+        """
+        現時点の集計（処理速度は、計測開始からの実時間あたりの件数で、
+        ティックを待っている時間やキューの処理も含む）
+        """
+        latency = self.latency
+        elapsed_ns = time.perf_counter_ns() - self.started
+        return {
+            "count": latency.total,
+            "ticks_per_second": latency.total / (elapsed_ns / 1e9)
+            if elapsed_ns
+            else 0.0,
+            "mean_us": latency.mean() / 1000,
+            "p50_us": latency.percentile(50) / 1000,
+            "p99_us": latency.percentile(99) / 1000,
+            "p999_us": latency.percentile(99.9) / 1000,
+            "max_us": latency.max / 1000,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+    def meets(self, p99_us: float) -> bool:
+        # 99パーセンタイルの遅延時間が目標（SLO）以内か
+        return self.latency.percentile(99) / 1000 <= p99_us
+
+    def to_openmetrics(self, name: str, labels: dict[str, str] | None = None) -> str:
+        labels = labels or {}
+        metric = f"{name}_update_latency_seconds"
+        lines = [
+            f"# TYPE {metric} summary",
+            f"# HELP {metric} Latency of a single streaming update",
+        ]
+        for q in (0.5, 0.99, 0.999):
+            value = self.latency.percentile(q * 100) / 1e9
+            lines.append(
+                f"{metric}{format_labels({**labels, 'quantile': str(q)})} {value}"
+            )
+        lines.append(f"{metric}_sum{format_labels(labels)} {self.latency.sum / 1e9}")
+        lines.append(f"{metric}_count{format_labels(labels)} {self.latency.total}")
+        lines.append(f"# TYPE {name}_queue_depth gauge")
+        lines.append(f"{name}_queue_depth{format_labels(labels)} {self.queue_depth}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
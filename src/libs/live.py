@@ -0,0 +1,485 @@
+import asyncio
+import math
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Mapping, Sequence
+from pathlib import Path
+from typing import Literal, TypedDict
+
+import numpy as np
+
+from libs.latency import StreamStats
+from libs.streaming import BollingerStream, load_checkpoints, save_checkpoints
+
+QueuePolicy = Literal["block", "drop_oldest", "coalesce"]
+
+
+class Tick(TypedDict):
+    code: str
+    ts: float  # UNIX時間（秒）
+    price: float
+    volume: float
+
+
+class Bar(TypedDict):
+    code: str
+    ts: float  # 足の開始時刻
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+class LiveState(TypedDict):
+    code: str
+    bar: Bar
+    upper: float | None
+    middle: float | None
+    lower: float | None
+
+
+def parse_tick(line: str) -> Tick | None:
+    # "code,ts,price,volume" 形式の1行を読む（読めない行は無視する）
+    parts = line.strip().split(",")
+    if len(parts) != 4:
+        return None
+    try:
+        return {
+            "code": parts[0],
+            "ts": float(parts[1]),
+            "price": float(parts[2]),
+            "volume": float(parts[3]),
+        }
+    except ValueError:
+        return None
+
+
+async def tail_file(
+    path: str | Path, poll_interval: float = 0.2
+) -> AsyncIterator[Tick]:
+    """
+    ファイルに追記されるティックを読み続ける（実際のフィードの代わり）
+
+    書き込み途中の行（改行で終わっていない行）は、残りが追記されるまで読み進めません。
+
+    Args:
+        path: "code,ts,price,volume" 形式の行が追記されるファイル
+        poll_interval: 新しい行がないときの待ち時間（秒）
+    """
+    f = await asyncio.to_thread(open, path, encoding="utf-8")
+    with f:
+        pending = ""
+        while True:
+            line = f.readline()
+            if not line:
+                await asyncio.sleep(poll_interval)
+                continue
+            pending += line
+            if not pending.endswith("\n"):
+                continue
+            tick = parse_tick(pending)
+            pending = ""
+            if tick is not None:
+                yield tick
+
+
+async def socket_source(
+    host: str = "127.0.0.1", port: int = 9009
+) -> AsyncIterator[Tick]:
+    """
+    ローカルのTCPソケットで受け取ったティックを読み続ける（実際のフィードの代わり）
+
+    接続してきたクライアントから "code,ts,price,volume" 形式の行を受け取ります。
+    """
+    queue: asyncio.Queue[Tick] = asyncio.Queue(maxsize=10_000)
+
+    async def handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        while line := await reader.readline():
+            tick = parse_tick(line.decode("utf-8"))
+            if tick is not None:
+                # キューが満杯ならここで待つため、送信側に背圧がかかる
+                await queue.put(tick)
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        while True:
+            yield await queue.get()
+
+
+class BarAggregator:
+    """
+    ティックを一定間隔の足（OHLCV）にまとめる
+
+    ある銘柄の足は、その銘柄の次の区間のティックが届いたときのほか、
+    `flush()`に渡した時刻が足の終わりを過ぎたときにも確定します
+    （取引の少ない銘柄の最後の足が出ないままにならないようにする）。
+    確定した足の区間に遅れて届いたティックは捨てます。
+
+    Args:
+        interval: 足の長さ（秒）。60なら1分足
+    """
+
+    def __init__(self, interval: float = 60.0) -> None:
+        self.interval = interval
+        self.bars: dict[str, Bar] = {}
+        # 銘柄ごとに確定させた最後の足の開始時刻
+        self.closed: dict[str, float] = {}
+        # 受け取ったティックの最新の区間の開始時刻（これより前の足は全部確定済み）
+        self.clock = -math.inf
+
+    def add(self, tick: Tick) -> Bar | None:
+        # 新しい足の区間に入ったら、確定した前の足を返す
+        start = tick["ts"] - tick["ts"] % self.interval
+        if start <= self.closed.get(tick["code"], -math.inf):
+            return None
+        bar = self.bars.get(tick["code"])
+        if bar is not None and bar["ts"] == start:
+            bar["high"] = max(bar["high"], tick["price"])
+            bar["low"] = min(bar["low"], tick["price"])
+            bar["close"] = tick["price"]
+            bar["volume"] += tick["volume"]
+            return None
+
+        self.bars[tick["code"]] = {
+            "code": tick["code"],
+            "ts": start,
+            "open": tick["price"],
+            "high": tick["price"],
+            "low": tick["price"],
+            "close": tick["price"],
+            "volume": tick["volume"],
+        }
+        if bar is not None:
+            self.closed[tick["code"]] = bar["ts"]
+        return bar
+
+    def flush(self, now: float) -> list[Bar]:
+        """
+        終わりの時刻が`now`以前の足をすべて確定させる
+
+        Args:
+            now: 現在時刻（UNIX時間）。ティックの時刻や壁時計の時刻
+
+        Returns:
+            確定した足（開始時刻の順）
+        """
+        start = now - now % self.interval
+        if start <= self.clock:
+            # 前回から区間が進んでいなければ、確定させる足はない
+            return []
+        self.clock = start
+        done = [bar for bar in self.bars.values() if bar["ts"] < start]
+        for bar in done:
+            del self.bars[bar["code"]]
+            self.closed[bar["code"]] = bar["ts"]
+        return sorted(done, key=lambda bar: bar["ts"])
+
+
+class StateQueue:
+    """
+    指標の計算結果を描画側に渡す、上限付きのキュー
+
+    満杯のときの動作を`policy`で選びます。
+
+    - "block": 空きができるまで待つ（上流のソースに背圧がかかる）
+    - "drop_oldest": 最も古い結果を捨てて追加する
+    - "coalesce": 銘柄ごとに最新の結果だけを残す（描画には最新の状態だけあればよい）
+
+    Args:
+        maxsize: キューの上限
+        policy: 満杯のときの動作
+    """
+
+    def __init__(self, maxsize: int = 1024, policy: QueuePolicy = "coalesce") -> None:
+        self.policy = policy
+        self.queue: asyncio.Queue[LiveState] = asyncio.Queue(maxsize=maxsize)
+        self.latest: dict[str, LiveState] = {}
+        self.changed = asyncio.Event()
+        self.dropped = 0
+        self.coalesced = 0
+
+    async def put(self, state: LiveState) -> None:
+        if self.policy == "coalesce":
+            if state["code"] in self.latest:
+                self.coalesced += 1
+            self.latest[state["code"]] = state
+            self.changed.set()
+        elif self.policy == "drop_oldest":
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(state)
+        else:
+            await self.queue.put(state)
+
+    async def get_batch(self) -> list[LiveState]:
+        # 溜まっている結果をまとめて取り出す（1件もなければ届くまで待つ）
+        if self.policy == "coalesce":
+            await self.changed.wait()
+            self.changed.clear()
+            batch = list(self.latest.values())
+            self.latest = {}
+            return batch
+
+        batch = [await self.queue.get()]
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    def depth(self) -> int:
+        return len(self.latest) if self.policy == "coalesce" else self.queue.qsize()
+
+
+class LivePipeline:
+    """
+    ソース → 足の集約 → ストリーミング指標 → 上限付きキュー → 描画側 のパイプライン
+
+    描画側には銘柄ごとの最新の状態（`dict[str, LiveState]`）だけを渡します。
+    marimoでは`mo.state`のsetterを`on_state`に渡すと、新しい足が確定するたびに
+    そのsetterを参照するセルだけが再実行されます。
+
+    Args:
+        source: ティックを返す非同期イテレーター（`tail_file()`や`socket_source()`）
+        on_state: 最新の状態を受け取る関数（`mo.state`のsetterなど）
+        interval: 足の長さ（秒）
+        period: ボリンジャーバンドの期間
+        maxsize: キューの上限
+        policy: キューが満杯のときの動作
+        checkpoint_path: 指定すると、描画側に渡すたびに全銘柄の状態をここに保存する
+        idle_flush: ティックがこの秒数届かないときは、壁時計の時刻で足を確定させる
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[Tick],
+        on_state: Callable[[dict[str, LiveState]], None],
+        interval: float = 60.0,
+        period: int = 20,
+        maxsize: int = 1024,
+        policy: QueuePolicy = "coalesce",
+        checkpoint_path: str | Path | None = None,
+        idle_flush: float = 1.0,
+    ) -> None:
+        self.source = source
+        self.idle_flush = idle_flush
+        self.last_tick = time.monotonic()
+        self.checkpoint_path = checkpoint_path
+        self.on_state = on_state
+        self.aggregator = BarAggregator(interval)
+        self.period = period
+        self.streams: dict[str, BollingerStream] = {}
+        self.queue = StateQueue(maxsize, policy)
+        # 全銘柄の更新の遅延時間・処理速度・キューの滞留をまとめて記録する
+        self.stats = StreamStats()
+        self.sequence = 0  # 処理した足の数
+        # 銘柄ごとに最後に反映した足の時刻（再開時にこれ以前の足を二重に反映しないため）
+        self.marks: dict[str, float] = {}
+        self.snapshot: dict[str, LiveState] = {}
+        self.thread: threading.Thread | None = None
+        self.stopped = threading.Event()
+
+    def update(self, bar: Bar) -> LiveState:
+        stream = self.streams.get(bar["code"])
+        if stream is None:
+            stream = self.streams[bar["code"]] = BollingerStream(
+                self.period, stats=self.stats
+            )
+        bands = stream.update(bar["close"])
+        self.sequence += 1
+        self.marks[bar["code"]] = bar["ts"]
+        upper, middle, lower = bands if bands is not None else (None, None, None)
+        return {
+            "code": bar["code"],
+            "bar": bar,
+            "upper": upper,
+            "middle": middle,
+            "lower": lower,
+        }
+
+    def warm_start(self, histories: Mapping[str, np.ndarray]) -> None:
+        """
+        過去の終値（日足のバッチ計算に使った配列など）から銘柄ごとのストリームを作る
+
+        ウォームアップの足を待たずに、最初に確定した足からバンドが出ます。
+
+        Args:
+            histories: 証券コード → 過去の終値（古い順）
+        """
+        for code, closes in histories.items():
+            self.streams[code] = BollingerStream.from_history(
+                closes, self.period, stats=self.stats
+            )
+
+    def checkpoint(self, path: str | Path) -> None:
+        # 全銘柄のストリームの状態を保存する（再起動時に過去の株価を取得し直さずに済む）
+        save_checkpoints(path, self.streams, self.sequence, self.marks)
+
+    def restore(self, path: str | Path) -> int:
+        """
+        `checkpoint()`で保存した状態から再開する
+
+        `tail_file()`はファイルの先頭から読み直すため、銘柄ごとに保存時までに反映した
+        足（時刻がそれ以前の足）は読み飛ばします。集約中だった未確定の足は保存されないため、
+        ティックから集約し直して反映します。
+
+        Returns:
+            保存時までに処理していた足の数
+        """
+        self.sequence, streams, self.marks = load_checkpoints(path, self.stats)
+        self.streams = {
+            code: stream
+            for code, stream in streams.items()
+            if isinstance(stream, BollingerStream)
+        }
+        return self.sequence
+
+    def is_applied(self, bar: Bar) -> bool:
+        # チェックポイントに反映済みの足か
+        mark = self.marks.get(bar["code"])
+        return mark is not None and bar["ts"] <= mark
+
+    async def emit(self, bars: Sequence[Bar]) -> None:
+        for bar in bars:
+            if not self.is_applied(bar):
+                await self.queue.put(self.update(bar))
+                self.stats.record_queue(self.queue.depth())
+
+    async def produce(self) -> None:
+        async for tick in self.source:
+            self.last_tick = time.monotonic()
+            bar = self.aggregator.add(tick)
+            # ティックの時刻が区間の境目を越えたら、他の銘柄の足も確定させる
+            await self.emit(
+                ([bar] if bar is not None else []) + self.aggregator.flush(tick["ts"])
+            )
+
+    async def flush_idle(self) -> None:
+        # フィード全体が止まったとき（ファイルの末尾まで読んだときなど）は、
+        # 壁時計の時刻で足を確定させる（ファイルを読み直している間は行わない）
+        while True:
+            await asyncio.sleep(self.idle_flush)
+            if time.monotonic() - self.last_tick >= self.idle_flush:
+                await self.emit(self.aggregator.flush(time.time()))
+
+    async def consume(self) -> None:
+        while True:
+            batch = await self.queue.get_batch()
+            for state in batch:
+                self.snapshot[state["code"]] = state
+            # 描画側には最新の状態のコピーだけを渡す
+            self.on_state(dict(self.snapshot))
+            if self.checkpoint_path is not None:
+                # produceと同じイベントループで動くため、更新途中の状態は保存されない
+                self.checkpoint(self.checkpoint_path)
+
+    async def run(self) -> None:
+        await asyncio.gather(self.produce(), self.consume(), self.flush_idle())
+
+    def should_stop(self) -> bool:
+        # stop()が呼ばれたか、mo.Threadを起動したセルが再実行・削除・中断されたか
+        thread = threading.current_thread()
+        return self.stopped.is_set() or getattr(thread, "should_exit", False)
+
+    async def run_until_stopped(self, poll_interval: float = 0.1) -> None:
+        task = asyncio.ensure_future(self.run())
+        while not task.done():
+            if self.should_stop():
+                task.cancel()
+            await asyncio.wait([task], timeout=poll_interval)
+        await task
+
+    def start_background(
+        self, thread_class: type[threading.Thread] = threading.Thread
+    ) -> threading.Thread:
+        # ノートブックのカーネルを止めないよう、別スレッドのイベントループで動かす
+        # marimoから`mo.state`を更新する場合は`thread_class=mo.Thread`を渡す
+        # （セルが再実行されると`should_exit`が立ち、このスレッドは自分で止まる）
+        def target() -> None:
+            try:
+                asyncio.run(self.run_until_stopped())
+            except asyncio.CancelledError:
+                pass
+
+        self.stopped.clear()
+        self.thread = thread_class(target=target, name="live-pipeline", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        """
+        バックグラウンドのパイプラインを止め、スレッドの終了を待つ
+
+        終了後はティックファイルの読み込みもチェックポイントの書き込みも行いません。
+
+        Args:
+            timeout: 終了を待つ時間の上限（秒）
+        """
+        self.stopped.set()
+        thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+
+async def benchmark_pipeline(
+    symbol_counts: Sequence[int],
+    rounds: int = 200,
+    period: int = 20,
+    slo_p99_us: float = 100.0,
+    seed: int = 0,
+) -> list[dict[str, float | int | bool]]:
+    """
+    銘柄数を増やしながら、1銘柄の足の更新にかかる時間がSLO以内に収まるかを確かめる
+
+    ランダムウォークの足を全銘柄に`rounds`回ずつ流し込み、1回ごとにキューを空にします。
+    呼び出し元のイベントループで動くため、marimoのセルでは`await`で呼び出します
+    （スクリプトからは`asyncio.run(benchmark_pipeline(...))`）。
+
+    Args:
+        symbol_counts: 試す銘柄数のリスト
+        rounds: 1銘柄あたりの足の本数
+        period: ボリンジャーバンドの期間
+        slo_p99_us: 99パーセンタイルの遅延時間の目標（マイクロ秒）
+        seed: 乱数のシード
+
+    Returns:
+        銘柄数ごとの集計（`StreamStats.snapshot()`に symbols, meets_slo を加えたもの）
+    """
+    rng = np.random.default_rng(seed)
+
+    async def drive(pipeline: LivePipeline, codes: list[str]) -> None:
+        prices = 1000 + rng.standard_normal((rounds, len(codes))).cumsum(axis=0)
+        for i in range(rounds):
+            for code, price in zip(codes, prices[i].tolist()):
+                bar: Bar = {
+                    "code": code,
+                    "ts": float(i),
+                    "open": price,
+                    "high": price,
+                    "low": price,
+                    "close": price,
+                    "volume": 0.0,
+                }
+                await pipeline.queue.put(pipeline.update(bar))
+                pipeline.stats.record_queue(pipeline.queue.depth())
+            await pipeline.queue.get_batch()
+
+    async def empty() -> AsyncIterator[Tick]:
+        return
+        yield
+
+    rows = []
+    for count in symbol_counts:
+        pipeline = LivePipeline(empty(), on_state=lambda _: None, period=period)
+        await drive(pipeline, [f"S{i:05d}" for i in range(count)])
+        rows.append(
+            {
+                "symbols": count,
+                **pipeline.stats.snapshot(),
+                "meets_slo": pipeline.stats.meets(slo_p99_us),
+            }
+        )
+    return rows
@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+import warnings
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TypedDict
+
+import polars as pl
+
+# 保存する項目と、ticker.infoのキーの対応
+INFO_KEYS = {
+    "name": "shortName",
+    "sector": "sector",
+    "currency": "currency",
+}
+
+# 項目ごとの有効期限（秒）。社名や業種はめったに変わらないため長めにする
+DEFAULT_TTL = {
+    "name": 30 * 24 * 60 * 60,
+    "sector": 30 * 24 * 60 * 60,
+    "currency": 365 * 24 * 60 * 60,
+}
+
+# 値を取得できなかった項目（None）の有効期限（秒）。一時的な失敗を長く残さない
+MISSING_TTL = 24 * 60 * 60
+
+
+class FieldValue(TypedDict):
+    value: str | None
+    fetched_at: float
+
+
+class TickerMetadataStore:
+    """
+    銘柄コード → 社名・業種・通貨のローカル保存先
+
+    チャートのタイトルやスクリーナーの表示では`get()`/`display_name()`を使い、
+    ネットワークへの問い合わせは行いません。期限切れ・未登録の銘柄は
+    `refresh()`でまとめて`ticker.info`から取り直します（問い合わせはスレッドで並列に行う）。
+    複数のスレッドから同時に使えます。
+
+    `ticker.info`に値がなかった項目もNoneとして保存しますが、有効期限は
+    `MISSING_TTL`（1日）にして、次の`refresh()`で取り直せるようにします。
+
+    Args:
+        path: 保存先のJSONファイル
+        ttl: 項目ごとの有効期限（秒）。省略した項目は`DEFAULT_TTL`を使う
+    """
+
+    def __init__(
+        self,
+        path: str | Path = ".cache/ticker_metadata.json",
+        ttl: dict[str, float] | None = None,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.records: dict[str, dict[str, FieldValue]] = {}
+        self.lock = threading.RLock()
+        if self.path.exists():
+            self.records = json.loads(self.path.read_text(encoding="utf-8"))
+
+    def save(self) -> None:
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(
+                json.dumps(self.records, ensure_ascii=False), encoding="utf-8"
+            )
+            tmp.replace(self.path)
+
+    def get(self, code: str, field: str, default: str | None = None) -> str | None:
+        entry = self.records.get(code, {}).get(field)
+        if entry is None or entry["value"] is None:
+            return default
+        return entry["value"]
+
+    def display_name(self, code: str) -> str:
+        return self.get(code, "name", default=code) or code
+
+    def set(
+        self, code: str, field: str, value: str | None, fetched_at: float | None = None
+    ) -> None:
+        with self.lock:
+            self.records.setdefault(code, {})[field] = {
+                "value": value,
+                "fetched_at": time.time() if fetched_at is None else fetched_at,
+            }
+
+    def is_stale(self, code: str, field: str, now: float | None = None) -> bool:
+        entry = self.records.get(code, {}).get(field)
+        if entry is None:
+            return True
+        now = time.time() if now is None else now
+        ttl = self.ttl[field] if entry["value"] is not None else MISSING_TTL
+        return now - entry["fetched_at"] > ttl
+
+    def stale_codes(
+        self, codes: Iterable[str], fields: Iterable[str] = ("name",)
+    ) -> list[str]:
+        now = time.time()
+        fields = list(fields)
+        return [c for c in codes if any(self.is_stale(c, f, now) for f in fields)]
+
+    def load_frame(
+        self,
+        df: pl.DataFrame,
+        code: str = "code",
+        name: str | None = "name",
+        sector: str | None = "sector",
+        currency: str | None = None,
+        suffix: str = "",
+        default_currency: str | None = "JPY",
+    ) -> int:
+        """
+        銘柄一覧（JPXの上場銘柄一覧など）から一括登録する
+
+        Args:
+            df: 銘柄一覧
+            code: 証券コードの列名
+            name: 社名の列名
+            sector: 業種の列名
+            currency: 通貨の列名（Noneの場合は`default_currency`を使う）
+            suffix: 証券コードに付ける接尾辞（東証の4桁コードなら".T"）
+            default_currency: 通貨の列がない場合の値
+
+        Returns:
+            登録した銘柄数
+        """
+        columns = {"name": name, "sector": sector, "currency": currency}
+        now = time.time()
+        rows = df.select(
+            pl.col(code).cast(pl.String).alias("code"),
+            *[
+                pl.col(col).cast(pl.String).alias(field)
+                for field, col in columns.items()
+                if col is not None
+            ],
+        )
+        for row in rows.iter_rows(named=True):
+            key = f"{row['code']}{suffix}"
+            for field in INFO_KEYS:
+                if field in row:
+                    self.set(key, field, row[field], now)
+                elif field == "currency" and default_currency is not None:
+                    self.set(key, field, default_currency, now)
+        self.save()
+        return rows.height
+
+    def refresh(
+        self,
+        codes: Iterable[str],
+        fields: Iterable[str] = ("name",),
+        force: bool = False,
+    ) -> list[str]:
+        """
+        期限切れ・未登録の銘柄だけ`ticker.info`から取り直す
+
+        Args:
+            codes: 対象の証券コード
+            fields: 有効期限を確認する項目
+            force: Trueの場合は期限に関係なく取り直す
+
+        Returns:
+            実際に問い合わせて更新できた証券コード
+            （失敗した銘柄は警告を出し、保存済みの値をそのまま使う）
+        """
+        targets = list(codes) if force else self.stale_codes(codes, fields)
+        if not targets:
+            return []
+
+        import yfinance_pl as yf
+
+        from libs.parallel import map_tickers
+
+        # 問い合わせの待ち時間を重ねるため、銘柄ごとにスレッドで取得する
+        infos, run = map_tickers(lambda code: yf.Ticker(code).info, targets)
+        for code, error in run["errors"].items():
+            warnings.warn(
+                f"{code}: 銘柄情報を取得できませんでした（{error}）", stacklevel=2
+            )
+        now = time.time()
+        for code, info in infos.items():
+            for field, key in INFO_KEYS.items():
+                value = info.get(key)
+                # 取得できなかった項目で、保存済みの値を消さない
+                if value is None and self.get(code, field) is not None:
+                    continue
+                self.set(code, field, value, now)
+        self.save()
+        return list(infos)
+
+    def to_frame(self) -> pl.DataFrame:
+        with self.lock:
+            rows = [
+                {"code": code, **{f: self.get(code, f) for f in INFO_KEYS}}
+                for code in self.records
+            ]
+        return pl.DataFrame(
+            rows, schema={"code": pl.String, **{f: pl.String for f in INFO_KEYS}}
+        )
@@ -0,0 +1,276 @@
+import itertools
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Literal, TypedDict
+
+import numpy as np
+import polars as pl
+
+from libs.panel import PricePanel, rolling_mean_std, rolling_midpoint
+
+Strategy = Literal["sma", "bbands", "ichimoku"]
+
+# 戦略ごとのパラメーターの候補（手で選んでいた5/25・20/σ2・9/26/52を含む）
+PARAM_GRIDS: dict[Strategy, dict[str, list[float]]] = {
+    "sma": {"short": [5, 10, 15, 20], "long": [25, 50, 75, 100]},
+    "bbands": {"period": [10, 20, 30], "dev": [1.5, 2.0, 2.5]},
+    "ichimoku": {"conversion": [7, 9, 12], "base": [22, 26, 30], "span2": [44, 52, 60]},
+}
+
+# 年率換算に使う1年あたりの営業日数
+SESSIONS_PER_YEAR = 245
+
+
+class SharedArray(TypedDict):
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+
+# ワーカープロセスで共有メモリに貼り付けた配列（プロセスごとに1回だけ作る）
+SHARED_ARRAYS: dict[str, np.ndarray] = {}
+SHARED_BLOCKS: list[shared_memory.SharedMemory] = []
+
+
+def param_grid(strategy: Strategy, grid: Mapping[str, Sequence[float]] | None = None):
+    # 候補の全組み合わせ（SMAは短期 < 長期のものだけ）
+    grid = PARAM_GRIDS[strategy] if grid is None else grid
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    if strategy == "sma":
+        combos = [p for p in combos if p["short"] < p["long"]]
+    return combos
+
+
+def walk_forward_windows(
+    length: int, train: int, test: int, step: int | None = None
+) -> list[tuple[int, int, int, int]]:
+    """
+    学習期間と検証期間をずらしながら並べる
+
+    Args:
+        length: 全体の足の本数
+        train: 学習期間の本数
+        test: 検証期間の本数
+        step: ずらす本数（省略時はtestと同じで、検証期間が重ならない）
+
+    Returns:
+        (学習開始, 学習終了, 検証開始, 検証終了) のリスト（終了は含まない）
+    """
+    step = test if step is None else step
+    return [
+        (start, start + train, start + train, start + train + test)
+        for start in range(0, length - train - test + 1, step)
+    ]
+
+
+def strategy_positions(
+    strategy: Strategy,
+    params: Mapping[str, float],
+    close: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    cache: dict[tuple[str, int], np.ndarray] | None = None,
+) -> np.ndarray:
+    """
+    銘柄 × 日付の配列から、各日の終値時点のポジション（1: 買い、0: なし）を求める
+
+    - sma: 短期線が長期線より上の間は買い
+    - bbands: 終値が下限バンド以下で買い、ミドルバンド以上で手仕舞い
+    - ichimoku: 終値が雲の上にあり、転換線が基準線より上の間は買い
+
+    `cache`に辞書を渡すと、同じ期間の移動平均や (最高値 + 最安値) / 2 を
+    組み合わせをまたいで使い回します。
+    """
+    cache = {} if cache is None else cache
+
+    def mean_std(window: int) -> tuple[np.ndarray, np.ndarray]:
+        if ("mean", window) not in cache:
+            cache["mean", window], cache["std", window] = rolling_mean_std(
+                close, window
+            )
+        return cache["mean", window], cache["std", window]
+
+    def midpoint(window: int) -> np.ndarray:
+        if ("midpoint", window) not in cache:
+            cache["midpoint", window] = rolling_midpoint(high, low, window)
+        return cache["midpoint", window]
+
+    if strategy == "sma":
+        short, _ = mean_std(int(params["short"]))
+        long, _ = mean_std(int(params["long"]))
+        return (short > long).astype(np.float64)
+
+    if strategy == "bbands":
+        middle, std = mean_std(int(params["period"]))
+        lower = middle - std * params["dev"]
+        # 買い・手仕舞いの日以外はNaNにして、直前の状態を前方に引き継ぐ
+        signal = np.where(close <= lower, 1.0, np.where(close >= middle, 0.0, np.nan))
+        signal[:, 0] = np.nan_to_num(signal[:, 0])
+        index = np.where(~np.isnan(signal), np.arange(signal.shape[1]), 0)
+        np.maximum.accumulate(index, axis=1, out=index)
+        return np.take_along_axis(signal, index, axis=1)
+
+    if strategy == "ichimoku":
+        conversion = midpoint(int(params["conversion"]))
+        base = midpoint(int(params["base"]))
+        span2 = midpoint(int(params["span2"]))
+        # 先行スパンは26本前の値を今日の雲として使う
+        top = np.full(close.shape, np.nan)
+        top[:, 26:] = np.fmax((conversion + base) / 2, span2)[:, :-26]
+        return ((close > top) & (conversion > base)).astype(np.float64)
+
+    raise ValueError(f"不明な戦略: {strategy}")
+
+
+def window_sharpe(
+    returns: np.ndarray, windows: Sequence[tuple[int, int]]
+) -> np.ndarray:
+    # 累積和を1回だけ求め、各期間の年率シャープレシオを期間の両端の差から求める
+    csum = np.zeros((returns.shape[0], returns.shape[1] + 1))
+    csq = np.zeros_like(csum)
+    np.cumsum(returns, axis=1, out=csum[:, 1:])
+    np.cumsum(returns * returns, axis=1, out=csq[:, 1:])
+    starts = np.array([s for s, _ in windows])
+    ends = np.array([e for _, e in windows])
+    count = ends - starts
+    mean = (csum[:, ends] - csum[:, starts]) / count
+    var = (csq[:, ends] - csq[:, starts]) / count - mean**2
+    std = np.sqrt(np.maximum(var, 0.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = np.where(std > 1e-12, mean / std * np.sqrt(SESSIONS_PER_YEAR), 0.0)
+    return sharpe
+
+
+def attach_shared(arrays: Mapping[str, SharedArray]) -> None:
+    # ワーカープロセスの初期化：共有メモリをコピーせずにnumpy配列として参照する
+    for key, spec in arrays.items():
+        block = shared_memory.SharedMemory(name=spec["name"], track=False)
+        SHARED_BLOCKS.append(block)
+        SHARED_ARRAYS[key] = np.ndarray(spec["shape"], spec["dtype"], buffer=block.buf)
+
+
+def evaluate_params(
+    strategy: Strategy,
+    combos: Sequence[Mapping[str, float]],
+    windows: Sequence[tuple[int, int, int, int]],
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    ワーカープロセスで、パラメーターの組み合わせごとに全銘柄・全期間の成績を求める
+
+    Returns:
+        (学習期間のシャープレシオ, 検証期間のシャープレシオ)
+        いずれも (組み合わせ, 銘柄, 期間) の配列
+    """
+    close = SHARED_ARRAYS["close"]
+    high = SHARED_ARRAYS["high"]
+    low = SHARED_ARRAYS["low"]
+    log_returns = np.zeros_like(close)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_returns[:, 1:] = np.nan_to_num(np.log(close[:, 1:] / close[:, :-1]))
+
+    train, test = [], []
+    cache: dict[tuple[str, int], np.ndarray] = {}
+    for params in combos:
+        position = np.nan_to_num(
+            strategy_positions(strategy, params, close, high, low, cache)
+        )
+        # 今日の終値で決めたポジションは、翌日の値動きから損益になる
+        returns = np.zeros_like(close)
+        returns[:, 1:] = position[:, :-1] * log_returns[:, 1:]
+        train.append(window_sharpe(returns, [(a, b) for a, b, _, _ in windows]))
+        test.append(window_sharpe(returns, [(c, d) for _, _, c, d in windows]))
+    return np.stack(train), np.stack(test)
+
+
+def format_params(params: Mapping[str, float]) -> str:
+    return "/".join(f"{value:g}" for value in params.values())
+
+
+def walk_forward(
+    panel: PricePanel,
+    strategy: Strategy,
+    train: int = 490,
+    test: int = 120,
+    grid: Mapping[str, Sequence[float]] | None = None,
+    workers: int | None = None,
+) -> pl.DataFrame:
+    """
+    ウォークフォワード最適化：学習期間で最も成績のよいパラメーターを選び、
+    続く検証期間の成績を記録する
+
+    株価の配列は`multiprocessing.shared_memory`に1回だけ置き、ワーカープロセスは
+    それをコピーせずに参照します。パラメーターの組み合わせをワーカー数に分けて
+    並列に評価します。
+
+    Args:
+        panel: 株価のパネル
+        strategy: "sma"・"bbands"・"ichimoku"
+        train: 学習期間の本数（デフォルトはおよそ2年）
+        test: 検証期間の本数（デフォルトはおよそ半年）
+        grid: パラメーターの候補（省略時は`PARAM_GRIDS`）
+        workers: ワーカープロセス数（省略時は使用できるCPUコア数）
+
+    Returns:
+        銘柄・期間ごとの code, window, train_start, test_start, test_end, params,
+        train_sharpe, test_sharpe の列のDataFrame
+    """
+    combos = param_grid(strategy, grid)
+    windows = walk_forward_windows(len(panel.calendar), train, test)
+    if not windows:
+        raise ValueError("学習期間と検証期間に対して株価の期間が短すぎます")
+    workers = min(workers or os.process_cpu_count() or 1, len(combos))
+
+    blocks, specs = [], {}
+    try:
+        for key in ("close", "high", "low"):
+            # Float32のパネルでも、ワーカーがそれぞれ変換しなくて済むようFloat64で置く
+            source = panel.field(key)
+            nbytes = int(np.prod(source.shape)) * np.dtype(np.float64).itemsize
+            block = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+            blocks.append(block)
+            np.ndarray(source.shape, np.float64, buffer=block.buf)[:] = source
+            specs[key] = {
+                "name": block.name,
+                "shape": source.shape,
+                "dtype": np.dtype(np.float64).str,
+            }
+
+        # 連続した組み合わせは期間を共有しやすいため、まとめて同じワーカーに渡す
+        size = -(-len(combos) // workers)
+        chunks = [combos[i : i + size] for i in range(0, len(combos), size)]
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=attach_shared, initargs=(specs,)
+        ) as pool:
+            futures = [
+                pool.submit(evaluate_params, strategy, chunk, windows)
+                for chunk in chunks
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    train_scores = np.concatenate([r[0] for r in results])
+    test_scores = np.concatenate([r[1] for r in results])
+
+    # 銘柄・期間ごとに、学習期間で最も成績のよい組み合わせを選ぶ
+    best = np.argmax(train_scores, axis=0)
+    tickers, window_ids = np.indices(best.shape)
+    labels = np.array([format_params(combo) for combo in combos])
+    calendar = panel.calendar
+    return pl.DataFrame(
+        {
+            "code": np.array(panel.tickers)[tickers.ravel()],
+            "window": window_ids.ravel(),
+            "train_start": calendar[[windows[w][0] for w in window_ids.ravel()]],
+            "test_start": calendar[[windows[w][2] for w in window_ids.ravel()]],
+            "test_end": calendar[[windows[w][3] - 1 for w in window_ids.ravel()]],
+            "params": labels[best.ravel()],
+            "train_sharpe": train_scores[best, tickers, window_ids].ravel(),
+            "test_sharpe": test_scores[best, tickers, window_ids].ravel(),
+        }
+    )
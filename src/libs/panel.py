@@ -0,0 +1,264 @@
+import json
+import warnings
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from numpy.lib.stride_tricks import sliding_window_view
+
+from libs.data import price_dtype
+
+# パネルに持つ項目と、株価データの列の対応
+FIELD_COLUMNS = {
+    "close": "close.amount",
+    "high": "high.amount",
+    "low": "low.amount",
+    "volume": "volume",
+}
+
+
+def rolling_sum_count(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    # 行（銘柄）ごとに、日付方向の過去window本の合計と有効な値の個数を求める
+    valid = ~np.isnan(values)
+    csum = np.cumsum(np.where(valid, values, 0.0), axis=1, dtype=np.float64)
+    ccount = np.cumsum(valid, axis=1, dtype=np.int64)
+    total = csum.copy()
+    count = ccount.copy()
+    total[:, window:] -= csum[:, :-window]
+    count[:, window:] -= ccount[:, :-window]
+    return total, count
+
+
+def rolling_mean_std(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    2次元配列（銘柄 × 日付）の日付方向の移動平均と標準偏差（ddof=0）
+
+    累積和を使うため、期間によらず1要素あたりO(1)で計算できます。
+    二乗和の桁落ちを避けるため、銘柄ごとの平均を引いてから累積します。
+    過去window本の中に欠損（NaN）がある位置はNaNになります。
+
+    Args:
+        values: 銘柄 × 日付の配列（Float32でも累積はFloat64で行う）
+        window: 期間
+
+    Returns:
+        (移動平均, 標準偏差) のFloat64配列
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with warnings.catch_warnings():
+        # すべて欠損の銘柄はNaNのままでよい
+        warnings.simplefilter("ignore", RuntimeWarning)
+        shift = np.nanmean(values, axis=1, keepdims=True)
+    shift = np.nan_to_num(shift)
+    centered = values - shift
+
+    total, count = rolling_sum_count(centered, window)
+    total_sq, _ = rolling_sum_count(centered * centered, window)
+
+    full = count == window
+    mean = np.where(full, total / window + shift, np.nan)
+    var = np.where(full, total_sq / window - (total / window) ** 2, np.nan)
+    std = np.sqrt(np.maximum(var, 0.0))
+    return mean, std
+
+
+def rolling_midpoint(high: np.ndarray, low: np.ndarray, window: int) -> np.ndarray:
+    # 銘柄 × 日付の配列の、過去window本の (最高値 + 最安値) / 2
+    result = np.full(high.shape, np.nan)
+    if window <= high.shape[1]:
+        highest = sliding_window_view(high, window, axis=1).max(axis=-1)
+        lowest = sliding_window_view(low, window, axis=1).min(axis=-1)
+        result[:, window - 1 :] = (highest + lowest) / 2
+    return result
+
+
+def cross_sectional_rank(values: np.ndarray) -> np.ndarray:
+    """
+    日付ごとの銘柄間の順位（0〜1のパーセンタイル、欠損はNaN）
+
+    Args:
+        values: 銘柄 × 日付の配列
+
+    Returns:
+        valuesと同じ形のFloat64配列
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    # NaNは末尾に並ぶため、有効な値の順位は0から始まる
+    order = np.argsort(values, axis=0, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(values.shape[0])[:, None], axis=0)
+    n_valid = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = ranks / np.maximum(n_valid - 1, 1)
+    return np.where(valid, pct, np.nan)
+
+
+def rolling_percentile_rank(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    行（銘柄）ごとに、日付方向の過去window本の中での当日の値の順位（0〜1）
+
+    ウィンドウごとにソートする代わりに、1本前〜window-1本前の値と当日の値を
+    ずらした配列どうしで比較し、当日より小さい値の個数を数えます。
+    比較はすべて銘柄 × 日付の配列演算で行うため、銘柄や日付のループはありません。
+
+    Args:
+        values: 銘柄 × 日付の配列
+        window: 順位を求める期間（当日を含む）
+
+    Returns:
+        valuesと同じ形のFloat64配列（過去window本に欠損がある位置はNaN）
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    below = np.zeros(values.shape, dtype=np.int32)
+    ties = np.zeros(values.shape, dtype=np.int32)
+    for lag in range(1, window):
+        current = values[:, lag:]
+        past = values[:, :-lag]
+        below[:, lag:] += past < current
+        ties[:, lag:] += past == current
+
+    # 同じ値は半分だけ下にあるとみなす
+    _, count = rolling_sum_count(values, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rank = (below + ties / 2) / (window - 1)
+    return np.where((count == window) & valid, rank, np.nan)
+
+
+class PricePanel:
+    """
+    銘柄 × 取引日の2次元配列で株価を持つ、メモリマップされたパネル
+
+    `root`に項目ごとの`.npy`ファイル（close・high・low・volume）、共通の取引日
+    （`calendar.npy`）、銘柄の並び（`meta.json`）を置きます。
+    配列は`np.load(mmap_mode=...)`で開くため、読み込み時にコピーは発生せず、
+    移動平均や銘柄間の順位を市場全体に対して列方向の演算でまとめて計算できます。
+
+    Args:
+        root: 保存先のディレクトリ
+        mode: メモリマップのモード（"r": 読み込みのみ、"r+": 書き込み可）
+    """
+
+    def __init__(self, root: str | Path, mode: str = "r") -> None:
+        self.root = Path(root)
+        self.mode = mode
+        meta = json.loads((self.root / "meta.json").read_text(encoding="utf-8"))
+        self.tickers: list[str] = meta["tickers"]
+        self.fields: list[str] = meta["fields"]
+        self.compact: bool = meta["compact"]
+        self.index = {code: i for i, code in enumerate(self.tickers)}
+        self.calendar: np.ndarray = np.load(self.root / "calendar.npy")
+        self.arrays = {
+            name: np.load(self.root / f"{name}.npy", mmap_mode=mode)
+            for name in self.fields
+        }
+
+    @classmethod
+    def create(
+        cls,
+        root: str | Path,
+        tickers: Sequence[str],
+        calendar: np.ndarray,
+        fields: Sequence[str] = tuple(FIELD_COLUMNS),
+        compact: bool = False,
+    ) -> "PricePanel":
+        # すべて欠損（NaN）で初期化したパネルを作る
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        calendar = np.asarray(calendar, dtype="datetime64[D]")
+        dtype = np.float32 if compact else np.float64
+        for name in fields:
+            array = np.lib.format.open_memmap(
+                root / f"{name}.npy",
+                mode="w+",
+                dtype=dtype,
+                shape=(len(tickers), len(calendar)),
+            )
+            array[:] = np.nan
+            array.flush()
+            del array
+        np.save(root / "calendar.npy", calendar)
+        meta = {"tickers": list(tickers), "fields": list(fields), "compact": compact}
+        (root / "meta.json").write_text(
+            json.dumps(meta, ensure_ascii=False), encoding="utf-8"
+        )
+        return cls(root, mode="r+")
+
+    @classmethod
+    def from_frames(
+        cls,
+        root: str | Path,
+        frames: Mapping[str, pl.DataFrame],
+        calendar: np.ndarray | None = None,
+        compact: bool = False,
+    ) -> "PricePanel":
+        """
+        銘柄ごとの株価データからパネルを作る
+
+        Args:
+            root: 保存先のディレクトリ
+            frames: 証券コード → 株価データ（ticker.history()の戻り値）
+            calendar: 共通の取引日（省略時は全銘柄の日付の和集合）
+            compact: Trueの場合はFloat32で保存する
+
+        Returns:
+            書き込み可能なモードで開いたPricePanel
+        """
+        if calendar is None:
+            dates = pl.concat(
+                [df.select(pl.col("date").cast(pl.Date)) for df in frames.values()]
+            )
+            calendar = dates["date"].unique().sort().to_numpy()
+        panel = cls.create(root, list(frames), calendar, compact=compact)
+        for code, df in frames.items():
+            panel.write_ticker(code, df)
+        panel.flush()
+        return panel
+
+    def write_ticker(self, code: str, df: pl.DataFrame) -> None:
+        # 共通の取引日に合わせて、銘柄の行に値を書き込む
+        row = self.index[code]
+        dates = df["date"].cast(pl.Date).to_numpy().astype("datetime64[D]")
+        cols = np.searchsorted(self.calendar, dates)
+        in_calendar = (cols < len(self.calendar)) & (
+            self.calendar[np.minimum(cols, len(self.calendar) - 1)] == dates
+        )
+        dtype = price_dtype(self.compact)
+        for name in self.fields:
+            column = FIELD_COLUMNS[name]
+            if column not in df.columns:
+                continue
+            values = df[column].cast(dtype).to_numpy()
+            self.arrays[name][row, cols[in_calendar]] = values[in_calendar]
+
+    def flush(self) -> None:
+        for array in self.arrays.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def field(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def ticker(self, code: str) -> pl.DataFrame:
+        # 1銘柄分を株価データと同じ列名のDataFrameとして取り出す
+        row = self.index[code]
+        return pl.DataFrame(
+            {
+                "date": self.calendar,
+                **{FIELD_COLUMNS[name]: self.arrays[name][row] for name in self.fields},
+            }
+        )
+
+    def day(self, date: np.datetime64 | str) -> int:
+        # 指定した日付以前で最も新しい取引日の位置
+        position = np.searchsorted(
+            self.calendar, np.datetime64(date, "D"), side="right"
+        )
+        return int(position) - 1
+
+    def rolling_mean_std(
+        self, name: str = "close", window: int = 20
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return rolling_mean_std(self.arrays[name], window)
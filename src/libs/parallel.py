@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict
+
+# GILが有効なビルドで使うスレッド数の上限
+# （numpy・polarsの計算中はGILが解放されるが、間のPythonの処理は1スレッドずつ動く）
+GIL_WORKERS = 4
+
+
+class TickerRun(TypedDict):
+    workers: int
+    free_threaded: bool
+    seconds: float
+    errors: dict[str, str]
+
+
+def gil_enabled() -> bool:
+    # フリースレッド版（python3.13t以降）でGILが無効になっているか
+    # 通常のビルドには`sys._is_gil_enabled`がないため、有効とみなす
+    check = getattr(sys, "_is_gil_enabled", None)
+    return True if check is None else bool(check())
+
+
+def default_workers() -> int:
+    """
+    銘柄ごとの処理に使うスレッド数
+
+    - フリースレッド版: 使用できるCPUコア数（Pythonの処理も並列に動く）
+    - 通常のビルド: `GIL_WORKERS`まで（numpy・polarsがGILを解放している間と、
+      株価の取得などの待ち時間だけが重なる）
+    """
+    cpus = os.process_cpu_count() or 1
+    return cpus if not gil_enabled() else min(cpus, GIL_WORKERS)
+
+
+def map_tickers[T](
+    func: Callable[[str], T],
+    codes: Iterable[str],
+    workers: int | None = None,
+) -> tuple[dict[str, T], TickerRun]:
+    """
+    銘柄ごとの処理をスレッドプールで並列に実行する
+
+    プロセスプールと違い、引数や戻り値（DataFrame）をpickleせずに受け渡しでき、
+    `IndicatorCache`などのメモリ上のキャッシュを全スレッドで共有できます。
+    1銘柄で例外が起きても他の銘柄の処理は続け、例外は`errors`に記録します。
+
+    Args:
+        func: 証券コードを受け取って結果を返す関数
+        codes: 証券コード
+        workers: スレッド数（省略時は`default_workers()`）
+
+    Returns:
+        (証券コード → 結果（codesの順、失敗した銘柄は含まない）, 実行の記録)
+    """
+    codes = list(dict.fromkeys(codes))
+    workers = max(1, min(workers or default_workers(), len(codes) or 1))
+    start = time.perf_counter()
+    results: dict[str, T] = {}
+    errors: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ticker") as pool:
+        futures = {code: pool.submit(func, code) for code in codes}
+        for code, future in futures.items():
+            try:
+                results[code] = future.result()
+            except Exception as error:  # noqa: BLE001 - 1銘柄の失敗で全体を止めない
+                errors[code] = f"{type(error).__name__}: {error}"
+    return results, {
+        "workers": workers,
+        "free_threaded": not gil_enabled(),
+        "seconds": time.perf_counter() - start,
+        "errors": errors,
+    }
@@ -0,0 +1,177 @@
+import functools
+import json
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import ParamSpec, TypedDict, TypeVar
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class StageRecord(TypedDict):
+    run: int
+    stage: str
+    wall_seconds: float
+    cpu_seconds: float
+    allocated_bytes: int
+
+
+class StageProfiler:
+    """
+    ノートブックの処理段階（データ取得、型変換、指標計算、描画など）ごとの計測器
+
+    `stage()`コンテキストマネージャー、または`track()`デコレーターで囲んだ区間の
+    経過時間（wall）、CPU時間、メモリ確保量を記録します。
+    marimoのセルが再実行されるたびに`new_run()`を呼ぶと、実行回ごとに区別できます。
+
+    tracemallocは一番外側の区間に入ったときに開始し、出たときに止めます
+    （計測していない間のメモリ確保を遅くしない。ほかで開始済みの場合は止めない）。
+    区間を入れ子にした場合も、それぞれの区間のピークを別々に求めます。
+
+    Args:
+        trace_memory: Trueの場合tracemallocでメモリ確保量を計測する
+            （Pythonアロケータ経由の確保のみ。Polars内部のRust側の確保は含まれない）
+    """
+
+    def __init__(self, trace_memory: bool = True) -> None:
+        self.trace_memory = trace_memory
+        self.run = 0
+        self.records: list[StageRecord] = []
+        # 計測中の区間ごとの、その区間内のメモリ使用量のピーク（入れ子の外側が先頭）
+        self.peaks: list[int] = []
+        self.owns_tracing = False
+
+    def new_run(self) -> int:
+        self.run += 1
+        return self.run
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.trace_memory:
+            mem_start = self.enter_memory()
+
+        wall_start = time.perf_counter()
+        # Polarsのワーカースレッド分も含めるためプロセス全体のCPU時間を使う
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            allocated = 0
+            if self.trace_memory:
+                allocated = max(self.exit_memory() - mem_start, 0)
+            self.records.append(
+                {
+                    "run": self.run,
+                    "stage": name,
+                    "wall_seconds": wall,
+                    "cpu_seconds": cpu,
+                    "allocated_bytes": allocated,
+                }
+            )
+
+    def enter_memory(self) -> int:
+        # 区間の開始時のメモリ使用量を返し、この区間のピークの計測を始める
+        if not self.peaks:
+            self.owns_tracing = not tracemalloc.is_tracing()
+            if self.owns_tracing:
+                tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.peaks:
+            # reset_peak()で消える外側の区間のピークを退避する
+            self.peaks[-1] = max(self.peaks[-1], peak)
+        self.peaks.append(current)
+        tracemalloc.reset_peak()
+        return current
+
+    def exit_memory(self) -> int:
+        # 区間内のメモリ使用量のピークを返し、外側の区間のピークに反映する
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max(self.peaks.pop(), peak)
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1], peak)
+            tracemalloc.reset_peak()
+        elif self.owns_tracing:
+            tracemalloc.stop()
+            self.owns_tracing = False
+        return peak
+
+    def track(self, name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+        def decorator(func: Callable[P, R]) -> Callable[P, R]:
+            @functools.wraps(func)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def latest(self) -> list[StageRecord]:
+        return [r for r in self.records if r["run"] == self.run]
+
+    def clear(self) -> None:
+        self.records.clear()
+
+    def to_frame(self, latest_only: bool = False):
+        import polars as pl
+
+        records = self.latest() if latest_only else self.records
+        return pl.DataFrame(
+            records,
+            schema={
+                "run": pl.Int64,
+                "stage": pl.String,
+                "wall_seconds": pl.Float64,
+                "cpu_seconds": pl.Float64,
+                "allocated_bytes": pl.Int64,
+            },
+        )
+
+    def to_json(self, latest_only: bool = False) -> str:
+        records = self.latest() if latest_only else self.records
+        return json.dumps(records, ensure_ascii=False, indent=2)
+
+    def totals(self, latest_only: bool = False) -> list[StageRecord]:
+        # 実行回・処理段階ごとに合計した記録（同じ段階を何度も通った場合は1件にまとめる）
+        records = self.latest() if latest_only else self.records
+        totals: dict[tuple[int, str], StageRecord] = {}
+        for r in records:
+            total = totals.get((r["run"], r["stage"]))
+            if total is None:
+                totals[(r["run"], r["stage"])] = r.copy()
+                continue
+            total["wall_seconds"] += r["wall_seconds"]
+            total["cpu_seconds"] += r["cpu_seconds"]
+            total["allocated_bytes"] += r["allocated_bytes"]
+        return list(totals.values())
+
+    def to_openmetrics(self, latest_only: bool = False) -> str:
+        # 同じラベルの系列が重複しないよう、実行回・処理段階ごとに合計して出力する
+        records = self.totals(latest_only)
+        metrics = [
+            ("stage_wall_seconds", "wall_seconds", "Wall-clock time per stage"),
+            ("stage_cpu_seconds", "cpu_seconds", "Process CPU time per stage"),
+            ("stage_allocated_bytes", "allocated_bytes", "Bytes allocated per stage"),
+        ]
+        lines = []
+        for metric, key, help_text in metrics:
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"# HELP {metric} {help_text}")
+            for r in records:
+                labels = format_labels({"run": str(r["run"]), "stage": r["stage"]})
+                lines.append(f"{metric}{labels} {r[key]}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    # OpenMetricsのラベル値はバックスラッシュ・改行・ダブルクォートをエスケープする
+    pairs = []
+    for key, value in labels.items():
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
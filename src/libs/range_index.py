@@ -0,0 +1,69 @@
+import numpy as np
+import polars as pl
+
+from libs.data import price_dtype
+
+
+def build_sparse_table(values: np.ndarray, op: np.ufunc) -> list[np.ndarray]:
+    # levels[k][i] = op(values[i : i + 2**k])
+    levels = [values]
+    width = 1
+    while width * 2 <= len(values):
+        prev = levels[-1]
+        levels.append(op(prev[: len(prev) - width], prev[width:]))
+        width *= 2
+    return levels
+
+
+class RangeExtremaIndex:
+    """
+    高値の区間最大値・安値の区間最小値を求めるためのスパーステーブル
+
+    構築はO(n log n)で1回だけ行い、以降は任意の期間の
+    「過去N本の最高値・最安値」を1本あたりO(1)で求められます。
+    一目均衡表の期間をスライダーで変えるたびにrolling_max/rolling_minを
+    計算し直す必要がなくなります。
+
+    Args:
+        high: 高値の配列
+        low: 安値の配列
+    """
+
+    def __init__(self, high: np.ndarray, low: np.ndarray) -> None:
+        self.length = len(high)
+        # NaNは無視して最大値・最小値を求める
+        self.high_levels = build_sparse_table(np.asarray(high), np.fmax)
+        self.low_levels = build_sparse_table(np.asarray(low), np.fmin)
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame, compact: bool = False) -> "RangeExtremaIndex":
+        # Decimal型はnumpyでオブジェクト配列になるため、先にFloat64に変換
+        # compact=TrueならFloat32で持つ（テーブルのメモリ使用量が半分になる）
+        dtype = price_dtype(compact)
+        high = df["high.amount"].cast(dtype).to_numpy()
+        low = df["low.amount"].cast(dtype).to_numpy()
+        return cls(high, low)
+
+    def query(self, levels: list[np.ndarray], window: int, op: np.ufunc) -> np.ndarray:
+        result = np.full(self.length, np.nan, dtype=levels[0].dtype)
+        if window < 1 or window > self.length:
+            return result
+
+        # 区間 [i - window + 1, i] を、長さ2**kの2つの区間（重なってよい）で覆う
+        k = window.bit_length() - 1
+        table = levels[k]
+        end = np.arange(window - 1, self.length)
+        first = table[end - window + 1]
+        second = table[end - (1 << k) + 1]
+        result[window - 1 :] = op(first, second)
+        return result
+
+    def rolling_max(self, window: int) -> np.ndarray:
+        return self.query(self.high_levels, window, np.fmax)
+
+    def rolling_min(self, window: int) -> np.ndarray:
+        return self.query(self.low_levels, window, np.fmin)
+
+    def midpoint(self, window: int) -> np.ndarray:
+        # 過去N本の (最高値 + 最安値) / 2
+        return (self.rolling_max(window) + self.rolling_min(window)) / 2
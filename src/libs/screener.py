@@ -0,0 +1,138 @@
+from typing import TypedDict
+
+import numpy as np
+import polars as pl
+
+from libs.panel import PricePanel, rolling_mean_std, rolling_percentile_rank
+
+
+class BandMetrics(TypedDict):
+    # いずれも銘柄 × 日付の配列
+    middle: np.ndarray
+    upper: np.ndarray
+    lower: np.ndarray
+    percent_b: np.ndarray
+    bandwidth: np.ndarray
+    bandwidth_rank: np.ndarray
+
+
+def get_band_metrics(
+    close: np.ndarray, period: int = 20, dev: float = 2.0, rank_window: int = 126
+) -> BandMetrics:
+    """
+    全銘柄のボリンジャーバンド・%b・バンド幅と、バンド幅の過去の中での順位を求める
+
+    Args:
+        close: 銘柄 × 日付の終値
+        period: ボリンジャーバンドの期間
+        dev: 偏差の倍数
+        rank_window: バンド幅の順位を求める期間（126本でおよそ半年）
+
+    Returns:
+        銘柄 × 日付のFloat64配列の辞書
+    """
+    close = np.asarray(close, dtype=np.float64)
+    middle, std = rolling_mean_std(close, period)
+    upper = middle + std * dev
+    lower = middle - std * dev
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent_b = (close - lower) / (upper - lower)
+        bandwidth = (upper - lower) / middle
+    return {
+        "middle": middle,
+        "upper": upper,
+        "lower": lower,
+        "percent_b": percent_b,
+        "bandwidth": bandwidth,
+        "bandwidth_rank": rolling_percentile_rank(bandwidth, rank_window),
+    }
+
+
+def detect_band_events(
+    metrics: BandMetrics, squeeze: float = 0.1, expansion: float = 0.9
+) -> dict[str, np.ndarray]:
+    """
+    バンド幅と%bから、銘柄 × 日付ごとのイベントの有無を求める
+
+    いずれも状態が前日のFalseから当日のTrueに変わった日だけをイベントとします。
+
+    - スクイーズ: バンド幅が過去の中で下位`squeeze`以下（ボラティリティの収縮）
+    - バンド幅拡大: バンド幅が過去の中で上位`1 - expansion`以上
+    - 上限・下限バンド接触: %bが1以上・0以下
+    - 上方・下方ブレイク: 前日がスクイーズの状態で、バンドに接触した
+
+    Returns:
+        シグナル名 → 銘柄 × 日付のbool配列
+    """
+    rank = metrics["bandwidth_rank"]
+    percent_b = metrics["percent_b"]
+    states = {
+        "スクイーズ": rank <= squeeze,
+        "バンド幅拡大": rank >= expansion,
+        "上限バンド接触": percent_b >= 1,
+        "下限バンド接触": percent_b <= 0,
+    }
+
+    def entered(state: np.ndarray) -> np.ndarray:
+        event = np.zeros_like(state)
+        event[:, 1:] = state[:, 1:] & ~state[:, :-1]
+        return event
+
+    events = {name: entered(state) for name, state in states.items()}
+    prev_squeeze = np.zeros_like(states["スクイーズ"])
+    prev_squeeze[:, 1:] = states["スクイーズ"][:, :-1]
+    events["上方ブレイク"] = events["上限バンド接触"] & prev_squeeze
+    events["下方ブレイク"] = events["下限バンド接触"] & prev_squeeze
+    return events
+
+
+def screen_panel(
+    panel: PricePanel,
+    period: int = 20,
+    dev: float = 2.0,
+    rank_window: int = 126,
+    squeeze: float = 0.1,
+    expansion: float = 0.9,
+    last: int | None = None,
+) -> pl.DataFrame:
+    """
+    パネルの全銘柄について、スクイーズ・バンド幅拡大・バンド接触・ブレイクを検出する
+
+    Args:
+        panel: 株価のパネル
+        period: ボリンジャーバンドの期間
+        dev: 偏差の倍数
+        rank_window: バンド幅の順位を求める期間
+        squeeze: スクイーズとみなすバンド幅の順位（0〜1）
+        expansion: バンド幅拡大とみなすバンド幅の順位（0〜1）
+        last: 直近N営業日のイベントだけを返す（省略時は全期間）
+
+    Returns:
+        date, code, signal, price, percent_b, bandwidth, bandwidth_rank の列の
+        DataFrame（日付・証券コード順）
+    """
+    close = panel.field("close")
+    metrics = get_band_metrics(close, period, dev, rank_window)
+    events = detect_band_events(metrics, squeeze, expansion)
+
+    start = 0 if last is None else max(len(panel.calendar) - last, 0)
+    codes = np.array(panel.tickers)
+    frames = []
+    for signal, event in events.items():
+        rows, cols = np.nonzero(event[:, start:])
+        cols += start
+        frames.append(
+            pl.DataFrame(
+                {
+                    "date": panel.calendar[cols],
+                    "code": codes[rows],
+                    "signal": [signal] * len(rows),
+                    "price": np.asarray(close[rows, cols], dtype=np.float64),
+                    "percent_b": metrics["percent_b"][rows, cols],
+                    "bandwidth": metrics["bandwidth"][rows, cols],
+                    "bandwidth_rank": metrics["bandwidth_rank"][rows, cols],
+                },
+                schema_overrides={"code": pl.String, "signal": pl.String},
+            )
+        )
+    return pl.concat(frames).sort("date", "code")
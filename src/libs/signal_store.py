@@ -0,0 +1,158 @@
+import datetime as dt
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+import polars as pl
+
+from libs.jpx_calendar import session_offset
+
+# 保存する列（signal列はディレクトリ名として持つ）
+SIGNAL_SCHEMA = {
+    "code": pl.String,
+    "date": pl.Date,
+    "detector": pl.String,
+    "price": pl.Float64,
+}
+
+
+class SignalStore:
+    """
+    売買シグナルの履歴を、シグナルの種類ごとに分けたParquetファイルに追記していく
+
+    `root/signal=<シグナル名>/part-<時刻>.parquet`の形で保存します（Hive形式の分割）。
+    各ファイルは証券コード・日付の順に並べて書くため、行グループごとの
+    最小値・最大値の統計が狭い範囲になり、`pl.scan_parquet()`で
+
+    - シグナルの種類での絞り込みはディレクトリ単位で
+    - 証券コード・日付での絞り込みは行グループ単位で
+
+    必要な部分だけを読み込めます。
+
+    Args:
+        root: 保存先のディレクトリ
+        row_group_size: 1つの行グループの行数
+    """
+
+    def __init__(
+        self, root: str | Path = ".cache/signals", row_group_size: int = 16_384
+    ) -> None:
+        self.root = Path(root)
+        self.row_group_size = row_group_size
+
+    def files(self) -> list[Path]:
+        return sorted(self.root.glob("signal=*/part-*.parquet"))
+
+    def scan(self) -> pl.LazyFrame:
+        if not self.files():
+            return pl.LazyFrame(schema={**SIGNAL_SCHEMA, "signal": pl.String})
+        return pl.scan_parquet(
+            self.root / "**" / "*.parquet",
+            hive_partitioning=True,
+            hive_schema={"signal": pl.String},
+        )
+
+    def append(self, signals: pl.DataFrame) -> int:
+        """
+        シグナルを追記する（保存済みの証券コード・日付・シグナルの組は追記しない）
+
+        Args:
+            signals: code, date, detector, signal, price の列を含むDataFrame
+                （`collect_signals()`の戻り値に証券コードの列を加えたもの）
+
+        Returns:
+            追記した行数
+        """
+        if signals.is_empty():
+            return 0
+        rows = signals.select(
+            pl.col("code").cast(pl.String),
+            # タイムゾーン付きの日時は、そのタイムゾーンでの日付にする
+            pl.col("date").dt.date(),
+            pl.col("detector").cast(pl.String),
+            pl.col("signal").cast(pl.String),
+            pl.col("price").cast(pl.Float64),
+        ).unique(["code", "date", "signal"], keep="last")
+
+        # 保存済みの行は、同じ証券コード・期間の行グループだけを読んで確認する
+        if self.files():
+            existing = (
+                self.scan()
+                .filter(
+                    pl.col("code").is_in(rows["code"].unique().implode()),
+                    pl.col("date") >= rows["date"].min(),
+                    pl.col("date") <= rows["date"].max(),
+                )
+                .select("code", "date", "signal")
+                .collect()
+            )
+            rows = rows.join(existing, on=["code", "date", "signal"], how="anti")
+
+        stamp = time.time_ns()
+        for (signal,), part in rows.group_by("signal"):
+            directory = self.root / f"signal={signal}"
+            directory.mkdir(parents=True, exist_ok=True)
+            self.write(part.drop("signal"), directory / f"part-{stamp}.parquet")
+        return rows.height
+
+    def write(self, rows: pl.DataFrame, path: Path) -> None:
+        # 証券コード・日付の順に並べ、統計情報付きで書く（途中で失敗しても壊れない）
+        tmp = path.with_suffix(".tmp")
+        rows.sort("code", "date").write_parquet(
+            tmp, statistics=True, row_group_size=self.row_group_size
+        )
+        tmp.replace(path)
+
+    def compact(self) -> None:
+        # 追記を繰り返して増えた小さなファイルを、シグナルごとに1つにまとめ直す
+        for directory in sorted(self.root.glob("signal=*")):
+            parts = sorted(directory.glob("part-*.parquet"))
+            if len(parts) <= 1:
+                continue
+            rows = pl.read_parquet(parts, hive_partitioning=False)
+            self.write(rows, directory / f"part-{time.time_ns()}.parquet")
+            for part in parts:
+                part.unlink()
+
+    def query(
+        self,
+        signals: Sequence[str] | None = None,
+        codes: Sequence[str] | None = None,
+        start: dt.date | None = None,
+        end: dt.date | None = None,
+    ) -> pl.DataFrame:
+        """
+        条件に合うシグナルを読み込む（条件はParquetの読み込み時に適用される）
+
+        Returns:
+            code, date, detector, signal, price の列のDataFrame（日付・証券コード順）
+        """
+        lf = self.scan()
+        if signals is not None:
+            lf = lf.filter(pl.col("signal").is_in(list(signals)))
+        if codes is not None:
+            lf = lf.filter(pl.col("code").is_in(list(codes)))
+        if start is not None:
+            lf = lf.filter(pl.col("date") >= start)
+        if end is not None:
+            lf = lf.filter(pl.col("date") <= end)
+        return (
+            lf.select("code", "date", "detector", "signal", "price")
+            .sort("date", "code")
+            .collect()
+        )
+
+    def recent(
+        self,
+        sessions: int = 5,
+        signals: Sequence[str] | None = None,
+        until: dt.date | None = None,
+    ) -> pl.DataFrame:
+        # 直近N営業日のシグナル（例: 直近5営業日のゴールデンクロス）
+        until = dt.date.today() if until is None else until
+        start = session_offset(until, -(sessions - 1)).item()
+        return self.query(signals=signals, start=start, end=until)
+
+    def history(self, code: str) -> pl.DataFrame:
+        # 1銘柄のシグナルの履歴
+        return self.query(codes=[code])
@@ -0,0 +1,88 @@
+import polars as pl
+
+from libs.bbands import get_bbands_family
+
+
+def get_sma_values(df: pl.DataFrame, short: int = 5, long: int = 25) -> pl.DataFrame:
+    # kandは計算するときだけimportする（CLIの起動を軽くするため）
+    import kand as ka
+
+    close = df["close.amount"].to_numpy().astype("float64")
+    return df.with_columns(
+        pl.Series(f"ma{short}", ka.sma(close, period=short)),
+        pl.Series(f"ma{long}", ka.sma(close, period=long)),
+    )
+
+
+def detect_sma_cross(df: pl.DataFrame, short: int = 5, long: int = 25) -> pl.DataFrame:
+    """
+    短期線と長期線のクロスを検出する
+
+    Args:
+        df: `get_sma_values()`で移動平均線の列を追加したDataFrame
+        short: 短期線の期間
+        long: 長期線の期間
+
+    Returns:
+        date, price, signal の3列のDataFrame（日付順）
+    """
+    df_cross = (
+        df.with_columns(
+            diff=(pl.col(f"ma{short}") - pl.col(f"ma{long}")),
+        )
+        .with_columns(
+            prev_diff=pl.col("diff").shift(1),
+        )
+        .with_columns(
+            # ゴールデンクロス: 前日は負（短期線 < 長期線）、当日は正（短期線 > 長期線）
+            golden_cross=(pl.col("prev_diff") < 0) & (pl.col("diff") > 0),
+            # デッドクロス: 前日は正（短期線 > 長期線）、当日は負（短期線 < 長期線）
+            dead_cross=(pl.col("prev_diff") > 0) & (pl.col("diff") < 0),
+        )
+    )
+    golden_crosses = df_cross.filter(pl.col("golden_cross")).select(
+        pl.col("date"),
+        pl.col("close.amount").cast(pl.Float64).alias("price"),
+        pl.lit("ゴールデンクロス").alias("signal"),
+    )
+    dead_crosses = df_cross.filter(pl.col("dead_cross")).select(
+        pl.col("date"),
+        pl.col("close.amount").cast(pl.Float64).alias("price"),
+        pl.lit("デッドクロス").alias("signal"),
+    )
+    return pl.concat([golden_crosses, dead_crosses]).sort("date")
+
+
+def get_bbands_values(
+    df: pl.DataFrame, period: int = 20, dev: float = 2.0
+) -> pl.DataFrame:
+    return df.with_columns(get_bbands_family(df["close.amount"], [period], [dev]))
+
+
+def detect_band_touch(
+    df: pl.DataFrame, period: int = 20, dev: float = 2.0
+) -> pl.DataFrame:
+    """
+    終値がボリンジャーバンドの上限・下限に接触した日を検出する
+
+    Args:
+        df: `get_bbands_values()`でバンドの列を追加したDataFrame
+        period: ボリンジャーバンドの期間
+        dev: 偏差の倍数
+
+    Returns:
+        date, price, signal の3列のDataFrame（日付順）
+    """
+    close = pl.col("close.amount").cast(pl.Float64)
+    return (
+        df.with_columns(
+            # 上限接触: 買われすぎ、下限接触: 売られすぎ
+            signal=pl.when(close >= pl.col(f"bb{period}_upper_{dev:g}"))
+            .then(pl.lit("上限バンド接触"))
+            .when(close <= pl.col(f"bb{period}_lower_{dev:g}"))
+            .then(pl.lit("下限バンド接触"))
+            .otherwise(None),
+        )
+        .filter(pl.col("signal").is_not_null())
+        .select(pl.col("date"), close.alias("price"), pl.col("signal"))
+    )
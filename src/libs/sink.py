@@ -0,0 +1,104 @@
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+import polars as pl
+
+
+class ColumnSink:
+    """
+    ストリーミング処理の結果を列ごとのnumpy配列に書き込んでいく出力先
+
+    結果をタプルのリストに溜めてから列ごとに取り出すと、値ごとにPythonの
+    オブジェクトができ、全体のコピーも何度も発生します。ここでは列ごとに
+    あらかじめ確保した配列に書き込み、足りなくなったら容量を2倍にします。
+    値がない（ウォームアップ中など）ことは、列ごとの有効フラグの配列で表します。
+
+    ```python
+    sink = ColumnSink(["upper", "middle", "lower"])
+    for price in prices:
+        sink.append(stream.update(price))  # Noneなら全列が欠損
+    df = sink.to_frame()
+    ```
+
+    Args:
+        columns: 列名のリスト
+        capacity: 最初に確保する行数
+    """
+
+    def __init__(self, columns: Sequence[str], capacity: int = 1024) -> None:
+        self.columns = list(columns)
+        self.values = np.empty((len(self.columns), max(capacity, 1)))
+        self.valid = np.zeros((len(self.columns), max(capacity, 1)), dtype=np.bool_)
+        self.length = 0
+        self.views()
+
+    def views(self) -> None:
+        self.value_views = [memoryview(column) for column in self.values]
+        self.valid_views = [memoryview(column) for column in self.valid]
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def capacity(self) -> int:
+        return self.values.shape[1]
+
+    def reserve(self, capacity: int) -> None:
+        # 容量をcapacity行以上にする（書き込み済みの行だけをコピーする）
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        values = np.empty((len(self.columns), capacity))
+        valid = np.zeros((len(self.columns), capacity), dtype=np.bool_)
+        values[:, : self.length] = self.values[:, : self.length]
+        valid[:, : self.length] = self.valid[:, : self.length]
+        self.values, self.valid = values, valid
+        self.views()
+
+    def append(self, row: Sequence[float | None] | None) -> None:
+        """
+        1行を書き込む
+
+        Args:
+            row: 列の順の値（Noneの値は欠損）。row自体がNoneなら全列が欠損
+        """
+        if self.length == self.capacity:
+            self.reserve(self.length + 1)
+        i = self.length
+        if row is not None:
+            # numpyの要素代入より速いmemoryview経由で書き込む（有効フラグは0で初期化済み）
+            for values, valid, value in zip(self.value_views, self.valid_views, row):
+                if value is not None:
+                    values[i] = value
+                    valid[i] = True
+        self.length += 1
+
+    def extend(self, rows: Iterable[Sequence[float | None] | None]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def column(self, name: str) -> np.ndarray:
+        # 書き込み済みの部分のビュー（欠損の位置の値は不定）
+        return self.values[self.columns.index(name), : self.length]
+
+    def to_frame(self, index: str | None = "index") -> pl.DataFrame:
+        """
+        書き込んだ結果をDataFrameにする
+
+        値の配列はコピーせずにpolarsの列として参照し、欠損がある列だけ
+        有効フラグから欠損の情報（validity bitmap）を付けます。
+
+        Args:
+            index: 行番号の列名（Noneなら行番号の列を付けない）
+        """
+        series = []
+        for j, name in enumerate(self.columns):
+            column = pl.Series(name, self.values[j, : self.length])
+            valid = self.valid[j, : self.length]
+            if not valid.all():
+                column = column.set(pl.Series(~valid), None)
+            series.append(column)
+        df = pl.DataFrame(series)
+        if index is not None:
+            df = df.with_row_index(index)
+        return df
@@ -0,0 +1,660 @@
+import math
+import struct
+import time
+from collections.abc import Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import ClassVar, Self, TypedDict
+
+import numpy as np
+
+from libs.latency import StreamStats
+from libs.panel import rolling_midpoint
+
+# チェックポイントの先頭に付ける識別子と形式のバージョン
+CHECKPOINT_MAGIC = b"PSLS"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct("<4sBBH")
+
+
+class Checkpointable:
+    """
+    ストリーミング指標の状態をバイナリのチェックポイントに保存・復元する
+
+    サブクラスは、構築時の引数（`PARAMS`）・数値の状態（`SCALARS`）・
+    配列の状態（`ARRAYS`）の属性名を宣言します。チェックポイントは
+
+    - ヘッダー: 識別子, バージョン, 種類, 数値の個数
+    - 引数と数値の状態: float64の並び（Noneは NaN）
+    - 配列: 要素数（uint32）+ float64の並び を配列の数だけ
+
+    の形で、数百バイト程度です。復元はバイト列を数値と配列に戻すだけなので、
+    過去の株価を取得して`period`本以上を流し込み直す必要がありません。
+    """
+
+    KIND: ClassVar[int]
+    PARAMS: ClassVar[tuple[str, ...]]
+    SCALARS: ClassVar[tuple[str, ...]]
+    ARRAYS: ClassVar[tuple[str, ...]]
+
+    def checkpoint(self) -> bytes:
+        numbers = [
+            math.nan if getattr(self, name) is None else float(getattr(self, name))
+            for name in (*self.PARAMS, *self.SCALARS)
+        ]
+        parts = [
+            CHECKPOINT_HEADER.pack(
+                CHECKPOINT_MAGIC, CHECKPOINT_VERSION, self.KIND, len(numbers)
+            ),
+            struct.pack(f"<{len(numbers)}d", *numbers),
+        ]
+        for name in self.ARRAYS:
+            array = np.ascontiguousarray(getattr(self, name), dtype="<f8")
+            parts.append(struct.pack("<I", array.size))
+            parts.append(array.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def restore(cls, data: bytes, stats: StreamStats | None = None) -> Self:
+        """
+        `checkpoint()`のバイト列から、保存したときの状態のストリームを作る
+
+        Args:
+            data: `checkpoint()`の戻り値
+            stats: 復元後の更新の遅延時間を記録する`StreamStats`
+        """
+        magic, version, kind, count = CHECKPOINT_HEADER.unpack_from(data)
+        if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+            raise ValueError("ストリームのチェックポイントではありません")
+        if kind != cls.KIND:
+            raise ValueError(f"{cls.__name__}のチェックポイントではありません: {kind}")
+        offset = CHECKPOINT_HEADER.size
+        numbers = struct.unpack_from(f"<{count}d", data, offset)
+        offset += 8 * count
+
+        params = dict(zip(cls.PARAMS, numbers))
+        stream = cls(
+            **{
+                name: None if math.isnan(value) else value
+                for name, value in params.items()
+            },
+            stats=stats,
+        )
+        for name, value in zip(cls.SCALARS, numbers[len(cls.PARAMS) :]):
+            # 整数の状態（本数・位置）は整数に戻す
+            current = getattr(stream, name)
+            setattr(stream, name, int(value) if isinstance(current, int) else value)
+        for name in cls.ARRAYS:
+            (size,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            array = np.frombuffer(data, dtype="<f8", count=size, offset=offset)
+            offset += 8 * size
+            getattr(stream, name)[...] = array.reshape(getattr(stream, name).shape)
+        return stream
+
+
+def fill_ring(buffer: np.ndarray, history: np.ndarray, size: int) -> int:
+    """
+    過去の値の末尾をリングバッファに並べ、1本ずつ流し込んだ場合と同じ配置にする
+
+    Args:
+        buffer: リングバッファ（先頭のsize要素を使う）
+        history: 過去の値（古い順）
+        size: リングバッファの長さ
+
+    Returns:
+        次に書き込む位置
+    """
+    tail = history[-size:]
+    start = len(history) - len(tail)
+    buffer[(start + np.arange(len(tail))) % size] = tail
+    return len(history) % size
+
+
+class BollingerStream(Checkpointable):
+    """
+    長時間動かしても誤差が蓄積しないボリンジャーバンドのストリーミング計算
+
+    `ka.bbands_inc()`のように合計と二乗合計を持ち回ると、`sum_sq - sum^2 / n`の
+    桁落ちによる誤差が更新のたびに積み重なります。ここでは平均と偏差平方和を
+    Welford法（スライディングウィンドウ版）で更新し、さらに`reanchor_every`回ごとに
+    ウィンドウ内の値から厳密に計算し直します（再アンカー）。
+
+    Args:
+        period: ボリンジャーバンドの期間
+        dev_up: 上方偏差倍数
+        dev_down: 下方偏差倍数
+        reanchor_every: 再アンカーする間隔（更新回数）。Noneの場合は再アンカーしない
+        stats: 更新1回ごとの遅延時間を記録する`StreamStats`（省略時は計測しない）
+    """
+
+    KIND = 1
+    PARAMS = ("period", "dev_up", "dev_down", "reanchor_every")
+    SCALARS = ("pos", "count", "mean", "m2", "since_anchor", "last_drift", "max_drift")
+    ARRAYS = ("buffer",)
+
+    def __init__(
+        self,
+        period: int = 20,
+        dev_up: float = 2.0,
+        dev_down: float = 2.0,
+        reanchor_every: int | None = 10_000,
+        stats: StreamStats | None = None,
+    ) -> None:
+        self.period = int(period)
+        self.dev_up = dev_up
+        self.dev_down = dev_down
+        self.reanchor_every = None if reanchor_every is None else int(reanchor_every)
+        self.stats = stats
+
+        # 状態変数
+        self.buffer = np.zeros(self.period, dtype=np.float64)  # リングバッファ
+        self.pos = 0  # 次に書き込む位置（= 最も古い値の位置）
+        self.count = 0  # これまでに受け取った価格の数
+        self.mean = 0.0
+        self.m2 = 0.0  # 偏差平方和
+        self.since_anchor = 0
+
+        # 再アンカー時に測った、持ち回りの値と厳密な値の差
+        self.last_drift = 0.0
+        self.max_drift = 0.0
+
+    @classmethod
+    def from_history(
+        cls,
+        prices: np.ndarray,
+        period: int = 20,
+        dev_up: float = 2.0,
+        dev_down: float = 2.0,
+        reanchor_every: int | None = 10_000,
+        stats: StreamStats | None = None,
+    ) -> Self:
+        """
+        過去の価格から、それを全部流し込んだ後と同じ状態のストリームを作る
+
+        バッチ計算で使った終値の配列をそのまま渡すと、末尾の`period`本だけから
+        状態を作るため、履歴を1本ずつ流し込み直さずに次の足からバンドが出ます。
+
+        Args:
+            prices: 過去の価格（古い順）
+        """
+        stream = cls(period, dev_up, dev_down, reanchor_every, stats)
+        prices = np.asarray(prices, dtype=np.float64)
+        stream.pos = fill_ring(stream.buffer, prices, stream.period)
+        stream.count = len(prices)
+        if stream.count:
+            stream.mean, stream.m2 = stream.exact()
+        return stream
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.period
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(max(self.m2, 0.0) / self.period)
+
+    def bands(self) -> tuple[float, float, float] | None:
+        if not self.ready:
+            return None
+        std = self.std
+        return (
+            self.mean + std * self.dev_up,
+            self.mean,
+            self.mean - std * self.dev_down,
+        )
+
+    def update(self, price: float) -> tuple[float, float, float] | None:
+        """
+        価格を1つ受け取り、(upper, middle, lower)を返す（ウォームアップ中はNone）
+        """
+        if self.stats is None:
+            return self.step(price)
+        start = time.perf_counter_ns()
+        bands = self.step(price)
+        self.stats.record(time.perf_counter_ns() - start)
+        return bands
+
+    def step(self, price: float) -> tuple[float, float, float] | None:
+        price = float(price)
+        if self.count < self.period:
+            # ウォームアップ期間：通常のWelford法で平均と偏差平方和を積み上げる
+            self.buffer[self.pos] = price
+            self.pos = (self.pos + 1) % self.period
+            self.count += 1
+            delta = price - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (price - self.mean)
+            return self.bands()
+
+        # スライディングウィンドウ：最も古い値を取り除き、新しい値を加える
+        old_price = float(self.buffer[self.pos])
+        self.buffer[self.pos] = price
+        self.pos = (self.pos + 1) % self.period
+        self.count += 1
+
+        old_mean = self.mean
+        self.mean += (price - old_price) / self.period
+        self.m2 += (price - old_price) * (price - self.mean + old_price - old_mean)
+
+        self.since_anchor += 1
+        if self.reanchor_every is not None and self.since_anchor >= self.reanchor_every:
+            self.reanchor()
+        return self.bands()
+
+    def exact(self) -> tuple[float, float]:
+        # ウィンドウ内の値から平均と偏差平方和を2パスで厳密に計算する
+        window = self.buffer[: min(self.count, self.period)]
+        mean = float(window.mean())
+        m2 = float(((window - mean) ** 2).sum())
+        return mean, m2
+
+    def drift(self) -> float:
+        """
+        現在の持ち回りの値と厳密な値の差（平均と標準偏差の差の大きい方）
+        """
+        if self.count == 0:
+            return 0.0
+        mean, m2 = self.exact()
+        n = min(self.count, self.period)
+        std = math.sqrt(max(self.m2, 0.0) / n)
+        return max(abs(self.mean - mean), abs(std - math.sqrt(m2 / n)))
+
+    def reanchor(self) -> float:
+        drift = self.drift()
+        self.mean, self.m2 = self.exact()
+        self.since_anchor = 0
+        self.last_drift = drift
+        self.max_drift = max(self.max_drift, drift)
+        return drift
+
+
+def bbands_stream(
+    prices: Iterable[float],
+    period: int = 20,
+    dev_up: float = 2.0,
+    dev_down: float = 2.0,
+    reanchor_every: int | None = 10_000,
+) -> Iterator[tuple[float | None, float | None, float | None, int]]:
+    """
+    `BollingerStream`をジェネレーターとして使う
+
+    Yields:
+        (upper, middle, lower, index): 各データポイントのボリンジャーバンド値
+    """
+    stream = BollingerStream(period, dev_up, dev_down, reanchor_every)
+    for idx, price in enumerate(prices):
+        bands = stream.update(price)
+        if bands is None:
+            yield (None, None, None, idx)
+        else:
+            yield (*bands, idx)
+
+
+class SmaCrossStream(Checkpointable):
+    """
+    短期・長期の移動平均線とそのクロスのストリーミング計算
+
+    長期線の期間分のリングバッファと、短期・長期の合計を持ち回ります。
+    `reanchor_every`回ごとにバッファから合計を計算し直し、誤差の蓄積を防ぎます。
+
+    Args:
+        short: 短期線の期間
+        long: 長期線の期間
+        reanchor_every: 合計を計算し直す間隔（更新回数）。Noneの場合は計算し直さない
+        stats: 更新1回ごとの遅延時間を記録する`StreamStats`（省略時は計測しない）
+    """
+
+    KIND = 2
+    PARAMS = ("short", "long", "reanchor_every")
+    SCALARS = ("pos", "count", "short_sum", "long_sum", "prev_diff", "since_anchor")
+    ARRAYS = ("buffer",)
+
+    def __init__(
+        self,
+        short: int = 5,
+        long: int = 25,
+        reanchor_every: int | None = 10_000,
+        stats: StreamStats | None = None,
+    ) -> None:
+        self.short = int(short)
+        self.long = int(long)
+        self.reanchor_every = None if reanchor_every is None else int(reanchor_every)
+        self.stats = stats
+
+        self.buffer = np.zeros(self.long, dtype=np.float64)
+        self.pos = 0
+        self.count = 0
+        self.short_sum = 0.0
+        self.long_sum = 0.0
+        self.prev_diff = math.nan  # 直前の (短期線 - 長期線)
+        self.since_anchor = 0
+
+    @classmethod
+    def from_history(
+        cls,
+        prices: np.ndarray,
+        short: int = 5,
+        long: int = 25,
+        reanchor_every: int | None = 10_000,
+        stats: StreamStats | None = None,
+    ) -> Self:
+        """
+        過去の価格から、それを全部流し込んだ後と同じ状態のストリームを作る
+
+        Args:
+            prices: 過去の価格（古い順）。直前の足のクロス判定に`long + 1`本を使う
+        """
+        stream = cls(short, long, reanchor_every, stats)
+        prices = np.asarray(prices, dtype=np.float64)
+        stream.pos = fill_ring(stream.buffer, prices, stream.long)
+        stream.count = len(prices)
+        stream.short_sum = float(prices[-stream.short :].sum())
+        stream.long_sum = float(prices[-stream.long :].sum())
+        if stream.count >= stream.long:
+            stream.prev_diff = (
+                stream.short_sum / stream.short - stream.long_sum / stream.long
+            )
+        return stream
+
+    def update(self, price: float) -> tuple[float | None, float | None, str | None]:
+        """
+        価格を1つ受け取り、(短期線, 長期線, シグナル)を返す
+
+        シグナルは"ゴールデンクロス"・"デッドクロス"・None
+        （`detect_sma_cross()`と同じ判定）
+        """
+        if self.stats is None:
+            return self.step(price)
+        start = time.perf_counter_ns()
+        result = self.step(price)
+        self.stats.record(time.perf_counter_ns() - start)
+        return result
+
+    def step(self, price: float) -> tuple[float | None, float | None, str | None]:
+        price = float(price)
+        if self.count >= self.short:
+            self.short_sum -= float(self.buffer[(self.pos - self.short) % self.long])
+        if self.count >= self.long:
+            self.long_sum -= float(self.buffer[self.pos])
+        self.buffer[self.pos] = price
+        self.pos = (self.pos + 1) % self.long
+        self.count += 1
+        self.short_sum += price
+        self.long_sum += price
+
+        self.since_anchor += 1
+        if self.reanchor_every is not None and self.since_anchor >= self.reanchor_every:
+            self.reanchor()
+
+        short_ma = self.short_sum / self.short if self.count >= self.short else None
+        if self.count < self.long:
+            return short_ma, None, None
+        long_ma = self.long_sum / self.long
+        diff = short_ma - long_ma
+        signal = None
+        if self.prev_diff < 0 < diff:
+            signal = "ゴールデンクロス"
+        elif self.prev_diff > 0 > diff:
+            signal = "デッドクロス"
+        self.prev_diff = diff
+        return short_ma, long_ma, signal
+
+    def reanchor(self) -> None:
+        # バッファ内の値から合計を計算し直す
+        order = (self.pos - np.arange(1, min(self.count, self.long) + 1)) % self.long
+        values = self.buffer[order]
+        self.short_sum = float(values[: self.short].sum())
+        self.long_sum = float(values.sum())
+        self.since_anchor = 0
+
+
+class IchimokuState(TypedDict):
+    conversion_line: float | None
+    base_line: float | None
+    # 今日の雲（displacement本前に計算した先行スパン）
+    leading_span1: float | None
+    leading_span2: float | None
+    signals: list[str]
+
+
+class IchimokuStream(Checkpointable):
+    """
+    一目均衡表（転換線・基準線・今日の雲）とシグナルのストリーミング計算
+
+    高値・安値は`span2`本分のリングバッファに2回ずつ書き込み（長さは2倍）、
+    直近N本を常に連続したスライスとして取り出せるようにしています。
+    先行スパンは`displacement`本分のリングバッファに溜め、
+    `displacement`本後にその日の雲として取り出します。
+
+    シグナルは`detect_ichimoku_signals()`と同じ"好転"・"逆転"・"雲上抜け"・"雲下抜け"です。
+
+    Args:
+        conversion: 転換線の期間
+        base: 基準線の期間
+        span2: 先行スパン2の期間
+        displacement: 先行スパンをずらす本数
+        stats: 更新1回ごとの遅延時間を記録する`StreamStats`（省略時は計測しない）
+    """
+
+    KIND = 3
+    PARAMS = ("conversion", "base", "span2", "displacement")
+    SCALARS = ("pos", "span_pos", "count", "prev_diff", "prev_above", "prev_below")
+    ARRAYS = ("high", "low", "spans")
+
+    def __init__(
+        self,
+        conversion: int = 9,
+        base: int = 26,
+        span2: int = 52,
+        displacement: int = 26,
+        stats: StreamStats | None = None,
+    ) -> None:
+        self.conversion = int(conversion)
+        self.base = int(base)
+        self.span2 = int(span2)
+        self.displacement = int(displacement)
+        self.stats = stats
+
+        self.size = max(self.conversion, self.base, self.span2)
+        self.high = np.full(self.size * 2, np.nan)
+        self.low = np.full(self.size * 2, np.nan)
+        self.spans = np.full((2, self.displacement), np.nan)
+        self.pos = 0
+        self.span_pos = 0
+        self.count = 0
+        # 直前の足の (転換線 - 基準線)・雲の上か・雲の下か（NaNは判定できない）
+        self.prev_diff = math.nan
+        self.prev_above = math.nan
+        self.prev_below = math.nan
+
+    @classmethod
+    def from_history(
+        cls,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        conversion: int = 9,
+        base: int = 26,
+        span2: int = 52,
+        displacement: int = 26,
+        stats: StreamStats | None = None,
+    ) -> Self:
+        """
+        過去の高値・安値・終値から、それを全部流し込んだ後と同じ状態のストリームを作る
+
+        先行スパンは末尾の`span2 + displacement`本だけを`rolling_midpoint()`で
+        まとめて計算し、まだ雲になっていない`displacement`本分をリングバッファに入れます。
+
+        Args:
+            high: 過去の高値（古い順）
+            low: 過去の安値（古い順）
+            close: 過去の終値（古い順）
+        """
+        stream = cls(conversion, base, span2, displacement, stats)
+        count = len(close)
+        tail = stream.size + stream.displacement
+        high = np.asarray(high, dtype=np.float64)[-tail:]
+        low = np.asarray(low, dtype=np.float64)[-tail:]
+        close = np.asarray(close, dtype=np.float64)[-tail:]
+
+        # リングバッファは、同じ値を pos と pos + size の両方に書く
+        stream.pos = fill_ring(stream.high, high, stream.size)
+        fill_ring(stream.low, low, stream.size)
+        stream.high[stream.size :] = stream.high[: stream.size]
+        stream.low[stream.size :] = stream.low[: stream.size]
+        stream.count = count
+
+        def midpoint(window: int) -> np.ndarray:
+            return rolling_midpoint(high[None, :], low[None, :], window)[0]
+
+        conversion_line = midpoint(stream.conversion)
+        base_line = midpoint(stream.base)
+        leading = np.stack([(conversion_line + base_line) / 2, midpoint(stream.span2)])
+        stream.span_pos = fill_ring(stream.spans[0], leading[0], stream.displacement)
+        fill_ring(stream.spans[1], leading[1], stream.displacement)
+
+        if count:
+            stream.prev_diff = float(conversion_line[-1] - base_line[-1])
+            # 最後の足の雲は、displacement本前に計算した先行スパン
+            if len(close) > stream.displacement:
+                span = leading[:, -stream.displacement - 1]
+                top, bottom = np.fmax(*span), np.fmin(*span)
+                last = close[-1]
+                stream.prev_above = math.nan if math.isnan(top) else float(last > top)
+                stream.prev_below = (
+                    math.nan if math.isnan(bottom) else float(last < bottom)
+                )
+        return stream
+
+    def midpoint(self, window: int) -> float:
+        if self.count < window:
+            return math.nan
+        end = self.pos + self.size
+        return (
+            float(self.high[end - window : end].max())
+            + float(self.low[end - window : end].min())
+        ) / 2
+
+    def update(self, high: float, low: float, close: float) -> IchimokuState:
+        if self.stats is None:
+            return self.step(high, low, close)
+        start = time.perf_counter_ns()
+        result = self.step(high, low, close)
+        self.stats.record(time.perf_counter_ns() - start)
+        return result
+
+    def step(self, high: float, low: float, close: float) -> IchimokuState:
+        # 同じ値を pos と pos + size に書き、[pos + 1, pos + size] を直近の窓にする
+        self.high[self.pos] = self.high[self.pos + self.size] = high
+        self.low[self.pos] = self.low[self.pos + self.size] = low
+        self.pos = (self.pos + 1) % self.size
+        self.count += 1
+
+        conversion_line = self.midpoint(self.conversion)
+        base_line = self.midpoint(self.base)
+
+        # displacement本前の先行スパンを取り出し、今日の値と入れ替える
+        span1, span2 = (float(v) for v in self.spans[:, self.span_pos])
+        self.spans[0, self.span_pos] = (conversion_line + base_line) / 2
+        self.spans[1, self.span_pos] = self.midpoint(self.span2)
+        self.span_pos = (self.span_pos + 1) % self.displacement
+
+        signals = []
+        diff = conversion_line - base_line
+        if self.prev_diff < 0 < diff:
+            signals.append("好転")
+        elif self.prev_diff > 0 > diff:
+            signals.append("逆転")
+
+        # 先行スパンの片方だけがある間は、ある方を雲とする
+        top = np.fmax(span1, span2)
+        bottom = np.fmin(span1, span2)
+        above = math.nan if math.isnan(top) else float(close > top)
+        below = math.nan if math.isnan(bottom) else float(close < bottom)
+        if above == 1 and self.prev_above == 0:
+            signals.append("雲上抜け")
+        if below == 1 and self.prev_below == 0:
+            signals.append("雲下抜け")
+        self.prev_diff, self.prev_above, self.prev_below = diff, above, below
+
+        def value(v: float) -> float | None:
+            return None if math.isnan(v) else v
+
+        return {
+            "conversion_line": value(conversion_line),
+            "base_line": value(base_line),
+            "leading_span1": value(span1),
+            "leading_span2": value(span2),
+            "signals": signals,
+        }
+
+
+STREAM_KINDS: dict[int, type[Checkpointable]] = {
+    cls.KIND: cls for cls in (BollingerStream, SmaCrossStream, IchimokuStream)
+}
+
+
+def restore_stream(data: bytes, stats: StreamStats | None = None) -> Checkpointable:
+    # チェックポイントの種類からクラスを選んで復元する
+    _, _, kind, _ = CHECKPOINT_HEADER.unpack_from(data)
+    if kind not in STREAM_KINDS:
+        raise ValueError(f"不明なストリームの種類: {kind}")
+    return STREAM_KINDS[kind].restore(data, stats)
+
+
+def save_checkpoints(
+    path: str | Path,
+    streams: Mapping[str, Checkpointable],
+    sequence: int = 0,
+    marks: Mapping[str, float] | None = None,
+) -> None:
+    """
+    銘柄ごとのストリームのチェックポイントを1つのファイルにまとめて保存する
+
+    書き込み途中で落ちても前回のファイルが壊れないよう、一時ファイルに書いてから置き換えます。
+
+    Args:
+        path: 保存先
+        streams: 証券コード → ストリーム
+        sequence: 通し番号（処理した足の数など）
+        marks: 証券コード → 最後に反映した足の時刻（再開時にそれ以前の足を読み飛ばすため）
+    """
+    marks = marks or {}
+    parts = [struct.pack("<QI", sequence, len(streams))]
+    for code, stream in streams.items():
+        key = code.encode()
+        blob = stream.checkpoint()
+        parts.append(struct.pack("<HId", len(key), len(blob), marks.get(code, np.nan)))
+        parts.append(key)
+        parts.append(blob)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(b"".join(parts))
+    tmp.replace(path)
+
+
+def load_checkpoints(
+    path: str | Path, stats: StreamStats | None = None
+) -> tuple[int, dict[str, Checkpointable], dict[str, float]]:
+    """
+    `save_checkpoints()`で保存したストリームを復元する
+
+    Returns:
+        (通し番号, 証券コード → ストリーム, 証券コード → 最後に反映した足の時刻)
+    """
+    data = Path(path).read_bytes()
+    sequence, count = struct.unpack_from("<QI", data)
+    offset = struct.calcsize("<QI")
+    streams = {}
+    marks = {}
+    for _ in range(count):
+        key_size, blob_size, mark = struct.unpack_from("<HId", data, offset)
+        offset += struct.calcsize("<HId")
+        code = data[offset : offset + key_size].decode()
+        offset += key_size
+        streams[code] = restore_stream(data[offset : offset + blob_size], stats)
+        offset += blob_size
+        if not np.isnan(mark):
+            marks[code] = mark
+    return sequence, streams, marks
@@ -15,8 +15,37 @@ def _():
     import polars as pl
     import yfinance_pl as yf
 
+    from libs.jpx_calendar import month_start_ticks
+
     warnings.simplefilter("ignore")
-    return go, ka, mo, pl, yf
+    return go, ka, mo, month_start_ticks, pl, yf
+
+
+@app.cell
+def _():
+    from libs.cache import IndicatorCache, code_version
+
+    # 指標の計算結果のキャッシュ（以前の銘柄に戻したときやセルの再実行時は再計算しない）
+    indicator_cache = IndicatorCache()
+    return code_version, indicator_cache
+
+
+@app.cell
+def _():
+    from libs.metadata import TickerMetadataStore
+
+    # 銘柄名などのメタデータ（有効期限内はticker.infoを呼ばない）
+    metadata = TickerMetadataStore()
+    return (metadata,)
+
+
+@app.cell
+def _():
+    from libs.profiling import StageProfiler
+
+    # 処理段階ごとの計測（セルが再実行されるたびに記録が追加される）
+    profiler = StageProfiler()
+    return (profiler,)
 
 
 @app.cell
@@ -81,12 +110,17 @@ def _(mo):
 
 
 @app.cell
-def _(stock_code, yf):
+def _(metadata, profiler, stock_code, yf):
+    profiler.new_run()
     ticker = yf.Ticker(stock_code.value)
-    info = ticker.info
-    hist = ticker.history(period="1y")
+    with profiler.stage("ticker metadata"):
+        # 社名は手元のメタデータから取得する（未登録・期限切れの場合のみticker.infoを呼ぶ）
+        metadata.refresh([stock_code.value])
+        company_name = metadata.display_name(stock_code.value)
+    with profiler.stage("ticker.history"):
+        hist = ticker.history(period="1y")
     hist
-    return hist, info
+    return company_name, hist
 
 
 @app.cell
@@ -105,12 +139,22 @@ def _(mo):
 
 
 @app.cell
-def _(hist, ka, pl):
-    close = hist["close.amount"].to_numpy().astype("float64")
-    hist_with_ma = hist.with_columns(
-        ma5=pl.Series(ka.sma(close, period=5)),
-        ma25=pl.Series(ka.sma(close, period=25)),
-    )
+def _(code_version, hist, indicator_cache, ka, pl, profiler):
+    def _compute_sma():
+        close = hist["close.amount"].to_numpy().astype("float64")
+        return pl.DataFrame(
+            {
+                "ma5": ka.sma(close, period=5),
+                "ma25": ka.sma(close, period=25),
+            }
+        )
+
+    # kandを更新したら計算し直す
+    with profiler.stage("sma"):
+        _ma = indicator_cache.get_or_compute(
+            "sma", hist, {"periods": [5, 25]}, _compute_sma, version=code_version(ka)
+        )
+    hist_with_ma = hist.with_columns(_ma)
     hist_with_ma
     return (hist_with_ma,)
 
@@ -127,13 +171,51 @@ def _(mo):
       - 緑: 陰線（終値 < 始値）
     - **青線（SMA5）**: 5日移動平均線（短期トレンド）
     - **水色線（SMA25）**: 25日移動平均線（中期トレンド）
+    - **橙線・紫の破線**: VWAP（下の「出来高」を参照）
     """)
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    vp_bins = mo.ui.slider(start=10, stop=120, value=50, step=10, label="価格帯の数")
+    vp_mode = mo.ui.dropdown(
+        options={"等間隔": "fixed", "出来高で等分": "adaptive"},
+        value="等間隔",
+        label="価格帯の分け方",
+    )
+    mo.vstack(
+        [
+            mo.md("""
+    ### 出来高：VWAPと価格帯別出来高
+
+    下のチャートには、出来高から求めた線と横棒も重ねています。
+
+    - **VWAP**: 出来高で重み付けした平均価格（典型価格 × 出来高の累積和 ÷ 出来高の累積和）
+    - **価格帯別出来高**: 各足の出来高を安値〜高値に均等に配分して価格帯ごとに合計したもの。
+      右側の横棒で、青はバリューエリア（出来高の70%が集まる範囲）、点線はPOC（最も出来高が多い価格帯）
+
+    どちらも足ごとのループを使わず、累積和と`np.bincount`で計算します（`libs.volume`）。
+    """),
+            mo.hstack([vp_bins, vp_mode], justify="start"),
+        ]
+    )
+    return vp_bins, vp_mode
+
+
 @app.cell
-def _(go, hist_with_ma, info, pl, stock_code):
-    company_name = info.get("shortName", stock_code.value)
+def _(
+    company_name,
+    go,
+    hist_with_ma,
+    month_start_ticks,
+    pl,
+    profiler,
+    vp_bins,
+    vp_mode,
+):
+    from libs.volume import add_volume_profile, get_volume_values
+
     ma_layout = {
         "height": 560,
         "width": 1028,
@@ -163,68 +245,117 @@ def _(go, hist_with_ma, info, pl, stock_code):
     }
 
     # Decimalを浮動小数点に変換（Int64は小数点以下を失う）
-    df_plot = hist_with_ma.with_columns(
-        [
-            pl.col("open.amount").cast(pl.Float64),
-            pl.col("high.amount").cast(pl.Float64),
-            pl.col("low.amount").cast(pl.Float64),
-            pl.col("close.amount").cast(pl.Float64),
-        ]
-    )
+    with profiler.stage("decimal cast"):
+        df_plot = hist_with_ma.with_columns(
+            [
+                pl.col("open.amount").cast(pl.Float64),
+                pl.col("high.amount").cast(pl.Float64),
+                pl.col("low.amount").cast(pl.Float64),
+                pl.col("close.amount").cast(pl.Float64),
+            ]
+        )
     dates = df_plot["date"].to_list()
+    with profiler.stage("volume profile"):
+        vwap, profile = get_volume_values(
+            df_plot, bins=vp_bins.value, mode=vp_mode.value
+        )
 
-    ma_data = [
-        go.Candlestick(
-            yaxis="y1",
-            x=dates,
-            open=df_plot["open.amount"],
-            high=df_plot["high.amount"],
-            low=df_plot["low.amount"],
-            close=df_plot["close.amount"],
-            increasing_line_color="red",
-            decreasing_line_color="green",
-            name=f"{company_name}の株価",
-        ),
-        go.Scatter(
-            yaxis="y1",
-            x=dates,
-            y=df_plot["ma5"],
-            name="SMA5",
-            line={"color": "royalblue", "width": 1.2},
-        ),
-        go.Scatter(
-            yaxis="y1",
-            x=dates,
-            y=df_plot["ma25"],
-            name="SMA25",
-            line={"color": "lightseagreen", "width": 1.2},
-        ),
-    ]
+    with profiler.stage("plotly figure"):
+        ma_data = [
+            go.Candlestick(
+                yaxis="y1",
+                x=dates,
+                open=df_plot["open.amount"],
+                high=df_plot["high.amount"],
+                low=df_plot["low.amount"],
+                close=df_plot["close.amount"],
+                increasing_line_color="red",
+                decreasing_line_color="green",
+                name=f"{company_name}の株価",
+            ),
+            go.Scatter(
+                yaxis="y1",
+                x=dates,
+                y=df_plot["ma5"],
+                name="SMA5",
+                line={"color": "royalblue", "width": 1.2},
+            ),
+            go.Scatter(
+                yaxis="y1",
+                x=dates,
+                y=df_plot["ma25"],
+                name="SMA25",
+                line={"color": "lightseagreen", "width": 1.2},
+            ),
+            go.Scatter(
+                yaxis="y1",
+                x=dates,
+                y=vwap["vwap"],
+                name="VWAP（期間の初日から）",
+                line={"color": "darkorange", "width": 1.2},
+            ),
+            go.Scatter(
+                yaxis="y1",
+                x=dates,
+                y=vwap["vwap20"],
+                name="VWAP20",
+                line={"color": "mediumpurple", "width": 1.2, "dash": "dash"},
+            ),
+        ]
 
-    ma_fig = go.Figure(data=ma_data, layout=go.Layout(ma_layout))
+        ma_fig = go.Figure(data=ma_data, layout=go.Layout(ma_layout))
 
-    # 月ごとにラベルを表示（各月の最初の取引日）
-    month_indices = []
-    month_labels = []
-    prev_month = None
-    for i, d in enumerate(dates):
-        if prev_month != d.month:
-            month_indices.append(dates[i])
-            month_labels.append(d.strftime("%Y-%m"))
-            prev_month = d.month
+        # 月ごとにラベルを表示（各月の最初の取引日をpolarsでまとめて求める）
+        month_indices, month_labels = month_start_ticks(df_plot["date"])
 
-    ma_fig.update_layout(
-        {
-            "xaxis": {
-                "showgrid": False,
-                "tickmode": "array",
-                "tickvals": month_indices,
-                "ticktext": month_labels,
-                "tickangle": -45,
+        ma_fig.update_layout(
+            {
+                "xaxis": {
+                    "showgrid": False,
+                    "tickmode": "array",
+                    "tickvals": month_indices,
+                    "ticktext": month_labels,
+                    "tickangle": -45,
+                }
             }
-        }
-    )
+        )
+        # 価格帯別出来高を右側に横棒で表示する（価格のY軸を共有する）
+        add_volume_profile(ma_fig, profile, yaxis="y1")
     ma_fig
+    return (ma_fig,)
+
+
+@app.cell(hide_code=True)
+def _(ma_fig, mo, profiler):
+    # チャート作成後に集計する（ma_figを参照してセルの実行順序を保証）
+    _ = ma_fig
+    mo.vstack(
+        [
+            mo.md(r"""
+    ### 処理時間の内訳
+
+    直近の実行で各処理段階にかかった経過時間・CPU時間・メモリ確保量です。
+    """),
+            mo.ui.table(profiler.to_frame(latest_only=True)),
+            mo.hstack(
+                [
+                    mo.download(
+                        data=profiler.to_json().encode(),
+                        filename="profile.json",
+                        mimetype="application/json",
+                        label="JSON",
+                    ),
+                    mo.download(
+                        data=profiler.to_openmetrics().encode(),
+                        filename="profile.txt",
+                        mimetype="application/openmetrics-text",
+                        label="OpenMetrics",
+                    ),
+                ],
+                justify="start",
+            ),
+        ]
+    )
     return
 
 
@@ -320,6 +451,33 @@ def _(signals):
     return
 
 
+@app.cell
+def _(mo, pl, signals, stock_code):
+    from libs.signal_store import SignalStore
+
+    # 検出したシグナルを履歴として保存する（保存済みの日付のシグナルは追記しない）
+    signal_store = SignalStore()
+    _added = signal_store.append(
+        signals.with_columns(
+            code=pl.lit(stock_code.value),
+            detector=pl.lit("sma"),
+        )
+    )
+
+    mo.vstack(
+        [
+            mo.md(f"""
+    ### シグナルの履歴
+
+    `SignalStore`に{_added}件を追記しました。保存済みの履歴は、指標を計算し直さずに
+    シグナルの種類・証券コード・日付で絞り込んで読み込めます。
+    """),
+            mo.ui.table(signal_store.history(stock_code.value)),
+        ]
+    )
+    return
+
+
 @app.cell
 def _(mo):
     mo.md("""
@@ -334,9 +492,7 @@ def _(mo):
 
 
 @app.cell
-def _(go, hist_with_ma, info, pl, signals, stock_code):
-    _company_name = info.get("shortName", stock_code.value)
-
+def _(company_name, go, hist_with_ma, month_start_ticks, pl, signals):
     # Decimalを浮動小数点に変換
     _df_plot = hist_with_ma.with_columns(
         [
@@ -362,7 +518,7 @@ def _(go, hist_with_ma, info, pl, signals, stock_code):
             close=_df_plot["close.amount"],
             increasing_line_color="red",
             decreasing_line_color="green",
-            name=f"{_company_name}の株価",
+            name=f"{company_name}の株価",
         ),
         go.Scatter(
             yaxis="y1",
@@ -412,7 +568,7 @@ def _(go, hist_with_ma, info, pl, signals, stock_code):
         "height": 560,
         "width": 1028,
         "title": {
-            "text": f"{_company_name}の株価（シグナル付き）",
+            "text": f"{company_name}の株価（シグナル付き）",
             "x": 0.5,
             "xanchor": "center",
             "font": {"size": 24, "weight": "bold"},
@@ -439,14 +595,7 @@ def _(go, hist_with_ma, info, pl, signals, stock_code):
     signal_fig = go.Figure(data=_signal_data, layout=go.Layout(_signal_layout))
 
     # 月ごとにラベルを表示
-    _month_indices = []
-    _month_labels = []
-    _prev_month = None
-    for _i, _d in enumerate(_dates):
-        if _prev_month != _d.month:
-            _month_indices.append(_dates[_i])
-            _month_labels.append(_d.strftime("%Y-%m"))
-            _prev_month = _d.month
+    _month_indices, _month_labels = month_start_ticks(_df_plot["date"])
 
     signal_fig.update_layout(
         {
@@ -19,6 +19,33 @@ def _():
     return go, ka, mo, pl, yf
 
 
+@app.cell
+def _():
+    from libs.profiling import StageProfiler
+
+    # 処理段階ごとの計測（セルが再実行されるたびに記録が追加される）
+    profiler = StageProfiler()
+    return (profiler,)
+
+
+@app.cell
+def _():
+    from libs.cache import IndicatorCache, code_version
+
+    # 指標の計算結果のキャッシュ（以前の銘柄に戻したときやセルの再実行時は再計算しない）
+    indicator_cache = IndicatorCache()
+    return code_version, indicator_cache
+
+
+@app.cell
+def _():
+    from libs.metadata import TickerMetadataStore
+
+    # 銘柄名などのメタデータ（有効期限内はticker.infoを呼ばない）
+    metadata = TickerMetadataStore()
+    return (metadata,)
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -53,27 +80,31 @@ def _(mo):
 
 
 @app.cell
-def _(stock_code, yf):
+def _(metadata, profiler, stock_code, yf):
     # 週足
+    profiler.new_run()
     ticker = yf.Ticker(stock_code.value)
-    info = ticker.info
-    wkly = ticker.history(period="1y", interval="1wk")
+    with profiler.stage("ticker metadata"):
+        # 社名は手元のメタデータから取得する（未登録・期限切れの場合のみticker.infoを呼ぶ）
+        metadata.refresh([stock_code.value])
+        company_name = metadata.display_name(stock_code.value)
+    with profiler.stage("ticker.history 1wk"):
+        wkly = ticker.history(period="1y", interval="1wk")
     wkly  # 54 rows
-    return info, ticker, wkly
+    return company_name, ticker, wkly
 
 
 @app.cell
-def _(ticker):
+def _(profiler, ticker):
     # 月足
-    moly = ticker.history(period="1y", interval="1mo")
+    with profiler.stage("ticker.history 1mo"):
+        moly = ticker.history(period="1y", interval="1mo")
     moly  # 13rows
     return (moly,)
 
 
 @app.cell
-def _(go, info, moly, pl, stock_code, wkly):
-    company_name = info.get("shortName", stock_code.value)
-
+def _(company_name, go, moly, pl, wkly):
     def get_layout(label):
         return {
             "height": 560,
@@ -162,9 +193,10 @@ def _(mo):
 
 
 @app.cell
-def _(ticker):
+def _(profiler, ticker):
     # 日足データを2年分取得（ボリンジャーバンド用）
-    data = ticker.history(period="2y", interval="1d")
+    with profiler.stage("ticker.history 1d"):
+        data = ticker.history(period="2y", interval="1d")
     data
     return (data,)
 
@@ -185,140 +217,179 @@ def _(mo):
     | 偏差σ2 | 2.0 | 標準偏差の2倍（一般的） |
 
     **シグナル**: バンド幅拡大→ボラティリティ増加、価格がバンドに接触→買われすぎ/売られすぎ
+
+    **実装のポイント**:
+    - `ka.bbands()`を偏差ごとに呼ぶと、同じ20日間の移動平均・標準偏差を2回計算することになる
+    - `get_bbands_family()`は期間ごとに移動平均・標準偏差を1回だけ計算し、偏差の倍数だけ変えてバンドを作る
+    - %b（バンド内の位置）とバンド幅も同時に求まる
+
+    ```python
+    bbands = get_bbands_family(close, periods=[20], devs=[1.0, 2.0])
+    # bb20_middle, bb20_upper_1, bb20_lower_1, bb20_upper_2, bb20_lower_2,
+    # bb20_percent_b_2, bb20_bandwidth_2 などの列
+    ```
     """)
     return
 
 
 @app.cell
-def _(data, ka, pl):
+def _(code_version, data, indicator_cache, profiler):
     import numpy as np
 
-    # 終値をnumpy配列に変換
-    close = data["close.amount"].to_numpy().astype("float64")
+    from libs.bbands import get_bbands_family
 
-    # 偏差1.0のボリンジャーバンド
-    bb_upper_1, bb_middle_1, bb_lower_1, _, _, _, _ = ka.bbands(
-        close, period=20, dev_up=1.0, dev_down=1.0
-    )
-
-    # 偏差2.0のボリンジャーバンド
-    bb_upper_2, bb_middle_2, bb_lower_2, _, _, _, _ = ka.bbands(
-        close, period=20, dev_up=2.0, dev_down=2.0
-    )
+    # 終値をnumpy配列に変換
+    with profiler.stage("decimal cast (bbands)"):
+        close = data["close.amount"].to_numpy().astype("float64")
+
+    # 20日間の移動平均と標準偏差を1回だけ計算し、σ1・σ2のバンドをまとめて作る
+    with profiler.stage("bbands family"):
+        _bbands = indicator_cache.get_or_compute(
+            "bbands_family",
+            data,
+            {"periods": [20], "devs": [1.0, 2.0]},
+            lambda: get_bbands_family(close, periods=[20], devs=[1.0, 2.0]),
+            version=code_version(get_bbands_family),
+        )
 
     # DataFrameに列を追加
-    data_with_bb = data.with_columns(
-        [
-            pl.Series("bbands_upper_1", bb_upper_1),
-            pl.Series("bbands_middle_1", bb_middle_1),
-            pl.Series("bbands_lower_1", bb_lower_1),
-            pl.Series("bbands_upper_2", bb_upper_2),
-            pl.Series("bbands_middle_2", bb_middle_2),
-            pl.Series("bbands_lower_2", bb_lower_2),
-        ]
-    )
+    data_with_bb = data.with_columns(_bbands)
 
     data_with_bb
-    return close, data_with_bb
+    return close, data_with_bb, np
 
 
 @app.cell
-def _(data_with_bb, go, info, pl, stock_code):
-    _company_name = info.get("shortName", stock_code.value)
-
+def _(company_name, data_with_bb, go, pl, profiler):
     # Float64に変換
-    _df_bb_plot = data_with_bb.with_columns(
-        [
-            pl.col("open.amount").cast(pl.Float64),
-            pl.col("high.amount").cast(pl.Float64),
-            pl.col("low.amount").cast(pl.Float64),
-            pl.col("close.amount").cast(pl.Float64),
-        ]
-    )
+    with profiler.stage("decimal cast (chart)"):
+        _df_bb_plot = data_with_bb.with_columns(
+            [
+                pl.col("open.amount").cast(pl.Float64),
+                pl.col("high.amount").cast(pl.Float64),
+                pl.col("low.amount").cast(pl.Float64),
+                pl.col("close.amount").cast(pl.Float64),
+            ]
+        )
     _dates_bb = _df_bb_plot["date"].to_list()
 
-    _bb_data = [
-        go.Candlestick(
-            yaxis="y1",
-            x=_dates_bb,
-            open=_df_bb_plot["open.amount"],
-            high=_df_bb_plot["high.amount"],
-            low=_df_bb_plot["low.amount"],
-            close=_df_bb_plot["close.amount"],
-            increasing_line_color="red",
-            decreasing_line_color="green",
-            name=f"{_company_name}の株価",
-        ),
-        # ミドルバンド
-        go.Scatter(
-            yaxis="y1",
-            x=_dates_bb,
-            y=_df_bb_plot["bbands_middle_1"],
-            name="ミドルバンド (SMA20)",
-            line={"color": "blue", "width": 1.5},
-        ),
-        # 偏差1.0のバンド
-        go.Scatter(
-            yaxis="y1",
-            x=_dates_bb,
-            y=_df_bb_plot["bbands_upper_1"],
-            name="σ1 上限",
-            line={"color": "lightcoral", "width": 1.2, "dash": "dot"},
-        ),
-        go.Scatter(
-            yaxis="y1",
-            x=_dates_bb,
-            y=_df_bb_plot["bbands_lower_1"],
-            name="σ1 下限",
-            line={"color": "lightcoral", "width": 1.2, "dash": "dot"},
-        ),
-        # 偏差2.0のバンド
-        go.Scatter(
-            yaxis="y1",
-            x=_dates_bb,
-            y=_df_bb_plot["bbands_upper_2"],
-            name="σ2 上限",
-            line={"color": "orange", "width": 1.5},
-        ),
-        go.Scatter(
-            yaxis="y1",
-            x=_dates_bb,
-            y=_df_bb_plot["bbands_lower_2"],
-            name="σ2 下限",
-            line={"color": "orange", "width": 1.5},
-        ),
-    ]
+    with profiler.stage("plotly figure"):
+        _bb_data = [
+            go.Candlestick(
+                yaxis="y1",
+                x=_dates_bb,
+                open=_df_bb_plot["open.amount"],
+                high=_df_bb_plot["high.amount"],
+                low=_df_bb_plot["low.amount"],
+                close=_df_bb_plot["close.amount"],
+                increasing_line_color="red",
+                decreasing_line_color="green",
+                name=f"{company_name}の株価",
+            ),
+            # ミドルバンド
+            go.Scatter(
+                yaxis="y1",
+                x=_dates_bb,
+                y=_df_bb_plot["bb20_middle"],
+                name="ミドルバンド (SMA20)",
+                line={"color": "blue", "width": 1.5},
+            ),
+            # 偏差1.0のバンド
+            go.Scatter(
+                yaxis="y1",
+                x=_dates_bb,
+                y=_df_bb_plot["bb20_upper_1"],
+                name="σ1 上限",
+                line={"color": "lightcoral", "width": 1.2, "dash": "dot"},
+            ),
+            go.Scatter(
+                yaxis="y1",
+                x=_dates_bb,
+                y=_df_bb_plot["bb20_lower_1"],
+                name="σ1 下限",
+                line={"color": "lightcoral", "width": 1.2, "dash": "dot"},
+            ),
+            # 偏差2.0のバンド
+            go.Scatter(
+                yaxis="y1",
+                x=_dates_bb,
+                y=_df_bb_plot["bb20_upper_2"],
+                name="σ2 上限",
+                line={"color": "orange", "width": 1.5},
+            ),
+            go.Scatter(
+                yaxis="y1",
+                x=_dates_bb,
+                y=_df_bb_plot["bb20_lower_2"],
+                name="σ2 下限",
+                line={"color": "orange", "width": 1.5},
+            ),
+        ]
 
-    _bb_layout = {
-        "height": 560,
-        "width": 1028,
-        "title": {
-            "text": f"{_company_name}の株価（ボリンジャーバンド）",
-            "x": 0.5,
-            "xanchor": "center",
-            "font": {"size": 24, "weight": "bold"},
-        },
-        "xaxis": {
-            "rangeslider": {"visible": False},
-            "title": {"text": "日付"},
-        },
-        "yaxis1": {
-            "domain": [0.05, 1.0],
-            "title": "価格(JPY)",
-            "side": "left",
-            "tickformat": ",",
-        },
-        "legend": {
-            "orientation": "h",
-            "yanchor": "top",
-            "y": -0.15,
-            "xanchor": "center",
-            "x": 0.5,
-        },
-    }
+        _bb_layout = {
+            "height": 560,
+            "width": 1028,
+            "title": {
+                "text": f"{company_name}の株価（ボリンジャーバンド）",
+                "x": 0.5,
+                "xanchor": "center",
+                "font": {"size": 24, "weight": "bold"},
+            },
+            "xaxis": {
+                "rangeslider": {"visible": False},
+                "title": {"text": "日付"},
+            },
+            "yaxis1": {
+                "domain": [0.05, 1.0],
+                "title": "価格(JPY)",
+                "side": "left",
+                "tickformat": ",",
+            },
+            "legend": {
+                "orientation": "h",
+                "yanchor": "top",
+                "y": -0.15,
+                "xanchor": "center",
+                "x": 0.5,
+            },
+        }
 
-    bb_fig = go.Figure(data=_bb_data, layout=go.Layout(_bb_layout))
+        bb_fig = go.Figure(data=_bb_data, layout=go.Layout(_bb_layout))
     bb_fig
+    return (bb_fig,)
+
+
+@app.cell(hide_code=True)
+def _(bb_fig, mo, profiler):
+    # チャート作成後に集計する（bb_figを参照してセルの実行順序を保証）
+    _ = bb_fig
+    mo.vstack(
+        [
+            mo.md(r"""
+    ### 処理時間の内訳
+
+    直近の実行で各処理段階にかかった経過時間・CPU時間・メモリ確保量です。
+    """),
+            mo.ui.table(profiler.to_frame(latest_only=True)),
+            mo.hstack(
+                [
+                    mo.download(
+                        data=profiler.to_json().encode(),
+                        filename="profile.json",
+                        mimetype="application/json",
+                        label="JSON",
+                    ),
+                    mo.download(
+                        data=profiler.to_openmetrics().encode(),
+                        filename="profile.txt",
+                        mimetype="application/openmetrics-text",
+                        label="OpenMetrics",
+                    ),
+                ],
+                justify="start",
+            ),
+        ]
+    )
     return
 
 
@@ -327,7 +398,7 @@ def _(mo):
     mo.md(r"""
     ## ストリーミング処理（リアルタイムデータ対応）
 
-    **バッチ処理**（`ka.bbands()`）は過去データ全体を一括計算。
+    **バッチ処理**（`get_bbands_family()`）は過去データ全体を一括計算。
     **ストリーミング処理**（`ka.bbands_inc()` + ジェネレーター）はデータを1行ずつ処理し、
     リアルタイム更新（分足データなど）に対応します。
 
@@ -395,25 +466,22 @@ def _(ka):
 
 @app.cell
 def _(bbands_streaming, close, pl):
-    # ジェネレーターでストリーミング処理を実行
-    stream_results = list(bbands_streaming(close, period=20, dev_up=2.0, dev_down=2.0))
-
-    # 結果をDataFrameに変換
-    stream_upper = [r[0] for r in stream_results]
-    stream_middle = [r[1] for r in stream_results]
-    stream_lower = [r[2] for r in stream_results]
+    from libs.sink import ColumnSink
 
-    stream_df = pl.DataFrame(
-        {
-            "index": list(range(len(stream_results))),
-            "stream_upper": stream_upper,
-            "stream_middle": stream_middle,
-            "stream_lower": stream_lower,
-        }
+    # ジェネレーターの結果を列ごとの配列に直接書き込む（タプルのリストを作らない）
+    _sink = ColumnSink(
+        ["stream_upper", "stream_middle", "stream_lower"], capacity=len(close)
     )
+    for _upper, _middle, _lower, _ in bbands_streaming(
+        close, period=20, dev_up=2.0, dev_down=2.0
+    ):
+        _sink.append((_upper, _middle, _lower))
+
+    # ウォームアップ期間の行は欠損（null）になる
+    stream_df = _sink.to_frame("index")
 
     stream_df
-    return (stream_df,)
+    return ColumnSink, stream_df
 
 
 @app.cell(hide_code=True)
@@ -451,11 +519,11 @@ def _(data_with_bb, pl, stream_df):
     comparison_full = pl.DataFrame(
         {
             "index": stream_df["index"],
-            "batch_upper": data_with_bb["bbands_upper_2"],
+            "batch_upper": data_with_bb["bb20_upper_2"],
             "stream_upper": stream_df["stream_upper"],
-            "batch_middle": data_with_bb["bbands_middle_2"],
+            "batch_middle": data_with_bb["bb20_middle"],
             "stream_middle": stream_df["stream_middle"],
-            "batch_lower": data_with_bb["bbands_lower_2"],
+            "batch_lower": data_with_bb["bb20_lower_2"],
             "stream_lower": stream_df["stream_lower"],
         }
     ).with_columns(
@@ -504,6 +572,102 @@ def _(comparison_full):
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    ### 長時間ストリーミングの誤差（ドリフト）
+
+    2年分の日足では差分はほぼゼロですが、分足で何週間も動かし続けると事情が変わります。
+    合計と二乗合計を持ち回る方法では、分散を`sum_sq / n - (sum / n)^2`で求めるため、
+    値が大きく分散が小さいほど**桁落ち**が起き、その誤差が更新のたびに蓄積します。
+
+    `BollingerStream`は次の2つで誤差を抑えます。
+
+    - 平均と偏差平方和をWelford法（スライディングウィンドウ版）で更新する
+    - 一定回数（`reanchor_every`）ごとに、ウィンドウ内の値から厳密に計算し直す（再アンカー）
+
+    再アンカー時に測った誤差は`max_drift`、現在の誤差は`drift()`で確認できます。
+    ここでは日足を繰り返して約20万ティックの長いストリームを作り、最後のバンドの誤差を比べます。
+    """)
+    return
+
+
+@app.cell
+def _(bbands_streaming, close, np, pl):
+    from libs.streaming import BollingerStream
+
+    # 日足を繰り返して長いストリームを模擬する
+    _prices = np.tile(close, 400)
+    _exact_std = _prices[-20:].std()
+
+    # 合計・二乗合計を持ち回る方法（ka.bbands_inc）
+    for _upper, _middle, _lower, _ in bbands_streaming(_prices, period=20):
+        pass
+    _naive_std = (_upper - _middle) / 2.0
+
+    # Welford法のみ / Welford法 + 再アンカー
+    _welford = BollingerStream(period=20, reanchor_every=None)
+    _anchored = BollingerStream(period=20, reanchor_every=10_000)
+    for _price in _prices:
+        _welford.update(_price)
+        _anchored.update(_price)
+
+    pl.DataFrame(
+        {
+            "方法": [
+                "合計・二乗合計（ka.bbands_inc）",
+                "Welford法",
+                "Welford法 + 再アンカー",
+            ],
+            "標準偏差の誤差": [
+                abs(_naive_std - _exact_std),
+                abs(_welford.std - _exact_std),
+                abs(_anchored.std - _exact_std),
+            ],
+            "再アンカー時の最大誤差": [None, None, _anchored.max_drift],
+        }
+    )
+    return (BollingerStream,)
+
+
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    ### バッチ計算からの引き継ぎ（ウォームスタート）
+
+    ストリーミング処理を最初の足から始めると、最初の20本はバンドが出ません。
+    バッチ計算に使った過去の終値がすでにあるなら、`BollingerStream.from_history()`で
+    末尾の20本だけから状態を作り、次の足からすぐにバンドを出せます。
+    （`SmaCrossStream`・`IchimokuStream`にも同じ`from_history()`があります）
+
+    ここでは直近30本をライブの足とみなし、それより前をバッチ計算の履歴として引き継ぎます。
+    """)
+    return
+
+
+@app.cell
+def _(BollingerStream, ColumnSink, close, data_with_bb, pl):
+    import time
+
+    _live = 30
+    _start = time.perf_counter()
+    _stream = BollingerStream.from_history(close[:-_live], period=20)
+    _warm_ms = (time.perf_counter() - _start) * 1000
+
+    _sink = ColumnSink(["stream_upper", "stream_middle", "stream_lower"], _live)
+    for _price in close[-_live:]:
+        _sink.append(_stream.update(_price))
+
+    _batch = data_with_bb.tail(_live).select(
+        pl.col("bb20_upper_2", "bb20_middle", "bb20_lower_2").cast(pl.Float64)
+    )
+    pl.concat([_batch, _sink.to_frame(index=None)], how="horizontal").with_columns(
+        diff_upper=(pl.col("bb20_upper_2") - pl.col("stream_upper")).abs(),
+        warm_start_ms=pl.lit(_warm_ms),
+    )
+    return
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -580,14 +744,12 @@ def _(get_current_row, max_rows, mo, set_current_row):
 
 
 @app.cell
-def _(data, get_current_row, go, info, pl, stock_code, stream_df):
+def _(company_name, data, get_current_row, go, pl, stream_df):
     # 状態から現在の行数を取得
     _stream_rows = get_current_row()
     _stream_data_subset = stream_df.head(_stream_rows)
     _original_data_subset = data.head(_stream_rows)
 
-    _company_name_stream = info.get("shortName", stock_code.value)
-
     # Float64に変換
     _df_stream_plot = _original_data_subset.with_columns(
         [
@@ -609,7 +771,7 @@ def _(data, get_current_row, go, info, pl, stock_code, stream_df):
             close=_df_stream_plot["close.amount"],
             increasing_line_color="red",
             decreasing_line_color="green",
-            name=f"{_company_name_stream}の株価",
+            name=f"{company_name}の株価",
         ),
         # ミドルバンド
         go.Scatter(
@@ -640,7 +802,7 @@ def _(data, get_current_row, go, info, pl, stock_code, stream_df):
         "height": 560,
         "width": 1028,
         "title": {
-            "text": f"{_company_name_stream}の株価（ストリーミング処理：{_stream_rows}行）",
+            "text": f"{company_name}の株価（ストリーミング処理：{_stream_rows}行）",
             "x": 0.5,
             "xanchor": "center",
             "font": {"size": 24, "weight": "bold"},
@@ -686,5 +848,163 @@ def _(mo):
     return
 
 
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    ## ライブフィードによるリアルタイム更新
+
+    `libs.live.LivePipeline`は、ティックの受信 → 足への集約 → ストリーミング指標の計算 →
+    描画を`asyncio`のタスクとして並行に動かします。
+
+    - **ソース**: `tail_file()`（追記されるファイル）または`socket_source()`（ローカルのTCPソケット）
+    - **キュー**: 上限付きで、満杯のときは銘柄ごとに最新の結果だけを残す（`policy="coalesce"`）
+    - **描画**: `mo.state`のsetterに銘柄ごとの最新の状態を渡し、下のテーブルのセルだけを再実行
+    - **チェックポイント**: 全銘柄のストリームの状態をティックファイルの隣（`.ckpt`）に保存し、再起動時はそこから再開
+
+    ティックファイルには`code,ts,price,volume`形式の行を追記してください。
+    """)
+    return
+
+
+@app.cell
+def _(mo):
+    tick_path = mo.ui.text(value=".cache/ticks.csv", label="ティックファイル")
+    live_interval = mo.ui.number(start=1, stop=3600, value=60, label="足の長さ（秒）")
+    live_button = mo.ui.run_button(label="ライブ更新を開始")
+    get_live_states, set_live_states = mo.state({})
+    # 実行中のパイプライン（セルを再実行したときに前のものを止めるため）
+    get_live_pipeline, set_live_pipeline = mo.state(None)
+    mo.hstack([tick_path, live_interval, live_button], justify="start")
+    return (
+        get_live_pipeline,
+        get_live_states,
+        live_button,
+        live_interval,
+        set_live_pipeline,
+        set_live_states,
+        tick_path,
+    )
+
+
+@app.cell
+def _(
+    get_live_pipeline,
+    live_button,
+    live_interval,
+    mo,
+    set_live_pipeline,
+    set_live_states,
+    tick_path,
+):
+    from pathlib import Path
+
+    from libs.live import LivePipeline, tail_file
+
+    # 前のパイプラインを止めてから始める（同じティックファイル・チェックポイントを
+    # 2つのスレッドが扱わないようにする）
+    if get_live_pipeline() is not None:
+        get_live_pipeline().stop()
+        set_live_pipeline(None)
+    mo.stop(not live_button.value)
+
+    Path(tick_path.value).touch()
+    _checkpoint = Path(tick_path.value).with_suffix(".ckpt")
+    live_pipeline = LivePipeline(
+        tail_file(tick_path.value),
+        on_state=set_live_states,
+        interval=live_interval.value,
+        checkpoint_path=_checkpoint,
+    )
+    if _checkpoint.exists():
+        # 前回の状態から再開する（ウォームアップの足を待たずにバンドが出る）
+        live_pipeline.restore(_checkpoint)
+    # mo.Threadで動かすと、別スレッドからmo.stateを更新できる
+    live_pipeline.start_background(thread_class=mo.Thread)
+    set_live_pipeline(live_pipeline)
+    return (live_pipeline,)
+
+
+@app.cell
+def _(get_live_states, live_pipeline, mo, pl):
+    _states = get_live_states()
+    _rows = [
+        {
+            "code": _s["code"],
+            "close": _s["bar"]["close"],
+            "upper": _s["upper"],
+            "middle": _s["middle"],
+            "lower": _s["lower"],
+        }
+        for _s in _states.values()
+    ]
+    _latency = live_pipeline.stats.snapshot()
+    mo.vstack(
+        [
+            mo.md(
+                f"キューの滞留: {live_pipeline.queue.depth()}件"
+                f"（最大 {_latency['max_queue_depth']}件） / "
+                f"まとめた更新: {live_pipeline.queue.coalesced}件 / "
+                f"更新の遅延 p50 {_latency['p50_us']:.1f}µs・"
+                f"p99 {_latency['p99_us']:.1f}µs・最大 {_latency['max_us']:.1f}µs"
+            ),
+            mo.ui.table(pl.DataFrame(_rows))
+            if _rows
+            else mo.md("足の確定を待っています"),
+        ]
+    )
+    return
+
+
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    ### 更新1回あたりの遅延時間
+
+    `libs.latency.StreamStats`は、ストリーミング指標の更新1回ごとの所要時間を
+    HDR Histogram形式のヒストグラムに記録します。値を全部保存しないため、
+    長時間動かしてもメモリは一定のまま、p50・p99・最大値を求められます。
+
+    銘柄数を増やしながら合成した足を流し込み、99パーセンタイルの遅延時間が
+    目標（SLO）以内に収まるかを確認します。
+    """)
+    return
+
+
+@app.cell
+def _(mo):
+    bench_symbols = mo.ui.multiselect(
+        options=["10", "100", "1000", "5000"],
+        value=["10", "100", "1000"],
+        label="銘柄数",
+    )
+    bench_slo = mo.ui.number(start=1, stop=10_000, value=100, label="p99の目標（µs）")
+    bench_button = mo.ui.run_button(label="計測する")
+    mo.hstack([bench_symbols, bench_slo, bench_button], justify="start")
+    return bench_button, bench_slo, bench_symbols
+
+
+@app.cell
+async def _(bench_button, bench_slo, bench_symbols, mo, pl):
+    from libs.live import benchmark_pipeline
+
+    mo.stop(not bench_button.value, mo.md("「計測する」を押してください"))
+
+    _rows = await benchmark_pipeline(
+        sorted(int(_n) for _n in bench_symbols.value),
+        slo_p99_us=bench_slo.value,
+    )
+    mo.ui.table(
+        pl.DataFrame(_rows).select(
+            "symbols",
+            "count",
+            pl.col("ticks_per_second").round(0),
+            pl.col("p50_us", "p99_us", "p999_us", "max_us").round(2),
+            "max_queue_depth",
+            "meets_slo",
+        )
+    )
+    return
+
+
 if __name__ == "__main__":
     app.run()
@@ -18,6 +18,42 @@ def _():
     return go, mo, pl, yf
 
 
+@app.cell
+def _():
+    from libs.profiling import StageProfiler
+
+    # 処理段階ごとの計測（セルが再実行されるたびに記録が追加される）
+    profiler = StageProfiler()
+    return (profiler,)
+
+
+@app.cell
+def _():
+    from libs.cache import IndicatorCache
+
+    # 指標の計算結果のキャッシュ（以前の銘柄に戻したときやセルの再実行時は再計算しない）
+    indicator_cache = IndicatorCache()
+    return (indicator_cache,)
+
+
+@app.cell
+def _():
+    from libs.cache import FigureCache, code_version
+
+    # 表示用にシリアライズしたチャートのキャッシュ（最近見た銘柄・期間に戻すとすぐ表示される）
+    figure_cache = FigureCache()
+    return code_version, figure_cache
+
+
+@app.cell
+def _():
+    from libs.metadata import TickerMetadataStore
+
+    # 銘柄名などのメタデータ（有効期限内はticker.infoを呼ばない）
+    metadata = TickerMetadataStore()
+    return (metadata,)
+
+
 @app.cell(hide_code=True)
 def _(mo):
     mo.md(r"""
@@ -62,12 +98,17 @@ def _(mo):
 
 
 @app.cell
-def _(stock_code, yf):
+def _(metadata, profiler, stock_code, yf):
+    profiler.new_run()
     ticker = yf.Ticker(stock_code.value)
-    info = ticker.info
-    hist = ticker.history(period="1y")
+    with profiler.stage("ticker metadata"):
+        # 社名は手元のメタデータから取得する（未登録・期限切れの場合のみticker.infoを呼ぶ）
+        metadata.refresh([stock_code.value])
+        company_name = metadata.display_name(stock_code.value)
+    with profiler.stage("ticker.history"):
+        hist = ticker.history(period="1y")
     hist.head(5)
-    return hist, ticker
+    return company_name, hist
 
 
 @app.cell
@@ -245,7 +286,17 @@ def _(hist, mo, pl):
 
 
 @app.cell
-def _(go, hist, mo, pl, stock_code, ticker):
+def _(
+    code_version,
+    company_name,
+    figure_cache,
+    go,
+    hist,
+    indicator_cache,
+    mo,
+    pl,
+    profiler,
+):
     mo.md(r"""
     ---
 
@@ -277,11 +328,17 @@ def _(go, hist, mo, pl, stock_code, ticker):
     - 価格が雲の上 → 上昇トレンド継続の可能性が高い
     - 価格が雲の下 → 下降トレンド継続の可能性が高い
     - 価格が雲を突破 → トレンド転換の可能性
+
+    先行スパンは26日先までの値があるため、`extend_sessions()`で取引所の営業日
+    （土日・祝日・年末年始を除く）を26日分追加してから計算し、将来の雲も表示しています。
     """)
 
     import numpy as np
+    import plotly
+    import plotly.io as pio
 
     from libs.ichimoku import IchimokuValues, get_ichimoku_values
+    from libs.jpx_calendar import extend_sessions
 
     def create_cloud_segments(dates, span1, span2):
         """
@@ -442,10 +499,164 @@ def _(go, hist, mo, pl, stock_code, ticker):
         data.extend(cloud_traces)
         return go.Figure(data=data, layout=go.Layout(layout))
 
-    values = get_ichimoku_values(hist)
-    company_name = ticker.info.get("shortName", stock_code.value)
-    fig = get_ichimoku_fig(df=hist, values=values, name=company_name)
+    with profiler.stage("get_ichimoku_values"):
+        # 取引所の営業日を26日分追加し、まだ来ていない日付の雲まで計算する
+        hist_ext = extend_sessions(hist, 26)
+        # 計算結果の各線はDataFrameの列として保持する（values["base_line"]で取り出せる）
+        values = indicator_cache.get_or_compute(
+            "ichimoku",
+            hist,
+            {"future": 26},
+            lambda: pl.DataFrame(dict(get_ichimoku_values(hist_ext))),
+            version=code_version(get_ichimoku_values),
+        )
+    # 図を作る関数（雲の塗り分け・各線の計算を含む）やplotly・marimoが変わったら作り直す
+    figure_version = code_version(
+        get_ichimoku_fig, create_cloud_segments, get_ichimoku_values, plotly, mo
+    )
+    with profiler.stage("plotly figure"):
+        # 図を作ってシリアライズした結果をキャッシュし、2回目以降はそのまま表示する
+        fig = mo.Html(
+            figure_cache.get_or_render(
+                "ichimoku",
+                hist_ext,
+                {"name": company_name, "template": pio.templates.default},
+                lambda: get_ichimoku_fig(df=hist_ext, values=values, name=company_name),
+                render=lambda _fig: mo.as_html(_fig).text,
+                version=figure_version,
+            )
+        )
     fig
+    return (
+        fig,
+        figure_version,
+        get_ichimoku_fig,
+        get_ichimoku_values,
+        hist_ext,
+        pio,
+    )
+
+
+@app.cell(hide_code=True)
+def _(fig, mo, profiler):
+    # チャート作成後に集計する（figを参照してセルの実行順序を保証）
+    _ = fig
+    mo.vstack(
+        [
+            mo.md(r"""
+    ## 処理時間の内訳
+
+    直近の実行で各処理段階にかかった経過時間・CPU時間・メモリ確保量です。
+    """),
+            mo.ui.table(profiler.to_frame(latest_only=True)),
+            mo.hstack(
+                [
+                    mo.download(
+                        data=profiler.to_json().encode(),
+                        filename="profile.json",
+                        mimetype="application/json",
+                        label="JSON",
+                    ),
+                    mo.download(
+                        data=profiler.to_openmetrics().encode(),
+                        filename="profile.txt",
+                        mimetype="application/openmetrics-text",
+                        label="OpenMetrics",
+                    ),
+                ],
+                justify="start",
+            ),
+        ]
+    )
+    return
+
+
+@app.cell(hide_code=True)
+def _(mo):
+    conversion_slider = mo.ui.slider(start=5, stop=30, value=9, label="転換線の期間")
+    base_slider = mo.ui.slider(start=10, stop=60, value=26, label="基準線の期間")
+    span2_slider = mo.ui.slider(start=20, stop=120, value=52, label="先行スパン2の期間")
+    mo.md(
+        f"""
+    ---
+
+    ## 期間を変えて一目均衡表を確認する
+
+    9・26・52は当時の営業日数に由来する期間です。スライダーで期間を変えると、
+    チャートがすぐに更新されます。
+
+    {conversion_slider}
+
+    {base_slider}
+
+    {span2_slider}
+
+    **実装のポイント**:
+    - 期間を変えるたびに`rolling_max`/`rolling_min`を計算し直すと、長い分足データでは遅くなる
+    - 高値・安値の「スパーステーブル」を銘柄ごとに1回だけ作っておく
+    - 長さ`2^k`の区間の最大値・最小値を事前計算しておけば、任意の期間の最高値・最安値は
+      重なり合う2つの区間の比較だけで求まる（1本あたりO(1)）
+
+    ```python
+    range_index = RangeExtremaIndex.from_frame(hist)
+    values = get_ichimoku_values(hist, conversion=9, base=26, span2=52, index=range_index)
+    ```
+    """
+    )
+    return base_slider, conversion_slider, span2_slider
+
+
+@app.cell
+def _(hist_ext):
+    from libs.range_index import RangeExtremaIndex
+
+    # 銘柄（hist）が変わったときだけ作り直す（将来の営業日の行も含める）
+    range_index = RangeExtremaIndex.from_frame(hist_ext)
+    return (range_index,)
+
+
+@app.cell
+def _(
+    base_slider,
+    code_version,
+    company_name,
+    conversion_slider,
+    figure_cache,
+    figure_version,
+    get_ichimoku_fig,
+    get_ichimoku_values,
+    hist_ext,
+    mo,
+    pio,
+    range_index,
+    span2_slider,
+):
+    _params = {
+        "conversion": conversion_slider.value,
+        "base": base_slider.value,
+        "span2": span2_slider.value,
+    }
+
+    def _build():
+        _values = get_ichimoku_values(hist_ext, **_params, index=range_index)
+        return get_ichimoku_fig(
+            df=hist_ext,
+            values=_values,
+            name=f"{company_name}（{conversion_slider.value}/{base_slider.value}/{span2_slider.value}）",
+        )
+
+    # 一度表示した期間の組み合わせは、指標の計算も図の作成もせずに表示する
+    mo.Html(
+        figure_cache.get_or_render(
+            "ichimoku",
+            hist_ext,
+            {**_params, "name": company_name, "template": pio.templates.default},
+            _build,
+            render=lambda _fig: mo.as_html(_fig).text,
+            # 期間を変えた計算は範囲の最大・最小のインデックスを使うため、その実装も含める
+            version=code_version(figure_version, type(range_index)),
+        )
+    )
     return
 
 
@@ -0,0 +1,187 @@
+import marimo
+
+__generated_with = "0.18.1"
+app = marimo.App(width="medium")
+
+
+@app.cell
+def _():
+    import warnings
+    from pathlib import Path
+
+    import marimo as mo
+    import polars as pl
+
+    warnings.simplefilter("ignore")
+    return Path, mo, pl
+
+
+@app.cell
+def _():
+    from libs.profiling import StageProfiler
+
+    # 処理段階ごとの計測（セルが再実行されるたびに記録が追加される）
+    profiler = StageProfiler()
+    return (profiler,)
+
+
+@app.cell
+def _():
+    from libs.metadata import TickerMetadataStore
+
+    # 銘柄名などのメタデータ（有効期限内はticker.infoを呼ばない）
+    metadata = TickerMetadataStore()
+    return (metadata,)
+
+
+@app.cell(hide_code=True)
+def _(mo):
+    mo.md(r"""
+    # 多数の銘柄の概要（スモールマルチプル）
+
+    s001〜s003では1つの銘柄を大きなチャートで表示しました。
+    ここでは数百銘柄の小さなチャートを格子状に並べ、一目均衡表の雲やボリンジャーバンドに
+    対する位置を色で表示して、市場全体の状態を一度に確認します。
+
+    ### 高速に描画するための工夫
+
+    - 株価は銘柄 × 取引日のパネル（`libs.panel.PricePanel`）から読み、指標は全銘柄をまとめて計算する
+    - 銘柄ごとに図を作らず、全銘柄の線を**1枚の図**の中のマス目に配置する
+    - 線はNaNで区切って状態ごとに1つの`Scattergl`（WebGL）トレースにまとめる（トレース数は銘柄数によらず一定）
+    - 株価・銘柄名の取得は`libs.parallel.map_tickers()`でスレッドに分けて並列に行う
+    （フリースレッド版のPythonではGILがないため、CPUコア数までPythonの処理も並列に動く）
+    """)
+    return
+
+
+@app.cell
+def _(mo):
+    codes_input = mo.ui.text_area(
+        value="7203.T\n8381.T\n9984.T\n6758.T\n8306.T",
+        label="証券コード（1行に1つ）",
+    )
+    panel_root = mo.ui.text(value=".cache/panel", label="パネルの保存先")
+    build_button = mo.ui.run_button(label="株価を取得してパネルを作り直す")
+    mo.vstack([codes_input, mo.hstack([panel_root, build_button], justify="start")])
+    return build_button, codes_input, panel_root
+
+
+@app.cell
+def _(Path, build_button, codes_input, metadata, mo, panel_root, profiler):
+    from libs.data import fetch_history
+    from libs.panel import PricePanel
+    from libs.parallel import map_tickers
+
+    profiler.new_run()
+    codes = [c.strip() for c in codes_input.value.splitlines() if c.strip()]
+
+    if build_button.value or not (Path(panel_root.value) / "meta.json").exists():
+        mo.stop(
+            not build_button.value,
+            mo.md("パネルがありません。株価を取得してください。"),
+        )
+        with profiler.stage("ticker.history"):
+            # 銘柄ごとの取得をスレッドで並列に行う（フリースレッド版ではCPUコア数まで）
+            _frames, _run = map_tickers(
+                lambda _code: fetch_history(_code, period="1y"), codes
+            )
+        # 取得できなかった銘柄はパネルに含めず、理由を表示する
+        _failed = {
+            **{
+                _code: "株価データが空です"
+                for _code, _df in _frames.items()
+                if _df.is_empty()
+            },
+            **_run["errors"],
+        }
+        if _failed:
+            mo.output.append(
+                mo.callout(
+                    mo.md(
+                        "取得できなかった銘柄:\n\n"
+                        + "\n".join(f"- {_code}: {_e}" for _code, _e in _failed.items())
+                    ),
+                    kind="warn",
+                )
+            )
+        with profiler.stage("panel"):
+            panel = PricePanel.from_frames(
+                panel_root.value,
+                {_code: _df for _code, _df in _frames.items() if _code not in _failed},
+                compact=True,
+            )
+    else:
+        panel = PricePanel(panel_root.value)
+
+    with profiler.stage("ticker metadata"):
+        metadata.refresh(panel.tickers)
+        names = {_code: metadata.display_name(_code) for _code in panel.tickers}
+    return names, panel
+
+
+@app.cell
+def _(mo, panel):
+    mode = mo.ui.dropdown(
+        options={"一目均衡表の雲": "ichimoku", "ボリンジャーバンド（σ2）": "bbands"},
+        value="一目均衡表の雲",
+        label="重ねる指標",
+    )
+    days = mo.ui.slider(
+        start=20,
+        stop=max(len(panel.calendar), 20),
+        value=min(120, len(panel.calendar)),
+        step=10,
+        label="表示する足の本数",
+    )
+    columns = mo.ui.slider(start=2, stop=20, value=10, step=1, label="1行の銘柄数")
+    mo.hstack([mode, days, columns], justify="start")
+    return columns, days, mode
+
+
+@app.cell
+def _(columns, days, mode, names, panel, profiler):
+    from libs.dashboard import build_overview_figure, get_overview_table
+
+    with profiler.stage("overview figure"):
+        overview_fig = build_overview_figure(
+            panel,
+            mode=mode.value,
+            days=days.value,
+            columns=columns.value,
+            names=names,
+        )
+    overview_fig
+    return get_overview_table, overview_fig
+
+
+@app.cell
+def _(days, get_overview_table, mo, mode, names, panel, pl):
+    # 図と同じ状態を表でも確認する（並べ替えや絞り込みに使える）
+    _table = get_overview_table(panel, mode.value, days.value).select(
+        pl.col("code"),
+        pl.col("code").replace_strict(names, default=None).alias("name"),
+        pl.all().exclude("code"),
+    )
+    mo.ui.table(_table)
+    return
+
+
+@app.cell(hide_code=True)
+def _(mo, overview_fig, profiler):
+    # チャート作成後に集計する（overview_figを参照してセルの実行順序を保証）
+    _ = overview_fig
+    mo.vstack(
+        [
+            mo.md(r"""
+    ### 処理時間の内訳
+
+    直近の実行で各処理段階にかかった経過時間・CPU時間・メモリ確保量です。
+    """),
+            mo.ui.table(profiler.to_frame(latest_only=True)),
+        ]
+    )
+    return
+
+
+if __name__ == "__main__":
+    app.run()